@@ -0,0 +1,202 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from zoneinfo import ZoneInfo
+
+from master.models import CoberturaSensor
+
+
+MINUTOS_DIA = 1440
+
+
+def _minutos_utc(fechas):
+    """
+    Convierte fechas (aware o naive en la zona horaria actual) en minutos UTC datetime64[m].
+    """
+    utc = ZoneInfo('UTC')
+    tz = timezone.get_current_timezone()
+    return np.array([
+        timezone.make_naive(f if timezone.is_aware(f) else timezone.make_aware(f, tz), utc) for f in fechas
+    ], dtype='datetime64[m]')
+
+
+def registrar_cobertura(ids, minutos):
+    """
+    Marca como cubiertos en CoberturaSensor los minutos UTC (datetime64[m]) de cada id_scada.
+    Cada fila guarda un mapa de 1440 bits (un bit por minuto) de un sensor en un día, y la cantidad de minutos cubiertos.
+    En MySQL cada lote es un solo INSERT ... ON DUPLICATE KEY UPDATE que combina el mapa con OR en el servidor,
+    así los escritores concurrentes no se bloquean entre sí; en otros backends se bloquean las filas y se combinan aquí.
+    """
+    ids = np.asarray(ids, dtype=object)
+    minutos = np.asarray(minutos, dtype='datetime64[m]')
+    if not len(ids):
+        return
+
+    unicos, codigos = np.unique(ids, return_inverse=True)
+    dias = minutos.astype('datetime64[D]')
+    indices = (minutos - dias).astype(np.int64)
+    base = dias.min()
+    numero_dia = (dias - base).astype(np.int64)
+    ancho = int(numero_dia.max()) + 1
+    claves, grupos = np.unique(codigos * ancho + numero_dia, return_inverse=True)
+
+    bits = np.zeros((len(claves), MINUTOS_DIA), dtype=bool)
+    bits[grupos, indices] = True
+    mapas = np.packbits(bits, axis=1)
+    # Ordenadas por (id_scada, dia): todos los escritores toman los bloqueos en el mismo orden
+    claves = [(unicos[clave // ancho], (base + clave % ancho).astype(object)) for clave in claves.tolist()]
+
+    if connection.vendor == 'mysql' and not connection.mysql_is_mariadb:
+        _registrar_cobertura_mysql(claves, mapas, bits.sum(axis=1).tolist())
+        return
+
+    with transaction.atomic():
+        existentes = {
+            (c.id_scada, c.dia): c for c in CoberturaSensor.objects.select_for_update().filter(
+                id_scada__in=set(unicos.tolist()), dia__in={dia for _, dia in claves}
+            ).order_by('id_scada', 'dia')
+        }
+        crear = []
+        actualizar = []
+        for (id_scada, dia), mapa in zip(claves, mapas):
+            cobertura = existentes.get((id_scada, dia))
+            if cobertura is None:
+                crear.append(CoberturaSensor(
+                    id_scada=id_scada, dia=dia, mapa=mapa.tobytes(), minutos=int(np.unpackbits(mapa).sum())
+                ))
+                continue
+            mapa = mapa | np.frombuffer(bytes(cobertura.mapa), dtype=np.uint8)
+            cobertura.mapa = mapa.tobytes()
+            cobertura.minutos = int(np.unpackbits(mapa).sum())
+            actualizar.append(cobertura)
+        CoberturaSensor.objects.bulk_create(crear, batch_size=1000)
+        CoberturaSensor.objects.bulk_update(actualizar, ['mapa', 'minutos'], batch_size=1000)
+
+
+def _registrar_cobertura_mysql(claves, mapas, minutos, tamano_lote=1000):
+    """
+    Upsert atómico de los mapas: las filas nuevas se insertan y en las existentes el mapa se combina con OR
+    (operación bit a bit sobre cadenas binarias de MySQL 8) y se recalcula minutos con BIT_COUNT.
+    Las asignaciones de ON DUPLICATE KEY UPDATE se evalúan de izquierda a derecha, por eso minutos ve el mapa nuevo.
+    """
+    tabla = connection.ops.quote_name(CoberturaSensor._meta.db_table)
+    sql = (
+        f"INSERT INTO {tabla} (id_scada, dia, mapa, minutos) VALUES (%s, %s, %s, %s) "
+        f"ON DUPLICATE KEY UPDATE mapa = mapa | VALUES(mapa), minutos = BIT_COUNT(mapa)"
+    )
+    filas = [
+        (id_scada, dia, mapa.tobytes(), cantidad)
+        for (id_scada, dia), mapa, cantidad in zip(claves, mapas, minutos)
+    ]
+    with connection.cursor() as cursor:
+        for i in range(0, len(filas), tamano_lote):
+            cursor.executemany(sql, filas[i:i + tamano_lote])
+
+
+def registrar_cobertura_scadatemporal(objetos):
+    """
+    Marca como cubiertos los minutos de instancias de ScadaTemporal recién guardadas.
+    """
+    if objetos:
+        registrar_cobertura([o.id_scada for o in objetos], _minutos_utc([o.timestamp for o in objetos]))
+
+
+def mapa_cobertura(ids, fecha_inicio, fecha_fin):
+    """
+    Devuelve (minutos, cubiertos): los minutos UTC (datetime64[m]) de [fecha_inicio, fecha_fin]
+    y una matriz booleana de len(ids) x len(minutos) con los minutos cubiertos de cada id_scada.
+    Los días sin fila en CoberturaSensor se consideran sin cobertura.
+    """
+    minuto_inicio, minuto_fin = _minutos_utc([fecha_inicio, fecha_fin])
+    minutos = np.arange(minuto_inicio, minuto_fin + np.timedelta64(1, 'm'), dtype='datetime64[m]')
+    dia_inicio = minuto_inicio.astype('datetime64[D]')
+    numero_dias = int((minuto_fin.astype('datetime64[D]') - dia_inicio).astype(np.int64)) + 1
+
+    posicion = {id_scada: i for i, id_scada in enumerate(ids)}
+    bits = np.zeros((len(ids), numero_dias * MINUTOS_DIA), dtype=bool)
+    for id_scada, dia, mapa in CoberturaSensor.objects.filter(
+        id_scada__in=list(posicion),
+        dia__range=(dia_inicio.astype(object), (dia_inicio + numero_dias - 1).astype(object))
+    ).values_list('id_scada', 'dia', 'mapa'):
+        desde = int((np.datetime64(dia, 'D') - dia_inicio).astype(np.int64)) * MINUTOS_DIA
+        bits[posicion[id_scada], desde:desde + MINUTOS_DIA] = np.unpackbits(np.frombuffer(bytes(mapa), dtype=np.uint8))
+
+    desplazamiento = int((minuto_inicio - dia_inicio.astype('datetime64[m]')).astype(np.int64))
+    return minutos, bits[:, desplazamiento:desplazamiento + len(minutos)]
+
+
+def minutos_faltantes(id_scada, fecha_inicio, fecha_fin):
+    """
+    Minutos UTC (datetime aware) sin registro del sensor en [fecha_inicio, fecha_fin], según CoberturaSensor.
+    """
+    minutos, cubiertos = mapa_cobertura([id_scada], fecha_inicio, fecha_fin)
+    utc = ZoneInfo('UTC')
+    return [timezone.make_aware(m, utc) for m in minutos[~cubiertos[0]].astype(object).tolist()]
+
+
+def sensores_con_huecos(ids, fecha_inicio, fecha_fin):
+    """
+    Subconjunto de ids con al menos un minuto sin registro en [fecha_inicio, fecha_fin], según CoberturaSensor.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    _, cubiertos = mapa_cobertura(ids, fecha_inicio, fecha_fin)
+    return {id_scada for id_scada, completo in zip(ids, cubiertos.all(axis=1).tolist()) if not completo}
+
+
+def sensores_completables(ids, fecha_inicio, fecha_fin, extension=None, max_hueco=None):
+    """
+    Subconjunto de ids con al menos un minuto sin registro en [fecha_inicio, fecha_fin] que se puede completar,
+    según CoberturaSensor: el hueco tiene un minuto cubierto antes y otro después, buscados hasta extension
+    fuera del rango, y, si max_hueco ({id_scada: minutos o None}) indica un límite, ambos están a esa
+    distancia o menos. Los huecos del borde sin vecino no cuentan.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    extension = extension or timedelta(0)
+    _, cubiertos = mapa_cobertura(ids, fecha_inicio - extension, fecha_fin + extension)
+    total = cubiertos.shape[1]
+    rango = slice(int(extension.total_seconds() // 60), total - int(extension.total_seconds() // 60))
+
+    # Posición del minuto cubierto anterior y siguiente de cada minuto, en toda la ventana extendida
+    posiciones = np.arange(total, dtype=np.int32)
+    anterior = np.maximum.accumulate(np.where(cubiertos, posiciones, -1), axis=1)[:, rango]
+    siguiente = np.minimum.accumulate(np.where(cubiertos, posiciones, total)[:, ::-1], axis=1)[:, ::-1][:, rango]
+    completables = ~cubiertos[:, rango] & (anterior >= 0) & (siguiente < total)
+    if max_hueco:
+        limites = np.array([
+            np.inf if max_hueco.get(id_scada) is None else max_hueco[id_scada] for id_scada in ids
+        ], dtype=np.float64)
+        completables &= siguiente - anterior <= limites[:, None]
+    return {id_scada for id_scada, hay in zip(ids, completables.any(axis=1).tolist()) if hay}
+
+
+def cobertura_central(sensores, fecha_inicio, fecha_fin):
+    """
+    Cobertura de los sensores (SensorRegistro) de una central en [fecha_inicio, fecha_fin]:
+    minutos esperados, minutos cubiertos y porcentaje, en total y por sensor.
+    """
+    ids = [s.id_scada for s in sensores]
+    minutos, cubiertos = mapa_cobertura(ids, fecha_inicio, fecha_fin)
+    por_sensor = cubiertos.sum(axis=1).tolist()
+    esperados = len(minutos)
+    total = sum(por_sensor)
+    return {
+        'minutos_esperados': esperados * len(ids),
+        'minutos_cubiertos': total,
+        'porcentaje': round(100 * total / (esperados * len(ids)), 2) if ids and esperados else 0.0,
+        'sensores': [
+            {
+                'id_scada': s.id_scada,
+                'cabecera_cmd': s.cabecera_cmd,
+                'minutos_cubiertos': cubiertos_sensor,
+                'minutos_faltantes': esperados - cubiertos_sensor,
+                'porcentaje': round(100 * cubiertos_sensor / esperados, 2) if esperados else 0.0,
+            }
+            for s, cubiertos_sensor in zip(sensores, por_sensor)
+        ],
+    }
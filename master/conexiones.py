@@ -0,0 +1,209 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pyodbc
+from django.conf import settings
+
+
+def cadena_conexion_sqlserver(database):
+    """
+    Arma la cadena de conexión ODBC a SQL Server para la base de datos indicada,
+    usando los datos de conexión de settings.py.
+    """
+    server = settings.DB_SQL_SERVER
+    username = settings.DB_SQL_USERNAME
+    password = settings.DB_SQL_PASSWORD
+    driver = settings.DB_DRIVER
+
+    return (
+        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
+        f"UID={username};"
+        f"PWD={password};"
+        "TrustServerCertificate=Yes;"
+    )
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones pyodbc a una base de datos de SQL Server.
+    Limita la cantidad de conexiones abiertas a tamano_maximo, reutiliza las conexiones libres
+    y verifica con SELECT 1 las que estuvieron inactivas más de verificar_segundos antes de entregarlas.
+    Lleva estadísticas de conexiones creadas, reutilizadas y descartadas y del tiempo de espera.
+    """
+
+    def __init__(self, nombre, database, tamano_maximo, timeout, verificar_segundos):
+        self.nombre = nombre
+        self.database = database
+        self.tamano_maximo = tamano_maximo
+        self.timeout = timeout
+        self.verificar_segundos = verificar_segundos
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano_maximo)
+        self._lock = threading.Lock()
+        self._stats = {
+            'entregadas': 0,
+            'creadas': 0,
+            'reutilizadas': 0,
+            'descartadas': 0,
+            'espera_total': 0.0,
+            'espera_maxima': 0.0,
+        }
+
+    def _sumar(self, clave, valor=1):
+        with self._lock:
+            self._stats[clave] += valor
+
+    def _saludable(self, conn, inactiva):
+        if inactiva < self.verificar_segundos:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _descartar(self, conn):
+        self._sumar('descartadas')
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def obtener(self):
+        """
+        Entrega una conexión del pool, esperando hasta timeout segundos si todas están en uso.
+        """
+        inicio = time.monotonic()
+        if not self._cupos.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Pool {self.nombre}: no hay conexiones libres después de {self.timeout} s")
+        espera = time.monotonic() - inicio
+        with self._lock:
+            self._stats['entregadas'] += 1
+            self._stats['espera_total'] += espera
+            self._stats['espera_maxima'] = max(self._stats['espera_maxima'], espera)
+
+        try:
+            while True:
+                try:
+                    conn, devuelta = self._libres.get_nowait()
+                except queue.Empty:
+                    conn = pyodbc.connect(cadena_conexion_sqlserver(self.database))
+                    self._sumar('creadas')
+                    return conn
+                if self._saludable(conn, time.monotonic() - devuelta):
+                    self._sumar('reutilizadas')
+                    return conn
+                self._descartar(conn)
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def devolver(self, conn, descartar=False):
+        """
+        Devuelve la conexión al pool, deshaciendo cualquier transacción sin confirmar.
+        Si descartar es True o el rollback falla, la conexión se cierra.
+        """
+        try:
+            if not descartar:
+                try:
+                    conn.rollback()
+                except pyodbc.Error:
+                    descartar = True
+            if descartar:
+                self._descartar(conn)
+            else:
+                self._libres.put((conn, time.monotonic()))
+        finally:
+            self._cupos.release()
+
+    @contextmanager
+    def conexion(self):
+        conn = self.obtener()
+        try:
+            yield conn
+        except pyodbc.OperationalError:
+            self.devolver(conn, descartar=True)
+            raise
+        except BaseException:
+            self.devolver(conn)
+            raise
+        else:
+            self.devolver(conn)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['libres'] = self._libres.qsize()
+        stats['espera_promedio'] = stats['espera_total'] / stats['entregadas'] if stats['entregadas'] else 0.0
+        return stats
+
+    def cerrar(self):
+        """
+        Cierra las conexiones libres del pool.
+        """
+        while True:
+            try:
+                conn, _ = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(nombre, database):
+    with _pools_lock:
+        if nombre not in _pools:
+            _pools[nombre] = PoolConexiones(
+                nombre,
+                database,
+                tamano_maximo=settings.DB_SQL_POOL_TAMANO,
+                timeout=settings.DB_SQL_POOL_TIMEOUT,
+                verificar_segundos=settings.DB_SQL_POOL_VERIFICAR_SEGUNDOS,
+            )
+        return _pools[nombre]
+
+
+def pool_scada():
+    """
+    Pool de la base de datos SCADA (settings.DB_SQL_DATABASE_SCADA, dbo.HistoricalData).
+    """
+    return _pool('scada', settings.DB_SQL_DATABASE_SCADA)
+
+
+def pool_cmd():
+    """
+    Pool de la base de datos CMD (settings.DB_SQL_DATABASE, tablas CMD*).
+    """
+    return _pool('cmd', settings.DB_SQL_DATABASE)
+
+
+def conexion_scada():
+    return pool_scada().conexion()
+
+
+def conexion_cmd():
+    return pool_cmd().conexion()
+
+
+def registrar_estadisticas_pools():
+    """
+    Registra en el log las estadísticas de uso de los pools creados.
+    """
+    for nombre, pool in list(_pools.items()):
+        stats = pool.estadisticas()
+        logging.info(
+            f"Pool {nombre}: {stats['entregadas']} entregas, {stats['creadas']} creadas, "
+            f"{stats['reutilizadas']} reutilizadas, {stats['descartadas']} descartadas, "
+            f"espera promedio {stats['espera_promedio']:.3f} s, máxima {stats['espera_maxima']:.3f} s"
+        )
@@ -0,0 +1,412 @@
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+import pyodbc
+from django.conf import settings
+
+from master.conexiones import conexion_cmd
+from master.models import Central, Homologacion
+from master.registro import nombre_tabla_cmd, nombre_columna_cmd
+
+
+TIPO_COLUMNA_CMD = 'DECIMAL(10, 3)'
+ALMACENAMIENTOS_CMD = ('rowstore', 'particionado', 'columnstore')
+FUNCION_PARTICION_CMD = 'PF_CMD_mensual'
+ESQUEMA_PARTICION_CMD = 'PS_CMD_mensual'
+
+ReporteEsquema = namedtuple(
+    'ReporteEsquema',
+    [
+        'tabla', 'existia', 'columnas_agregadas', 'columnas_faltantes', 'indice_timestamp', 'almacenamiento',
+        'acciones', 'problemas',
+    ],
+)
+
+
+def _almacenamiento(almacenamiento=None):
+    almacenamiento = almacenamiento or settings.ETL_CMD_ALMACENAMIENTO
+    if almacenamiento not in ALMACENAMIENTOS_CMD:
+        raise ValueError(f"Almacenamiento CMD desconocido: {almacenamiento}")
+    return almacenamiento
+
+
+def _mes(fecha):
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes, meses):
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def columnas_homologadas(central):
+    """
+    Columnas CMD de todas las homologaciones de la central, como las crea crear_tabla_sqlserver_con_cabeceras.
+    """
+    cabeceras = Homologacion.objects.filter(nivel__central=central).values_list('cabecera_cmd', flat=True).distinct()
+    return [nombre_columna_cmd(c) for c in cabeceras]
+
+
+def _columnas_tabla(cursor, nombre_tabla):
+    """
+    {columna: admite NULL} de la tabla, o None si no existe.
+    """
+    cursor.execute(
+        "SELECT COLUMN_NAME, IS_NULLABLE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION",
+        nombre_tabla
+    )
+    filas = cursor.fetchall()
+    if not filas:
+        return None
+    return {columna: nullable == 'YES' for columna, nullable in filas}
+
+
+def _indices_tabla(cursor, nombre_tabla):
+    """
+    {índice: (tipo, único, clave primaria, [columnas clave])} de la tabla según sys.indexes.
+    """
+    cursor.execute("""
+        SELECT i.name, i.type_desc, i.is_unique, i.is_primary_key, c.name
+        FROM sys.indexes i
+        LEFT JOIN sys.index_columns ic
+            ON ic.object_id = i.object_id AND ic.index_id = i.index_id AND ic.key_ordinal > 0
+        LEFT JOIN sys.columns c
+            ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        WHERE i.object_id = OBJECT_ID(?) AND i.type > 0
+        ORDER BY i.index_id, ic.key_ordinal
+    """, f"[{nombre_tabla}]")
+    indices = {}
+    for nombre, tipo, unico, primaria, columna in cursor.fetchall():
+        _, _, _, columnas = indices.setdefault(nombre, (tipo, bool(unico), bool(primaria), []))
+        if columna is not None:
+            columnas.append(columna)
+    return indices
+
+
+def _tiene_indice_timestamp(indices):
+    return any(unico and columnas == ['timestamp'] for _, unico, _, columnas in indices.values())
+
+
+def _almacenamiento_tabla(cursor, nombre_tabla):
+    """
+    'columnstore', 'particionado' o 'rowstore' según el índice agrupado (o heap) de la tabla.
+    """
+    cursor.execute("""
+        SELECT i.type_desc, ds.type_desc
+        FROM sys.indexes i
+        JOIN sys.data_spaces ds ON ds.data_space_id = i.data_space_id
+        WHERE i.object_id = OBJECT_ID(?) AND i.index_id IN (0, 1)
+    """, f"[{nombre_tabla}]")
+    tipo_indice, tipo_espacio = cursor.fetchone()
+    if tipo_indice == 'CLUSTERED COLUMNSTORE':
+        return 'columnstore'
+    if tipo_espacio == 'PARTITION_SCHEME':
+        return 'particionado'
+    return 'rowstore'
+
+
+def asegurar_particion_mensual(cursor):
+    """
+    Crea la función y el esquema de partición mensual sobre [timestamp] si no existen, con un límite
+    por mes desde settings.ETL_CMD_PARTICION_DESDE hasta ETL_CMD_PARTICION_MESES_ADELANTE meses después del actual.
+    Devuelve True si los creó.
+    """
+    cursor.execute("SELECT COUNT(*) FROM sys.partition_functions WHERE name = ?", FUNCION_PARTICION_CMD)
+    if cursor.fetchone()[0]:
+        return False
+    mes = _mes(datetime.fromisoformat(settings.ETL_CMD_PARTICION_DESDE))
+    hasta = _sumar_meses(_mes(datetime.now()), settings.ETL_CMD_PARTICION_MESES_ADELANTE)
+    # Literales 'YYYYMMDD': no dependen del DATEFORMAT ni del idioma de la sesión
+    limites = []
+    while mes <= hasta:
+        limites.append(f"'{mes:%Y%m%d}'")
+        mes = _sumar_meses(mes, 1)
+    cursor.execute(
+        f"CREATE PARTITION FUNCTION [{FUNCION_PARTICION_CMD}] (DATETIME) "
+        f"AS RANGE RIGHT FOR VALUES ({', '.join(limites)})"
+    )
+    cursor.execute(
+        f"CREATE PARTITION SCHEME [{ESQUEMA_PARTICION_CMD}] AS PARTITION [{FUNCION_PARTICION_CMD}] ALL TO ([PRIMARY])"
+    )
+    return True
+
+
+def _crear_tabla(cursor, nombre_tabla, columnas, almacenamiento):
+    """
+    Crea la tabla CMD con el almacenamiento indicado:
+    'rowstore' con clave primaria agrupada sobre [timestamp], 'particionado' igual pero sobre el esquema
+    de partición mensual, o 'columnstore' con índice columnar agrupado e índice único no agrupado sobre [timestamp].
+    """
+    columnas_sql = ', '.join(['[timestamp] DATETIME NOT NULL'] + [f'[{c}] {TIPO_COLUMNA_CMD} NULL' for c in columnas])
+    if almacenamiento == 'columnstore':
+        cursor.execute(f"CREATE TABLE [{nombre_tabla}] ({columnas_sql})")
+        cursor.execute(f"CREATE CLUSTERED COLUMNSTORE INDEX [CCI_{nombre_tabla}] ON [{nombre_tabla}]")
+        cursor.execute(
+            f"CREATE UNIQUE NONCLUSTERED INDEX [UX_{nombre_tabla}_timestamp] ON [{nombre_tabla}] ([timestamp])"
+        )
+        return
+    destino = ''
+    if almacenamiento == 'particionado':
+        asegurar_particion_mensual(cursor)
+        destino = f" ON [{ESQUEMA_PARTICION_CMD}] ([timestamp])"
+    cursor.execute(
+        f"CREATE TABLE [{nombre_tabla}] ({columnas_sql}, "
+        f"CONSTRAINT [PK_{nombre_tabla}] PRIMARY KEY CLUSTERED ([timestamp])){destino}"
+    )
+
+
+def _convertir_almacenamiento(cursor, nombre_tabla, actual, almacenamiento, indices, problemas):
+    """
+    Convierte una tabla con índice único sobre [timestamp] de un almacenamiento a otro.
+    Las tablas columnstore no se convierten. Devuelve la acción realizada o None si no se pudo.
+    """
+    if actual == 'columnstore':
+        problemas.append(f"no se convierte una tabla columnstore a {almacenamiento}")
+        return None
+    agrupado = next(
+        ((nombre, primaria) for nombre, (tipo, unico, primaria, columnas) in indices.items()
+         if tipo == 'CLUSTERED' and unico and columnas == ['timestamp']),
+        None
+    )
+    if agrupado is None:
+        problemas.append("el índice agrupado no es el índice único sobre [timestamp]; no se convierte")
+        return None
+    nombre, primaria = agrupado
+
+    if almacenamiento == 'columnstore':
+        if primaria:
+            cursor.execute(f"ALTER TABLE [{nombre_tabla}] DROP CONSTRAINT [{nombre}]")
+        else:
+            cursor.execute(f"DROP INDEX [{nombre}] ON [{nombre_tabla}]")
+        cursor.execute(f"CREATE CLUSTERED COLUMNSTORE INDEX [CCI_{nombre_tabla}] ON [{nombre_tabla}]")
+        cursor.execute(
+            f"CREATE UNIQUE NONCLUSTERED INDEX [UX_{nombre_tabla}_timestamp] ON [{nombre_tabla}] ([timestamp])"
+        )
+    else:
+        if almacenamiento == 'particionado':
+            asegurar_particion_mensual(cursor)
+            destino = f"[{ESQUEMA_PARTICION_CMD}] ([timestamp])"
+        else:
+            destino = "[PRIMARY]"
+        cursor.execute(
+            f"CREATE UNIQUE CLUSTERED INDEX [{nombre}] ON [{nombre_tabla}] ([timestamp]) "
+            f"WITH (DROP_EXISTING = ON) ON {destino}"
+        )
+    return f"almacenamiento convertido de {actual} a {almacenamiento}"
+
+
+def _agregar_columnas(cursor, nombre_tabla, columnas):
+    cursor.execute(
+        f"ALTER TABLE [{nombre_tabla}] ADD " + ', '.join(f'[{c}] {TIPO_COLUMNA_CMD} NULL' for c in columnas)
+    )
+    return f"columnas agregadas: {', '.join(columnas)}"
+
+
+def _reparar_indice_timestamp(cursor, nombre_tabla, columnas_tabla, indices, problemas):
+    """
+    Crea el índice único sobre [timestamp] de una tabla existente: agrupado si la tabla es un heap,
+    no agrupado si ya tiene otro índice agrupado. Devuelve la acción realizada o None si no se pudo.
+    """
+    cursor.execute(
+        f"SELECT COUNT(*) FROM (SELECT [timestamp] FROM [{nombre_tabla}] GROUP BY [timestamp] HAVING COUNT(*) > 1) d"
+    )
+    duplicados = cursor.fetchone()[0]
+    if duplicados:
+        problemas.append(f"{duplicados} timestamps repetidos; no se puede crear el índice único")
+        return None
+
+    if columnas_tabla.get('timestamp', True):
+        cursor.execute(f"SELECT COUNT(*) FROM [{nombre_tabla}] WHERE [timestamp] IS NULL")
+        if cursor.fetchone()[0]:
+            problemas.append("hay filas con [timestamp] NULL; no se puede crear el índice único")
+            return None
+        cursor.execute(f"ALTER TABLE [{nombre_tabla}] ALTER COLUMN [timestamp] DATETIME NOT NULL")
+
+    agrupado = not any(tipo.startswith('CLUSTERED') for tipo, _, _, _ in indices.values())
+    tipo = 'CLUSTERED' if agrupado else 'NONCLUSTERED'
+    cursor.execute(f"CREATE UNIQUE {tipo} INDEX [UX_{nombre_tabla}_timestamp] ON [{nombre_tabla}] ([timestamp])")
+    return f"índice único {'agrupado' if agrupado else 'no agrupado'} sobre [timestamp] creado"
+
+
+def sincronizar_tabla_cmd(cursor, nombre_tabla, columnas, reparar=True, almacenamiento=None, convertir=False):
+    """
+    Compara la tabla CMD con las columnas esperadas y devuelve un ReporteEsquema.
+    Con reparar=True crea la tabla si no existe, con el almacenamiento indicado o el de settings.ETL_CMD_ALMACENAMIENTO,
+    agrega con ALTER TABLE ADD las columnas que faltan y crea el índice único sobre [timestamp] si falta.
+    Si la tabla tiene otro almacenamiento solo lo informa, salvo con convertir=True.
+    Con reparar=False solo informa. No confirma la transacción.
+    """
+    almacenamiento = _almacenamiento(almacenamiento)
+    acciones = []
+    problemas = []
+    columnas_tabla = _columnas_tabla(cursor, nombre_tabla)
+
+    if columnas_tabla is None:
+        if not reparar:
+            return ReporteEsquema(
+                nombre_tabla, False, [], list(columnas), False, None, acciones, ["la tabla no existe"]
+            )
+        _crear_tabla(cursor, nombre_tabla, columnas, almacenamiento)
+        acciones.append(f"tabla creada con {len(columnas)} columnas ({almacenamiento})")
+        return ReporteEsquema(nombre_tabla, False, list(columnas), [], True, almacenamiento, acciones, problemas)
+
+    faltantes = [c for c in columnas if c not in columnas_tabla]
+    agregadas = []
+    if faltantes and reparar:
+        acciones.append(_agregar_columnas(cursor, nombre_tabla, faltantes))
+        agregadas, faltantes = faltantes, []
+
+    indices = _indices_tabla(cursor, nombre_tabla)
+    indice_timestamp = _tiene_indice_timestamp(indices)
+    if not indice_timestamp:
+        if reparar:
+            accion = _reparar_indice_timestamp(cursor, nombre_tabla, columnas_tabla, indices, problemas)
+            if accion:
+                acciones.append(accion)
+                indice_timestamp = True
+        else:
+            problemas.append("falta el índice único sobre [timestamp]")
+
+    actual = _almacenamiento_tabla(cursor, nombre_tabla)
+    if actual != almacenamiento:
+        accion = None
+        if reparar and convertir and indice_timestamp:
+            accion = _convertir_almacenamiento(
+                cursor, nombre_tabla, actual, almacenamiento, _indices_tabla(cursor, nombre_tabla), problemas
+            )
+        if accion:
+            acciones.append(accion)
+            actual = almacenamiento
+        else:
+            problemas.append(f"almacenamiento {actual}, configurado {almacenamiento}")
+
+    return ReporteEsquema(nombre_tabla, True, agregadas, faltantes, indice_timestamp, actual, acciones, problemas)
+
+
+def sincronizar_tablas_cmd(reparar=True, centrales=None, almacenamiento=None, convertir=False):
+    """
+    Sincroniza (o, con reparar=False, solo revisa) las tablas CMD de las centrales indicadas o de todas,
+    con las columnas de Homologacion. Con convertir=True también lleva las tablas existentes al almacenamiento
+    configurado (reconstruye los índices, puede tardar en tablas grandes).
+    Confirma cada tabla por separado y registra el resultado en el log. Devuelve la lista de ReporteEsquema.
+    """
+    centrales = Central.objects.all() if centrales is None else centrales
+    reportes = []
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+        try:
+            for central in centrales:
+                nombre_tabla = nombre_tabla_cmd(central)
+                try:
+                    reporte = sincronizar_tabla_cmd(
+                        cursor, nombre_tabla, columnas_homologadas(central), reparar, almacenamiento, convertir
+                    )
+                    conn.commit()
+                except pyodbc.Error as e:
+                    conn.rollback()
+                    reporte = ReporteEsquema(nombre_tabla, None, [], [], False, None, [], [str(e)])
+                reportes.append(reporte)
+                for accion in reporte.acciones:
+                    logging.info(f"Esquema {nombre_tabla}: {accion}")
+                for problema in reporte.problemas:
+                    logging.warning(f"Esquema {nombre_tabla}: {problema}")
+        finally:
+            cursor.close()
+    return reportes
+
+
+_verificadas = set()
+_verificadas_lock = threading.Lock()
+
+
+def asegurar_tabla_cmd(cursor, nombre_tabla, columnas):
+    """
+    Antes de exportar, crea la tabla o agrega las columnas que falten para las columnas indicadas.
+    No revisa índices ni almacenamiento: eso solo lo hace sincronizar_tablas_cmd cuando se llama explícitamente.
+    Una tabla que no necesitó cambios no se vuelve a revisar con las mismas columnas dentro del proceso;
+    si hubo cambios se revisa de nuevo la próxima vez, por si la transacción que los contenía se deshizo.
+    """
+    clave = (nombre_tabla, frozenset(columnas))
+    with _verificadas_lock:
+        if clave in _verificadas:
+            return
+    columnas_tabla = _columnas_tabla(cursor, nombre_tabla)
+    if columnas_tabla is None:
+        almacenamiento = _almacenamiento()
+        _crear_tabla(cursor, nombre_tabla, columnas, almacenamiento)
+        logging.info(f"Esquema {nombre_tabla}: tabla creada con {len(columnas)} columnas ({almacenamiento})")
+        return
+    faltantes = [c for c in columnas if c not in columnas_tabla]
+    if faltantes:
+        logging.info(f"Esquema {nombre_tabla}: {_agregar_columnas(cursor, nombre_tabla, faltantes)}")
+        return
+    with _verificadas_lock:
+        _verificadas.add(clave)
+
+
+def _tablas_particionadas(cursor):
+    cursor.execute("""
+        SELECT DISTINCT OBJECT_NAME(i.object_id)
+        FROM sys.indexes i
+        JOIN sys.partition_schemes ps ON ps.data_space_id = i.data_space_id
+        WHERE ps.name = ? AND i.index_id IN (0, 1)
+    """, ESQUEMA_PARTICION_CMD)
+    return [tabla for tabla, in cursor.fetchall()]
+
+
+def mantener_particiones_cmd(meses_adelante=None, meses_retencion=None):
+    """
+    Ventana deslizante de la partición mensual de las tablas CMD:
+    crea los límites de los próximos meses_adelante meses (por defecto settings.ETL_CMD_PARTICION_MESES_ADELANTE)
+    y, si meses_retencion (por defecto settings.ETL_CMD_PARTICION_MESES_RETENCION) es mayor que cero,
+    vacía con TRUNCATE ... WITH (PARTITIONS (1)) y une los meses anteriores a la retención.
+    No hace nada si la función de partición no existe. Devuelve (límites creados, meses eliminados).
+    """
+    meses_adelante = settings.ETL_CMD_PARTICION_MESES_ADELANTE if meses_adelante is None else meses_adelante
+    meses_retencion = settings.ETL_CMD_PARTICION_MESES_RETENCION if meses_retencion is None else meses_retencion
+    mes_actual = _mes(datetime.now())
+    creados = 0
+    eliminados = 0
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT CAST(prv.value AS DATETIME)
+                FROM sys.partition_range_values prv
+                JOIN sys.partition_functions pf ON pf.function_id = prv.function_id
+                WHERE pf.name = ?
+                ORDER BY prv.boundary_id
+            """, FUNCION_PARTICION_CMD)
+            limites = [limite for limite, in cursor.fetchall()]
+            if not limites:
+                return creados, eliminados
+
+            siguiente = _sumar_meses(limites[-1], 1)
+            while siguiente <= _sumar_meses(mes_actual, meses_adelante):
+                cursor.execute(f"ALTER PARTITION SCHEME [{ESQUEMA_PARTICION_CMD}] NEXT USED [PRIMARY]")
+                cursor.execute(
+                    f"ALTER PARTITION FUNCTION [{FUNCION_PARTICION_CMD}]() SPLIT RANGE ('{siguiente:%Y%m%d}')"
+                )
+                creados += 1
+                siguiente = _sumar_meses(siguiente, 1)
+
+            if meses_retencion > 0:
+                limite_retencion = _sumar_meses(mes_actual, -meses_retencion)
+                tablas = _tablas_particionadas(cursor)
+                for limite in limites:
+                    if limite > limite_retencion:
+                        break
+                    for tabla in tablas:
+                        cursor.execute(f"TRUNCATE TABLE [{tabla}] WITH (PARTITIONS (1))")
+                    cursor.execute(
+                        f"ALTER PARTITION FUNCTION [{FUNCION_PARTICION_CMD}]() MERGE RANGE ('{limite:%Y%m%d}')"
+                    )
+                    eliminados += 1
+            conn.commit()
+        finally:
+            cursor.close()
+    if creados or eliminados:
+        logging.info(f"Particiones CMD: {creados} meses creados, {eliminados} meses eliminados")
+    return creados, eliminados
@@ -23,4 +23,4 @@ class ProfileForm(forms.ModelForm):
 class SensorForm(forms.ModelForm):
     class Meta:
         model = Homologacion
-        fields = ['id_scada', 'cabecera_cmd', 'nivel', 'estado', 'tipo']
\ No newline at end of file
+        fields = ['id_scada', 'cabecera_cmd', 'nivel', 'estado', 'tipo', 'agregacion', 'estrategia_completar', 'max_hueco_minutos']
\ No newline at end of file
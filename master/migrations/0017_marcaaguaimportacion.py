@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0016_etlprocesslogcron_proceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAguaImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_scada', models.CharField(max_length=50, unique=True)),
+                ('ultimo_timestamp', models.DateTimeField()),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0017_marcaaguaimportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homologacion',
+            name='agregacion',
+            field=models.CharField(choices=[('primero', 'Primero'), ('ultimo', 'Último'), ('promedio', 'Promedio'), ('minimo', 'Mínimo'), ('maximo', 'Máximo')], default='primero', max_length=20),
+        ),
+    ]
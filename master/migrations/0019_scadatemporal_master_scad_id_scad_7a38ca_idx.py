@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0018_homologacion_agregacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scadatemporal',
+            index=models.Index(fields=['id_scada', 'timestamp'], name='master_scad_id_scad_7a38ca_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0019_scadatemporal_master_scad_id_scad_7a38ca_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homologacion',
+            name='estrategia_completar',
+            field=models.CharField(blank=True, choices=[('', 'Según tipo'), ('lineal', 'Lineal'), ('mantener', 'Mantener último valor'), ('ninguna', 'No completar')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='homologacion',
+            name='max_hueco_minutos',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0020_homologacion_estrategia_completar_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoberturaSensor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_scada', models.CharField(max_length=50)),
+                ('dia', models.DateField()),
+                ('mapa', models.BinaryField()),
+                ('minutos', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='coberturasensor',
+            constraint=models.UniqueConstraint(fields=('id_scada', 'dia'), name='cobertura_sensor_dia'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0021_coberturasensor_coberturasensor_cobertura_sensor_dia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField()),
+                ('ultimo_minuto', models.DateTimeField(blank=True, null=True)),
+                ('registros', models.IntegerField(default=0)),
+                ('completado', models.BooleanField(default=False)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('central', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='master.central')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='checkpointexportacion',
+            constraint=models.UniqueConstraint(fields=('central', 'fecha_inicio', 'fecha_fin'), name='checkpoint_central_ventana'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master', '0022_checkpointexportacion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modo', models.CharField(max_length=20)),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField()),
+                ('celdas', models.PositiveIntegerField(blank=True, null=True)),
+                ('diferentes', models.PositiveIntegerField(default=0)),
+                ('faltan_en_cmd', models.PositiveIntegerField(default=0)),
+                ('sobran_en_cmd', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('central', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='master.central')),
+                ('proceso', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reconciliaciones', to='master.etlprocessstatecron')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('columna', models.CharField(max_length=100)),
+                ('timestamp', models.DateTimeField()),
+                ('valor_scada', models.FloatField(blank=True, null=True)),
+                ('valor_cmd', models.FloatField(blank=True, null=True)),
+                ('tipo', models.CharField(choices=[('diferente', 'Diferente'), ('falta_en_cmd', 'Falta en CMD'), ('sobra_en_cmd', 'Sobra en CMD')], max_length=20)),
+                ('central', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='master.central')),
+                ('resumen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultados', to='master.reconciliationsummary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['central', 'columna', 'timestamp'], name='master_reco_central_50cff9_idx'), models.Index(fields=['timestamp'], name='master_reco_timesta_d59771_idx'), models.Index(fields=['resumen', 'timestamp'], name='master_reco_resumen_4c1f99_idx')],
+            },
+        ),
+    ]
@@ -27,11 +27,30 @@ class Homologacion(models.Model):
         ('1', 'Numérico'),
         ('2', 'Booleano'),
     )
+    agregacion = (
+        ('primero', 'Primero'),
+        ('ultimo', 'Último'),
+        ('promedio', 'Promedio'),
+        ('minimo', 'Mínimo'),
+        ('maximo', 'Máximo'),
+    )
+    estrategia_completar = (
+        ('', 'Según tipo'),
+        ('lineal', 'Lineal'),
+        ('mantener', 'Mantener último valor'),
+        ('ninguna', 'No completar'),
+    )
     id_scada = models.CharField(max_length=50, unique=True)
     cabecera_cmd = models.CharField(max_length=50, unique=True)
     nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE)
     estado = models.BooleanField(default=True)
     tipo = models.CharField(max_length=50, default='1', choices=tipo)
+    # Cómo se reduce a un valor por minuto cuando el historiador registra varias muestras
+    agregacion = models.CharField(max_length=20, default='primero', choices=agregacion)
+    # Cómo se completan los minutos faltantes; vacío usa lineal para numéricos y ETL_COMPLETAR_ESTRATEGIA_BOOLEANO para booleanos
+    estrategia_completar = models.CharField(max_length=20, blank=True, default='', choices=estrategia_completar)
+    # Máxima distancia en minutos entre muestras para completar; vacío usa el valor de la etapa
+    max_hueco_minutos = models.PositiveIntegerField(blank=True, null=True)
 
 
 class ScadaTemporal(models.Model):
@@ -47,9 +66,59 @@ class ScadaTemporal(models.Model):
     nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE)
     tipo = models.CharField(max_length=50, default='1', choices=tipo)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_scada', 'timestamp']),
+        ]
+
     def __str__(self):
         return f"{self.id_scada} - {self.cabecera_cmd} - {self.valor}"
-    
+
+
+
+class MarcaAguaImportacion(models.Model):
+    id_scada = models.CharField(max_length=50, unique=True)
+    ultimo_timestamp = models.DateTimeField()
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.id_scada} - {self.ultimo_timestamp}"    
+
+
+class CoberturaSensor(models.Model):
+    id_scada = models.CharField(max_length=50)
+    dia = models.DateField()
+    # Un bit por minuto UTC del día (1440 bits): 1 si el sensor tiene registro en ScadaTemporal
+    mapa = models.BinaryField()
+    minutos = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['id_scada', 'dia'], name='cobertura_sensor_dia'),
+        ]
+
+    def __str__(self):
+        return f"{self.id_scada} - {self.dia} - {self.minutos}"
+
+
+class CheckpointExportacion(models.Model):
+    central = models.ForeignKey(Central, on_delete=models.CASCADE)
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField()
+    # Último minuto UTC de la ventana ya confirmado en la tabla CMD
+    ultimo_minuto = models.DateTimeField(blank=True, null=True)
+    registros = models.IntegerField(default=0)
+    completado = models.BooleanField(default=False)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['central', 'fecha_inicio', 'fecha_fin'], name='checkpoint_central_ventana'),
+        ]
+
+    def __str__(self):
+        return f"{self.central} - {self.fecha_inicio} - {self.ultimo_minuto}"
+
     
 class Parametro(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
@@ -127,4 +196,50 @@ class ETLProcessLogCron(models.Model):
     mensaje = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        return f"{self.etapa} - {self.fecha} - {'OK' if self.exito else 'ERROR'}"
\ No newline at end of file
+        return f"{self.etapa} - {self.fecha} - {'OK' if self.exito else 'ERROR'}"
+
+class ReconciliationSummary(models.Model):
+    proceso = models.ForeignKey(
+        ETLProcessStateCron, on_delete=models.CASCADE, null=True, blank=True, related_name='reconciliaciones'
+    )
+    central = models.ForeignKey(Central, on_delete=models.CASCADE)
+    modo = models.CharField(max_length=20)
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField()
+    celdas = models.PositiveIntegerField(null=True, blank=True)  # Celdas comparadas, si el modo las informa
+    diferentes = models.PositiveIntegerField(default=0)
+    faltan_en_cmd = models.PositiveIntegerField(default=0)
+    sobran_en_cmd = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def discrepancias(self):
+        return self.diferentes + self.faltan_en_cmd + self.sobran_en_cmd
+
+    def __str__(self):
+        return f"{self.central} - {self.fecha_inicio} - {self.discrepancias}"
+
+
+class ReconciliationResult(models.Model):
+    TIPOS = [
+        ('diferente', 'Diferente'),
+        ('falta_en_cmd', 'Falta en CMD'),
+        ('sobra_en_cmd', 'Sobra en CMD'),
+    ]
+    resumen = models.ForeignKey(ReconciliationSummary, on_delete=models.CASCADE, related_name='resultados')
+    central = models.ForeignKey(Central, on_delete=models.CASCADE)
+    columna = models.CharField(max_length=100)
+    timestamp = models.DateTimeField()  # Minuto UTC de la tabla CMD
+    valor_scada = models.FloatField(null=True, blank=True)
+    valor_cmd = models.FloatField(null=True, blank=True)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['central', 'columna', 'timestamp']),
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['resumen', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.central} - {self.columna} - {self.timestamp} - {self.tipo}"
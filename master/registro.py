@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from master.models import Homologacion
+
+
+SensorRegistro = namedtuple(
+    'SensorRegistro',
+    [
+        'id_scada', 'cabecera_cmd', 'columna', 'nivel', 'central', 'tabla_cmd', 'tipo', 'agregacion',
+        'estrategia_completar', 'max_hueco_minutos',
+    ],
+)
+
+
+def nombre_tabla_cmd(central):
+    """
+    Devuelve el nombre de la tabla CMD en SQL Server correspondiente a la central.
+    """
+    return 'CMD' + central.descripcion.replace(' ', '_')
+
+
+def nombre_columna_cmd(cabecera_cmd):
+    """
+    Devuelve el nombre de columna en la tabla CMD para una cabecera_cmd.
+    """
+    return cabecera_cmd.replace(' ', '_')
+
+
+class RegistroHomologacion:
+    """
+    Mapeo de los sensores activos (Homologacion, Nivel y Central con estado=True):
+    id_scada -> cabecera, columna CMD, nivel, central, tabla CMD, tipo, agregación por minuto
+    y estrategia de completado.
+    """
+
+    def __init__(self, sensores):
+        self.sensores = {s.id_scada: s for s in sensores}
+        self.centrales = {}
+        self._por_central = {}
+        for s in sensores:
+            self.centrales.setdefault(s.central.id, s.central)
+            self._por_central.setdefault(s.central.id, []).append(s)
+
+    def ids_scada(self):
+        return list(self.sensores)
+
+    def de_central(self, central):
+        """
+        Sensores activos de la central, en el orden de id_scada.
+        """
+        return self._por_central.get(central.id, [])
+
+    def columnas(self, central):
+        """
+        Columnas CMD de los sensores activos de la central.
+        """
+        return [s.columna for s in self.de_central(central)]
+
+
+_registro = None
+_construido = 0
+_lock = threading.Lock()
+
+
+def _construir_registro():
+    homologaciones = Homologacion.objects.filter(
+        estado=True, nivel__estado=True, nivel__central__estado=True
+    ).select_related('nivel__central').order_by('id_scada')
+    return RegistroHomologacion([
+        SensorRegistro(
+            id_scada=h.id_scada,
+            cabecera_cmd=h.cabecera_cmd,
+            columna=nombre_columna_cmd(h.cabecera_cmd),
+            nivel=h.nivel,
+            central=h.nivel.central,
+            tabla_cmd=nombre_tabla_cmd(h.nivel.central),
+            tipo=h.tipo,
+            agregacion=h.agregacion,
+            estrategia_completar=h.estrategia_completar,
+            max_hueco_minutos=h.max_hueco_minutos,
+        )
+        for h in homologaciones
+    ])
+
+
+def obtener_registro():
+    """
+    Devuelve el registro de sensores activos, construyéndolo solo si no existe o fue invalidado.
+    Las señales lo invalidan dentro del proceso; settings.ETL_REGISTRO_TTL_SEGUNDOS acota
+    el tiempo que otro proceso puede trabajar con un registro desactualizado.
+    """
+    global _registro, _construido
+    with _lock:
+        if _registro is None or time.monotonic() - _construido > settings.ETL_REGISTRO_TTL_SEGUNDOS:
+            _registro = _construir_registro()
+            _construido = time.monotonic()
+        return _registro
+
+
+def invalidar_registro(**kwargs):
+    """
+    Descarta el registro en memoria. Se conecta a post_save/post_delete de Homologacion, Nivel y Central.
+    """
+    global _registro
+    with _lock:
+        _registro = None
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Homologacion, Nivel, Central
+from .registro import invalidar_registro
+
+
+@receiver([post_save, post_delete], sender=Homologacion)
+@receiver([post_save, post_delete], sender=Nivel)
+@receiver([post_save, post_delete], sender=Central)
+def invalidar_registro_homologacion(sender, **kwargs):
+    invalidar_registro()
@@ -1,3 +1,979 @@
-from django.test import TestCase
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .cobertura import minutos_faltantes, registrar_cobertura, sensores_con_huecos
+from .models import (
+    Central,
+    CheckpointExportacion,
+    CoberturaSensor,
+    ETLProcessStateCron,
+    Homologacion,
+    MarcaAguaImportacion,
+    Nivel,
+    Profile,
+    ReconciliationResult,
+    ReconciliationSummary,
+    ScadaTemporal,
+)
+from .registro import obtener_registro
+from . import conexiones, esquema_cmd, utils
+from .utils import (
+    Discrepancia,
+    FiltroIdsScada,
+    MatrizMinutos,
+    ResultadoComparacion,
+    SerieScadaTemporal,
+    TOLERANCIA_CMD,
+    TOLERANCIA_COMPARACION,
+    _escribir_matriz_cmd_diferencial,
+    _exportar_central_con_checkpoint,
+    auditar_checksum_central,
+    cargar_muestras_completar,
+    comparar_matrices,
+    completar_serie,
+    construir_matriz_minutos,
+    exportar_scadatemporal_a_sqlserver,
+    guardar_scadatemporal,
+    importar_valores_scada_desde_sqlserver2,
+    importar_valores_scada_incremental,
+    interpolar_minutos_faltantes,
+    normalizar_lote_historicaldata,
+    registrar_resultado_comparacion,
+    validar_central_en_servidor,
+)
+
+
+ZONA_UTC = ZoneInfo('UTC')
+
+FilaHistorica = namedtuple('FilaHistorica', ['ID', 'Value', 'TimeStamp'])
+
+
+def minutos(*valores):
+    return np.array(valores, dtype='datetime64[m]')
+
+
+class ConexionFalsa:
+    """
+    Conexión pyodbc falsa: entrega siempre el mismo cursor y cuenta commits y rollbacks.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class CursorSqlServerFalso:
+    """
+    Cursor pyodbc falso: registra las sentencias y devuelve resultados[texto] cuando el texto aparece en la consulta.
+    """
+
+    def __init__(self, resultados=None):
+        self.resultados = resultados or {}
+        self.sentencias = []
+        self.lotes = []
+        self.fast_executemany = False
+        self._filas = []
+
+    def execute(self, sql, *params):
+        self.sentencias.append((sql, params))
+        self._filas = next((filas for texto, filas in self.resultados.items() if texto in sql), [])
+        return self
+
+    def executemany(self, sql, filas):
+        self.lotes.append((sql, list(filas)))
+
+    def fetchall(self):
+        return list(self._filas)
+
+    def fetchmany(self, cantidad):
+        filas, self._filas = self._filas[:cantidad], self._filas[cantidad:]
+        return filas
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else (0,)
+
+    def close(self):
+        pass
+
+
+def conexion_falsa(conn):
+    @contextmanager
+    def conexion():
+        yield conn
+    return conexion
+
+
+def crear_central():
+    """
+    Central con un nivel y dos sensores: A numérico (columna col_a) y B booleano (columna col_b).
+    """
+    central = Central.objects.create(descripcion='Central 1', codigo='C1')
+    nivel = Nivel.objects.create(descripcion='Nivel 1', central=central, codigo='N1')
+    Homologacion.objects.create(id_scada='A', cabecera_cmd='col a', nivel=nivel)
+    Homologacion.objects.create(id_scada='B', cabecera_cmd='col b', nivel=nivel, tipo='2')
+    return central, nivel
+
+
+def guardar_valores(nivel, id_scada, valores):
+    """
+    Guarda en ScadaTemporal (y en el índice de cobertura) los valores {datetime UTC: valor} de un sensor.
+    """
+    guardar_scadatemporal([
+        ScadaTemporal(
+            id_scada=id_scada, cabecera_cmd=f'col {id_scada.lower()}', valor=valor,
+            timestamp=fecha, timestamp_utc=fecha - timedelta(hours=5), nivel=nivel,
+        )
+        for fecha, valor in valores.items()
+    ], 'bulk_create')
+
+
+@override_settings(ETL_REGISTRO_TTL_SEGUNDOS=3600)
+class RegistroHomologacionTests(TestCase):
+    def test_se_reutiliza_hasta_que_una_senal_lo_invalida(self):
+        central, nivel = crear_central()
+        registro = obtener_registro()
+        self.assertIs(obtener_registro(), registro)
+        self.assertEqual(registro.columnas(central), ['col_a', 'col_b'])
+
+        sensor = Homologacion.objects.get(id_scada='B')
+        sensor.cabecera_cmd = 'col b2'
+        sensor.save()
+        self.assertEqual(obtener_registro().sensores['B'].columna, 'col_b2')
+
+        Homologacion.objects.get(id_scada='A').delete()
+        self.assertEqual(list(obtener_registro().sensores), ['B'])
+
+        nivel.estado = False
+        nivel.save()
+        self.assertEqual(obtener_registro().sensores, {})
+
+    def test_ttl_acota_los_cambios_de_otro_proceso(self):
+        crear_central()
+        registro = obtener_registro()
+        # update() no emite señales, como un cambio hecho desde otro proceso
+        Homologacion.objects.filter(id_scada='A').update(estado=False)
+        self.assertIs(obtener_registro(), registro)
+        with override_settings(ETL_REGISTRO_TTL_SEGUNDOS=-1):
+            self.assertEqual(list(obtener_registro().sensores), ['B'])
+
+
+class PoolConexionesTests(SimpleTestCase):
+    def crear_pool(self, tamano_maximo=2, verificar_segundos=3600):
+        conexiones_creadas = []
+
+        def conectar(cadena):
+            conexiones_creadas.append(mock.Mock())
+            return conexiones_creadas[-1]
+
+        parche = mock.patch.object(conexiones.pyodbc, 'connect', conectar, create=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+        pool = conexiones.PoolConexiones('prueba', 'BD', tamano_maximo, timeout=0.05, verificar_segundos=verificar_segundos)
+        return pool, conexiones_creadas
+
+    def test_reutiliza_la_conexion_devuelta(self):
+        pool, creadas = self.crear_pool()
+        with pool.conexion() as primera:
+            pass
+        with pool.conexion() as segunda:
+            pass
+
+        self.assertIs(primera, segunda)
+        primera.rollback.assert_called()
+        stats = pool.estadisticas()
+        self.assertEqual((stats['creadas'], stats['reutilizadas'], stats['libres']), (1, 1, 1))
+
+    def test_descarta_la_conexion_que_no_responde(self):
+        pool, creadas = self.crear_pool(verificar_segundos=0)
+        with pool.conexion() as primera:
+            pass
+        primera.cursor.return_value.execute.side_effect = conexiones.pyodbc.Error('conexión cerrada')
+
+        with pool.conexion() as segunda:
+            pass
+
+        self.assertIsNot(primera, segunda)
+        primera.close.assert_called_once()
+        stats = pool.estadisticas()
+        self.assertEqual((stats['creadas'], stats['descartadas']), (2, 1))
+
+    def test_error_operacional_descarta_la_conexion(self):
+        pool, creadas = self.crear_pool()
+        with self.assertRaises(conexiones.pyodbc.OperationalError):
+            with pool.conexion():
+                raise conexiones.pyodbc.OperationalError('enlace de comunicación')
+
+        self.assertEqual(pool.estadisticas()['libres'], 0)
+        creadas[0].close.assert_called_once()
+
+    def test_espera_acotada_cuando_el_pool_esta_lleno(self):
+        pool, _ = self.crear_pool(tamano_maximo=1)
+        conn = pool.obtener()
+        with self.assertRaises(TimeoutError):
+            pool.obtener()
+        pool.devolver(conn)
+        self.assertIs(pool.obtener(), conn)
+
+
+class FiltroIdsScadaTests(SimpleTestCase):
+    PLANTILLA = "SELECT h.ID FROM dbo.HistoricalData h INNER JOIN {filtro} ON f.ID = h.ID WHERE h.TimeStamp > ?"
+
+    def test_bloques_rellenos_con_null(self):
+        filtro = FiltroIdsScada(CursorSqlServerFalso(), ['A', 'B', 'C'], estrategia='bloques', tamano_bloque=2)
+
+        consultas = list(filtro.consultas(self.PLANTILLA, 'desde'))
+
+        self.assertEqual(len(consultas), 2)
+        # El texto es el mismo en todos los bloques para reutilizar el plan
+        self.assertEqual(consultas[0][0], consultas[1][0])
+        self.assertIn('(VALUES (?), (?)) AS f(ID)', consultas[0][0])
+        self.assertEqual([params for _, params in consultas], [['A', 'B', 'desde'], ['C', None, 'desde']])
+
+    def test_bloques_con_columnas_adicionales(self):
+        filtro = FiltroIdsScada(
+            CursorSqlServerFalso(), [('A', 1), ('B', 2), ('C', 3)],
+            columnas=[('Posicion', 'INT')], estrategia='bloques', tamano_bloque=2,
+        )
+
+        consultas = list(filtro.consultas(self.PLANTILLA, 'desde'))
+
+        self.assertIn('(VALUES (?, ?), (?, ?)) AS f(ID, Posicion)', consultas[0][0])
+        self.assertEqual(consultas[1][1], ['C', 3, None, None, 'desde'])
+
+    @override_settings(ETL_FILTRO_IDS_TIPO_TVP='dbo.IdsScada')
+    def test_tvp_solo_para_filas_de_id(self):
+        cursor = CursorSqlServerFalso()
+        self.assertEqual(FiltroIdsScada(cursor, ['A'], estrategia='tvp').estrategia, 'tvp')
+
+        cursor = CursorSqlServerFalso()
+        with self.assertLogs(level='INFO'):
+            filtro = FiltroIdsScada(cursor, [('A', 1)], columnas=[('Posicion', 'INT')], estrategia='tvp')
+        self.assertEqual(filtro.estrategia, 'bloques')
+        self.assertEqual(cursor.sentencias, [])
+
+
+class RegistrarCoberturaTests(TestCase):
+    def test_combina_los_mapas_de_varias_escrituras(self):
+        registrar_cobertura(['A', 'A', 'B'], minutos('2025-01-01T10:00', '2025-01-01T10:01', '2025-01-01T10:00'))
+        registrar_cobertura(['A', 'A'], minutos('2025-01-01T10:01', '2025-01-02T00:00'))
+
+        coberturas = {
+            (c.id_scada, c.dia): c.minutos for c in CoberturaSensor.objects.all()
+        }
+        self.assertEqual(coberturas, {
+            ('A', date(2025, 1, 1)): 2,
+            ('B', date(2025, 1, 1)): 1,
+            ('A', date(2025, 1, 2)): 1,
+        })
+
+    def test_minutos_faltantes(self):
+        registrar_cobertura(['A', 'A'], minutos('2025-01-01T10:00', '2025-01-01T10:02'))
+        inicio = datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC)
+        fin = datetime(2025, 1, 1, 10, 3, tzinfo=ZONA_UTC)
+
+        self.assertEqual(minutos_faltantes('A', inicio, fin), [
+            datetime(2025, 1, 1, 10, 1, tzinfo=ZONA_UTC),
+            datetime(2025, 1, 1, 10, 3, tzinfo=ZONA_UTC),
+        ])
+        self.assertEqual(sensores_con_huecos(['A', 'B'], inicio, fin), {'A', 'B'})
+        self.assertEqual(sensores_con_huecos(['A'], inicio, inicio), set())
+
+
+class InterpolarMinutosFaltantesTests(SimpleTestCase):
+    inicio = np.datetime64('2025-01-01T10:00', 'm')
+
+    def muestras(self, *filas):
+        codigos, desplazamientos, valores = zip(*filas)
+        return (
+            np.array(codigos, dtype=np.int64),
+            self.inicio + np.array(desplazamientos, dtype='timedelta64[m]'),
+            np.array(valores, dtype=np.float64),
+        )
+
+    def test_lineal_sin_mezclar_sensores(self):
+        codigos, mins, valores = self.muestras((0, 0, 0.0), (0, 4, 4.0), (1, 1, 10.0), (1, 3, 30.0))
+        resultado = interpolar_minutos_faltantes(
+            codigos, mins, valores, self.inicio, self.inicio + np.timedelta64(4, 'm'), [0, 1]
+        )
+        self.assertEqual(resultado[0].tolist(), [0, 0, 0, 1])
+        np.testing.assert_array_equal(resultado[1] - self.inicio, np.array([1, 2, 3, 2], dtype='timedelta64[m]'))
+        np.testing.assert_allclose(resultado[2], [1.0, 2.0, 3.0, 20.0])
+
+    def test_sin_muestra_anterior_o_siguiente(self):
+        codigos, mins, valores = self.muestras((0, 2, 2.0))
+        resultado = interpolar_minutos_faltantes(
+            codigos, mins, valores, self.inicio, self.inicio + np.timedelta64(4, 'm'), [0]
+        )
+        self.assertEqual(len(resultado[0]), 0)
+
+    def test_max_hueco(self):
+        codigos, mins, valores = self.muestras((0, 0, 0.0), (0, 3, 3.0), (0, 8, 8.0))
+        fin = self.inicio + np.timedelta64(8, 'm')
+        # Entre 10:00 y 10:03 hay 3 minutos (se completa); entre 10:03 y 10:08 hay 5 (no se completa)
+        resultado = interpolar_minutos_faltantes(codigos, mins, valores, self.inicio, fin, [0], max_hueco=3)
+        np.testing.assert_array_equal(resultado[1] - self.inicio, np.array([1, 2], dtype='timedelta64[m]'))
+
+        resultado = interpolar_minutos_faltantes(codigos, mins, valores, self.inicio, fin, [0], max_hueco=5)
+        self.assertEqual(len(resultado[0]), 6)
+
+    def test_max_hueco_por_codigo(self):
+        codigos, mins, valores = self.muestras((0, 0, 0.0), (0, 3, 3.0), (1, 0, 0.0), (1, 3, 3.0))
+        resultado = interpolar_minutos_faltantes(
+            codigos, mins, valores, self.inicio, self.inicio + np.timedelta64(3, 'm'), [0, 1],
+            max_hueco=np.array([2, 3])
+        )
+        self.assertEqual(resultado[0].tolist(), [1, 1])
+
+
+    def test_mantener(self):
+        codigos, mins, valores = self.muestras((0, 0, 1.0), (0, 2, 0.0))
+        resultado = interpolar_minutos_faltantes(
+            codigos, mins, valores, self.inicio, self.inicio + np.timedelta64(2, 'm'), [0], estrategia='mantener'
+        )
+        np.testing.assert_array_equal(resultado[2], [1.0])
+
+
+class CompletarSerieTests(TestCase):
+    def completar(self):
+        inicio = np.datetime64('2025-01-01T10:00', 'm')
+        serie = SerieScadaTemporal(
+            np.array(['A', 'B'], dtype=object),
+            np.array([0, 0, 1, 1]),
+            inicio + np.array([0, 2, 0, 2], dtype='timedelta64[m]'),
+            np.array([1.0, 2.0, 1.0, 0.0]),
+        )
+        codigos, _, valores = completar_serie(serie, inicio, inicio + np.timedelta64(2, 'm'), None)
+        return dict(zip(serie.ids[codigos].tolist(), valores.tolist()))
+
+    @override_settings(ETL_COMPLETAR_ESTRATEGIA_BOOLEANO='mantener')
+    def test_estrategia_segun_tipo(self):
+        crear_central()
+        self.assertEqual(self.completar(), {'A': 1.5, 'B': 1.0})
+
+    @override_settings(ETL_COMPLETAR_ESTRATEGIA_BOOLEANO='ninguna')
+    def test_booleanos_sin_completar(self):
+        crear_central()
+        self.assertEqual(self.completar(), {'A': 1.5})
+
+    def test_estrategia_de_la_homologacion(self):
+        crear_central()
+        sensor = Homologacion.objects.get(id_scada='A')
+        sensor.estrategia_completar = 'mantener'
+        sensor.save()
+        self.assertEqual(self.completar()['A'], 1.0)
+
+
+class CargarMuestrasCompletarTests(TestCase):
+    def test_vecinos_dentro_de_la_extension(self):
+        _, nivel = crear_central()
+        inicio = datetime(2025, 1, 2, 10, 0, tzinfo=ZONA_UTC)
+        guardar_valores(nivel, 'A', {
+            inicio - timedelta(days=3): 1.0,     # fuera de la extensión
+            inicio - timedelta(hours=1): 2.0,    # vecino anterior
+            inicio: 3.0,
+            inicio + timedelta(minutes=2): 4.0,  # 10:01 falta
+            inicio + timedelta(hours=2): 5.0,    # vecino siguiente
+        })
+
+        sensores, serie = cargar_muestras_completar(inicio, inicio + timedelta(minutes=5), timedelta(days=1))
+
+        self.assertEqual(set(sensores), {'A'})
+        self.assertEqual(serie.valores.tolist(), [2.0, 3.0, 4.0, 5.0])
+
+
+    def test_omite_sensores_sin_huecos_completables(self):
+        _, nivel = crear_central()
+        Homologacion.objects.filter(id_scada='B').delete()
+        Homologacion.objects.create(id_scada='B', cabecera_cmd='col b', nivel=nivel, estrategia_completar='ninguna')
+        Homologacion.objects.create(id_scada='C', cabecera_cmd='col c', nivel=nivel)
+        Homologacion.objects.create(id_scada='D', cabecera_cmd='col d', nivel=nivel, max_hueco_minutos=2)
+        inicio = datetime(2025, 1, 2, 10, 0, tzinfo=ZONA_UTC)
+
+        def en(*desplazamientos):
+            return {inicio + timedelta(minutes=m): float(m) for m in desplazamientos}
+
+        guardar_valores(nivel, 'A', en(0, 2, 3, 4, 5))  # 10:01 se puede completar
+        guardar_valores(nivel, 'B', en(0, 2, 3, 4, 5))  # estrategia 'ninguna'
+        guardar_valores(nivel, 'C', en(0, 1, 2, 3))     # hueco final sin muestra siguiente
+        guardar_valores(nivel, 'D', en(0, 4, 5))        # hueco mayor que max_hueco_minutos
+
+        sensores, _ = cargar_muestras_completar(inicio, inicio + timedelta(minutes=5), timedelta(hours=1))
+
+        self.assertEqual(set(sensores), {'A'})
+
+
+class CoberturaCentralJsonTests(TestCase):
+    def setUp(self):
+        self.central, nivel = crear_central()
+        usuario = User.objects.create_user('operador', password='clave')
+        Profile.objects.create(user=usuario, acceso_sensores=True)
+        self.client.force_login(usuario)
+        self.url = reverse('cobertura_central', args=[self.central.id])
+        guardar_valores(nivel, 'A', {datetime(2025, 1, 1, 10, m, tzinfo=ZONA_UTC): 1.0 for m in range(3)})
+
+    def test_cobertura_del_rango(self):
+        respuesta = self.client.get(self.url, {'inicio': '2025-01-01T10:00', 'fin': '2025-01-01T10:03'})
+
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos['central'], datos['minutos_esperados'], datos['minutos_cubiertos']), ('Central 1', 8, 3))
+        self.assertEqual(
+            {s['id_scada']: s['minutos_faltantes'] for s in datos['sensores']}, {'A': 1, 'B': 4}
+        )
+
+    def test_rango_demasiado_largo(self):
+        respuesta = self.client.get(self.url, {'inicio': '2025-01-01T00:00', 'fin': '2025-03-01T00:00'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_fecha_inexistente(self):
+        respuesta = self.client.get(self.url, {'inicio': '2025-02-30T00:00'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ConstruirMatrizMinutosTests(SimpleTestCase):
+    def test_ultimo_valor_gana_y_nan_sin_dato(self):
+        matriz = construir_matriz_minutos(
+            minutos('2025-01-01T10:01', '2025-01-01T10:00', '2025-01-01T10:01', '2025-01-01T10:00'),
+            np.array([0, 1, 0, 0]),
+            np.array([1.0, 2.0, 3.0, 4.0]),
+            ['a', 'b'],
+        )
+        np.testing.assert_array_equal(matriz.minutos, minutos('2025-01-01T10:00', '2025-01-01T10:01'))
+        self.assertEqual(matriz.columnas, ['a', 'b'])
+        np.testing.assert_array_equal(matriz.valores, [[4.0, 2.0], [3.0, np.nan]])
+
+    def test_vacia(self):
+        matriz = construir_matriz_minutos(minutos(), np.array([], dtype=np.int64), np.array([]), ['a'])
+        self.assertEqual(matriz.valores.shape, (0, 1))
+
+
+class EscribirMatrizCmdDiferencialTests(SimpleTestCase):
+    def escribir(self, existentes, valores):
+        cursor = CursorSqlServerFalso({'SELECT': existentes})
+        matriz = MatrizMinutos(
+            minutos('2025-01-01T10:00', '2025-01-01T10:01', '2025-01-01T10:02'), ['a', 'b'], np.array(valores)
+        )
+        insertadas = _escribir_matriz_cmd_diferencial(cursor, 'CMDX', matriz)
+        return insertadas, cursor.lotes
+
+    def test_solo_celdas_cambiadas(self):
+        existentes = [
+            (datetime(2025, 1, 1, 10, 0), 1.0, None),
+            (datetime(2025, 1, 1, 10, 1), 5.0, 7.0),
+        ]
+        insertadas, escrituras = self.escribir(existentes, [
+            [1.0 + TOLERANCIA_CMD / 2, 2.0],  # a dentro de la tolerancia, b sin valor guardado
+            [np.nan, 7.5],                     # a sin valor nuevo: no se escribe NULL
+            [3.0, np.nan],                     # minuto nuevo
+        ])
+        self.assertEqual(insertadas, 1)
+        inserciones = [filas for sql, filas in escrituras if sql.startswith('INSERT')]
+        self.assertEqual(inserciones, [[[datetime(2025, 1, 1, 10, 2), 3.0, None]]])
+        actualizaciones = [(sql, filas) for sql, filas in escrituras if sql.startswith('UPDATE')]
+        self.assertEqual(actualizaciones, [
+            ('UPDATE [CMDX] SET [b]=? WHERE [timestamp]=?', [
+                [2.0, datetime(2025, 1, 1, 10, 0)],
+                [7.5, datetime(2025, 1, 1, 10, 1)],
+            ]),
+        ])
+
+    def test_minuto_nuevo_sin_valores(self):
+        existentes = [(datetime(2025, 1, 1, 10, 0), 1.0, 2.0)]
+        insertadas, escrituras = self.escribir(existentes, [
+            [1.0, 2.0],
+            [np.nan, np.nan],
+            [np.nan, np.nan],
+        ])
+        self.assertEqual(insertadas, 0)
+        self.assertEqual(escrituras, [])
+
+
+class ExportarScadaTemporalTests(TestCase):
+    def test_error_de_una_tabla_falla_la_etapa(self):
+        crear_central()
+        otra = Central.objects.create(descripcion='Central 2', codigo='C2')
+        Homologacion.objects.create(
+            id_scada='C', cabecera_cmd='col c', nivel=Nivel.objects.create(descripcion='N', central=otra, codigo='N2')
+        )
+        conn = ConexionFalsa(mock.Mock())
+        escritas = []
+
+        def escribir(cursor, nombre_tabla, matriz):
+            if nombre_tabla == 'CMDCentral_1':
+                raise utils.pyodbc.Error('timeout')
+            escritas.append(nombre_tabla)
+            return 3
+
+        inicio = datetime(2025, 1, 1, tzinfo=ZONA_UTC)
+        with mock.patch.object(utils, 'conexion_cmd', conexion_falsa(conn)), \
+                mock.patch.object(utils, 'escribir_matriz_cmd', escribir):
+            with self.assertRaisesMessage(RuntimeError, 'CMDCentral_1'), self.assertLogs(level='ERROR'):
+                exportar_scadatemporal_a_sqlserver(inicio, inicio + timedelta(minutes=30))
+
+        self.assertEqual(escritas, ['CMDCentral_2'])
+        self.assertEqual((conn.commits, conn.rollbacks), (1, 1))
+
+
+class ExportarCentralConCheckpointTests(TestCase):
+    def test_retoma_desde_el_ultimo_lote_confirmado(self):
+        central, nivel = crear_central()
+        inicio = datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC)
+        fin = inicio + timedelta(minutes=5)
+        # La ventana se mide en timestamp_utc, cinco horas antes del timestamp SCADA
+        guardar_valores(nivel, 'A', {inicio + timedelta(hours=5, minutes=m): float(m) for m in range(6)})
+        lotes = []
+        fallar = [False, True]
+
+        def escribir(cursor, nombre_tabla, matriz):
+            if fallar and fallar.pop(0):
+                raise utils.pyodbc.Error('timeout')
+            lotes.append(matriz.minutos.tolist())
+            return len(matriz.minutos)
+
+        def exportar():
+            return _exportar_central_con_checkpoint(central, obtener_registro().columnas(central), inicio, fin, 2)
+
+        conn = ConexionFalsa(mock.Mock())
+        # La conexión de Django se cierra al terminar cada central; en la prueba no se puede cerrar
+        with mock.patch.object(utils, 'conexion_cmd', conexion_falsa(conn)), \
+                mock.patch.object(utils, 'escribir_matriz_cmd', escribir), \
+                mock.patch.object(utils, 'connection'):
+            with self.assertRaises(utils.pyodbc.Error):
+                exportar()
+            checkpoint = CheckpointExportacion.objects.get(central=central)
+            self.assertEqual((checkpoint.ultimo_minuto, checkpoint.registros), (inicio + timedelta(minutes=1), 2))
+
+            self.assertEqual(exportar(), 6)
+
+        self.assertEqual([lote[0] for lote in lotes], [
+            datetime(2025, 1, 1, 10, 0), datetime(2025, 1, 1, 10, 2), datetime(2025, 1, 1, 10, 4),
+        ])
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completado)
+        self.assertEqual(conn.commits, 3)
+
+
+class RegistrarResultadoComparacionTests(TestCase):
+    def setUp(self):
+        self.central, _ = crear_central()
+        inicio = datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC)
+        self.proceso = ETLProcessStateCron.objects.create(
+            fecha_hora_inicio=inicio, fecha_hora_fin=inicio + timedelta(hours=1), dia=inicio.date()
+        )
+        minuto = datetime(2025, 1, 1, 10, 0)
+        resultado = ResultadoComparacion(
+            [
+                Discrepancia('CMDCentral_1', minuto, 'col_a', 1.0, 2.0, 'diferente'),
+                Discrepancia('CMDCentral_1', minuto, 'col_b', 1.0, None, 'falta_en_cmd'),
+                Discrepancia('CMDCentral_1', minuto + timedelta(minutes=1), 'col_a', 3.0, 4.0, 'diferente'),
+            ],
+            [{'tabla': 'CMDCentral_1', 'celdas': 120, 'diferente': 2, 'falta_en_cmd': 1}],
+        )
+        registrar_resultado_comparacion(
+            resultado, 'conjuntos', inicio, inicio + timedelta(hours=1), self.proceso, tamano_lote=2
+        )
+
+    def test_resumen_y_discrepancias(self):
+        resumen = ReconciliationSummary.objects.get()
+        self.assertEqual(
+            (resumen.proceso, resumen.central, resumen.celdas, resumen.diferentes, resumen.faltan_en_cmd),
+            (self.proceso, self.central, 120, 2, 1),
+        )
+        self.assertEqual(resumen.discrepancias, 3)
+        self.assertEqual(
+            list(resumen.resultados.order_by('timestamp', 'columna').values_list('columna', 'timestamp', 'tipo')),
+            [
+                ('col_a', datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC), 'diferente'),
+                ('col_b', datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC), 'falta_en_cmd'),
+                ('col_a', datetime(2025, 1, 1, 10, 1, tzinfo=ZONA_UTC), 'diferente'),
+            ],
+        )
+
+    def test_vista_de_discrepancias(self):
+        usuario = User.objects.create_user('operador', password='clave')
+        Profile.objects.create(user=usuario, acceso_proceso_etl=True)
+        self.client.force_login(usuario)
+        url = reverse('etl_proceso_discrepancias', args=[self.proceso.id])
+
+        def contar(**filtros):
+            respuesta = self.client.get(url, filtros)
+            self.assertEqual(respuesta.status_code, 200)
+            return respuesta.context['pagina'].paginator.count
+
+        self.assertEqual(contar(), ReconciliationResult.objects.count())
+        self.assertEqual(contar(tipo='diferente'), 2)
+        self.assertEqual(contar(central=self.central.id, columna='col_b'), 1)
+        # Un id de central no numérico se ignora
+        self.assertEqual(contar(central='abc'), 3)
+
+
+class CompararMatricesTests(SimpleTestCase):
+    def test_codigos(self):
+        scada = np.array([[1.0, np.nan, 1.0, np.nan]])
+        cmd = np.array([[2.0, 1.0, np.nan, np.nan]])
+        presentes = np.ones(scada.shape, dtype=bool)
+        codigos = comparar_matrices(scada, presentes, cmd, np.zeros(4))
+        self.assertEqual(codigos.tolist(), [[1, 3, 2, 0]])
+
+    def test_borde_de_tolerancia(self):
+        scada = np.array([[2.0, 2.0, 10.0, 10.0]])
+        cmd = np.array([[1.5, 1.25, 10.004, 10.006]])
+        tolerancias = np.array([0.5, 0.5, TOLERANCIA_COMPARACION, TOLERANCIA_COMPARACION])
+        codigos = comparar_matrices(scada, np.ones(scada.shape, dtype=bool), cmd, tolerancias)
+        self.assertEqual(codigos.tolist(), [[0, 1, 0, 1]])
+
+    def test_booleanos_exactos(self):
+        codigos = comparar_matrices(np.array([[1.0]]), np.array([[True]]), np.array([[0.999]]), np.array([0.0]))
+        self.assertEqual(codigos.tolist(), [[1]])
+
+    def test_solo_celdas_presentes(self):
+        scada = np.array([[np.nan, 1.0]])
+        cmd = np.array([[5.0, 2.0]])
+        codigos = comparar_matrices(scada, np.array([[False, False]]), cmd, np.zeros(2))
+        self.assertEqual(codigos.tolist(), [[0, 0]])
+
+
+class ValidarCentralEnServidorTests(TestCase):
+    def test_agregacion_y_columnas_por_el_filtro(self):
+        central, _ = crear_central()
+        sensor = Homologacion.objects.get(id_scada='A')
+        sensor.agregacion = 'promedio'
+        sensor.save()
+        cursor = CursorSqlServerFalso({
+            'CROSS APPLY': [
+                (datetime(2025, 1, 1, 10, 1), 0, 1.5, 1.6),
+                (datetime(2025, 1, 1, 10, 2), 1, 1.0, None),
+            ],
+        })
+        inicio = datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC)
+
+        discrepancias, resumen = validar_central_en_servidor(
+            cursor, central, obtener_registro().de_central(central), inicio, inicio + timedelta(minutes=59)
+        )
+
+        self.assertEqual(
+            [(d.columna, d.tipo) for d in discrepancias], [('col_a', 'diferente'), ('col_b', 'falta_en_cmd')]
+        )
+        self.assertEqual((resumen['diferente'], resumen['falta_en_cmd']), (1, 1))
+        filas_filtro = cursor.lotes[0][1]
+        self.assertEqual(filas_filtro, [('A', 'promedio', 0, 0.005), ('B', 'primero', 1, 0.0)])
+        consulta, params = next(sentencia for sentencia in cursor.sentencias if 'CROSS APPLY' in sentencia[0])
+        self.assertNotIn("N'col_a'", consulta)
+        self.assertIn('h.TimeStamp >= ? AND h.TimeStamp < ?', consulta)
+        self.assertEqual(params[:2], (datetime(2025, 1, 1, 15, 0), datetime(2025, 1, 1, 16, 0)))
+
+
+class AuditarChecksumCentralTests(TestCase):
+    def test_solo_revisa_las_horas_y_columnas_distintas(self):
+        central, _ = crear_central()
+        cursor = CursorSqlServerFalso({
+            'celdas AS': [
+                (datetime(2025, 1, 1, 10), 0, 60, 6000, 183000, 60, 6000, 183000),
+                (datetime(2025, 1, 1, 10), 1, 60, 30000, 900000, 60, 30000, 900000),
+                (datetime(2025, 1, 1, 11), 0, 60, 6000, 183000, 59, 5900, 180000),
+                (datetime(2025, 1, 1, 11), 1, 60, 30000, 900000, 60, 30000, 900000),
+            ],
+            'ORDER BY Minuto': [(datetime(2025, 1, 1, 11, 30), 0, 1.0, None)],
+        })
+        inicio = datetime(2025, 1, 1, 10, 0, tzinfo=ZONA_UTC)
+
+        discrepancias, resumen = auditar_checksum_central(
+            cursor, central, obtener_registro().de_central(central), inicio, inicio + timedelta(hours=1, minutes=59)
+        )
+
+        self.assertEqual((resumen['horas'], resumen['horas_distintas'], resumen['falta_en_cmd']), (2, 1, 1))
+        self.assertEqual([(d.columna, d.tipo) for d in discrepancias], [('col_a', 'falta_en_cmd')])
+        revisiones = [params for sql, params in cursor.sentencias if 'ORDER BY Minuto' in sql]
+        self.assertEqual(revisiones, [(
+            datetime(2025, 1, 1, 16, 0), datetime(2025, 1, 1, 17, 0),
+            datetime(2025, 1, 1, 11, 0), datetime(2025, 1, 1, 11, 59),
+        )])
+        # La revisión minuto a minuto solo lleva el sensor de la columna distinta
+        self.assertEqual(cursor.lotes[-1][1], [('A', 'primero', 0, 0.005)])
+
+
+class NormalizarLoteHistoricalDataTests(SimpleTestCase):
+    def test_primera_fila_por_id_y_minuto_ordenada(self):
+        rows = [
+            ('B', '2', datetime(2025, 1, 1, 10, 0, 30)),
+            ('A', '3', datetime(2025, 1, 1, 10, 0, 40)),
+            ('A', '1', datetime(2025, 1, 1, 10, 0, 10)),
+            ('A', '4', datetime(2025, 1, 1, 10, 1, 0)),
+        ]
+        lote = normalizar_lote_historicaldata(rows, {})
+        self.assertEqual(lote.ids.tolist(), ['A', 'A', 'B'])
+        np.testing.assert_array_equal(lote.minutos, minutos('2025-01-01T10:00', '2025-01-01T10:01', '2025-01-01T10:00'))
+        np.testing.assert_array_equal(lote.valores, [1.0, 4.0, 2.0])
+
+    def test_coma_decimal(self):
+        rows = [('A', '1,5', datetime(2025, 1, 1, 10, 0)), ('A', '2.25', datetime(2025, 1, 1, 10, 1))]
+        lote = normalizar_lote_historicaldata(rows, {})
+        np.testing.assert_array_equal(lote.valores, [1.5, 2.25])
+
+    def test_minuto_tomado_en_el_lote_anterior(self):
+        ultimo_minuto = {}
+        normalizar_lote_historicaldata([('A', 1.0, datetime(2025, 1, 1, 10, 0, 10))], ultimo_minuto)
+        self.assertEqual(ultimo_minuto['A'], np.datetime64('2025-01-01T10:00'))
+
+        lote = normalizar_lote_historicaldata(
+            [('A', 2.0, datetime(2025, 1, 1, 10, 0, 50)), ('A', 3.0, datetime(2025, 1, 1, 10, 1, 5))], ultimo_minuto
+        )
+        np.testing.assert_array_equal(lote.minutos, minutos('2025-01-01T10:01'))
+        np.testing.assert_array_equal(lote.valores, [3.0])
+        self.assertEqual(ultimo_minuto['A'], np.datetime64('2025-01-01T10:01'))
+
+
+class ImportarValoresScadaEstandarTests(TestCase):
+    @override_settings(ETL_IMPORTAR_TAMANO_LOTE=2)
+    def test_un_registro_por_minuto_entre_lotes(self):
+        crear_central()
+        inicio = datetime(2025, 1, 1, 10, 0)
+        cursor = CursorSqlServerFalso({'SELECT h.ID': [
+            FilaHistorica('A', '1,5', inicio),
+            FilaHistorica('A', '9', inicio + timedelta(seconds=30)),  # mismo minuto, en el lote siguiente
+            FilaHistorica('A', '2', inicio + timedelta(minutes=1)),
+            FilaHistorica('B', '1', inicio),
+        ]})
+
+        with mock.patch.object(utils, 'conexion_scada', conexion_falsa(ConexionFalsa(cursor))):
+            importar_valores_scada_desde_sqlserver2(inicio, inicio + timedelta(hours=1), 'bulk_create')
+
+        self.assertEqual(
+            list(ScadaTemporal.objects.order_by('id_scada', 'timestamp').values_list(
+                'id_scada', 'cabecera_cmd', 'valor', 'timestamp', 'timestamp_utc'
+            )),
+            [
+                ('A', 'col a', 1.5, inicio.replace(tzinfo=ZONA_UTC), inicio.replace(hour=5, tzinfo=ZONA_UTC)),
+                ('A', 'col a', 2.0, inicio.replace(minute=1, tzinfo=ZONA_UTC), inicio.replace(hour=5, minute=1, tzinfo=ZONA_UTC)),
+                ('B', 'col b', 1.0, inicio.replace(tzinfo=ZONA_UTC), inicio.replace(hour=5, tzinfo=ZONA_UTC)),
+            ],
+        )
+
+
+class ImportarValoresScadaIncrementalTests(TestCase):
+    def test_retoma_desde_el_ultimo_lote_confirmado(self):
+        crear_central()
+        inicio = datetime(2025, 1, 1, 10, 0)
+        filas = [
+            FilaHistorica('A', '1', inicio),
+            FilaHistorica('A', '2', inicio + timedelta(minutes=1, seconds=20)),
+            FilaHistorica('A', '3', inicio + timedelta(minutes=1, seconds=40)),
+            FilaHistorica('A', '4', inicio + timedelta(minutes=2)),
+            FilaHistorica('B', '1', inicio),
+        ]
+
+        class CursorQueFalla(CursorSqlServerFalso):
+            # Falla al pedir el segundo lote, después de confirmar el primero
+            def fetchmany(self, cantidad):
+                if len(self._filas) < len(filas):
+                    raise utils.pyodbc.Error('conexión perdida')
+                return super().fetchmany(cantidad)
+
+        def importar(cursor):
+            with mock.patch.object(utils, 'conexion_scada', conexion_falsa(ConexionFalsa(cursor))):
+                return importar_valores_scada_incremental(
+                    inicio.replace(tzinfo=ZONA_UTC), inicio + timedelta(hours=1), retroceso_minutos=5, tamano_lote=2
+                )
+
+        with self.assertRaises(utils.pyodbc.Error):
+            importar(CursorQueFalla({'SELECT h.ID': filas}))
+        self.assertEqual(
+            dict(MarcaAguaImportacion.objects.values_list('id_scada', 'ultimo_timestamp')),
+            {'A': datetime(2025, 1, 1, 10, 1, 20, tzinfo=ZONA_UTC)},
+        )
+
+        cursor = CursorSqlServerFalso({'SELECT h.ID': filas})
+        self.assertEqual(importar(cursor), 2)
+
+        self.assertEqual(
+            list(ScadaTemporal.objects.order_by('id_scada', 'timestamp').values_list('id_scada', 'valor')),
+            [('A', 1.0), ('A', 2.0), ('A', 4.0), ('B', 1.0)],
+        )
+        self.assertEqual(
+            dict(MarcaAguaImportacion.objects.values_list('id_scada', 'ultimo_timestamp')),
+            {'A': inicio.replace(minute=2, tzinfo=ZONA_UTC), 'B': inicio.replace(tzinfo=ZONA_UTC)},
+        )
+        # El id con marca se lee desde su marca menos el retroceso, sin bajar de fecha_inicio
+        self.assertIn(('A', inicio), cursor.lotes[0][1])
+
+
+def catalogo_cmd(columnas=None, indices=(), almacenamiento=('CLUSTERED', 'ROWS_FILEGROUP'), duplicados=0, limites=(),
+                 tablas_particionadas=()):
+    """
+    Cursor falso con el catálogo de SQL Server de una tabla CMD: columnas {nombre: 'YES'/'NO'}, filas de índices
+    (nombre, tipo, único, primaria, columna), tipo del índice agrupado y del espacio de datos, timestamps repetidos
+    y límites y tablas de la partición mensual. Las claves van de la más específica a la más general.
+    """
+    return CursorSqlServerFalso({
+        'INFORMATION_SCHEMA': list((columnas or {}).items()),
+        'sys.data_spaces': [almacenamiento],
+        'sys.partition_range_values': [(limite,) for limite in limites],
+        'sys.partition_schemes': [(tabla,) for tabla in tablas_particionadas],
+        'sys.partition_functions': [(1 if limites else 0,)],
+        'sys.index_columns': list(indices),
+        'HAVING': [(duplicados,)],
+    })
+
+
+def ddl(cursor):
+    return [sql for sql, _ in cursor.sentencias if sql.split(None, 1)[0] in ('CREATE', 'ALTER', 'DROP', 'TRUNCATE')]
+
+
+@override_settings(ETL_CMD_ALMACENAMIENTO='rowstore')
+class SincronizarTablaCmdTests(SimpleTestCase):
+    def test_crea_la_tabla_con_clave_agrupada(self):
+        cursor = catalogo_cmd()
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a', 'b'])
+
+        self.assertFalse(reporte.existia)
+        self.assertEqual(ddl(cursor), [
+            'CREATE TABLE [CMDX] ([timestamp] DATETIME NOT NULL, [a] DECIMAL(10, 3) NULL, [b] DECIMAL(10, 3) NULL, '
+            'CONSTRAINT [PK_CMDX] PRIMARY KEY CLUSTERED ([timestamp]))',
+        ])
+
+    def test_repara_columnas_e_indice_de_un_heap(self):
+        cursor = catalogo_cmd({'timestamp': 'YES', 'a': 'YES'})
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a', 'b'])
+
+        self.assertEqual((reporte.columnas_agregadas, reporte.indice_timestamp, reporte.problemas), (['b'], True, []))
+        self.assertEqual(ddl(cursor), [
+            'ALTER TABLE [CMDX] ADD [b] DECIMAL(10, 3) NULL',
+            'ALTER TABLE [CMDX] ALTER COLUMN [timestamp] DATETIME NOT NULL',
+            'CREATE UNIQUE CLUSTERED INDEX [UX_CMDX_timestamp] ON [CMDX] ([timestamp])',
+        ])
+
+    def test_sin_reparar_solo_informa(self):
+        cursor = catalogo_cmd({'timestamp': 'YES', 'a': 'YES'})
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a', 'b'], reparar=False)
+
+        self.assertEqual(reporte.columnas_faltantes, ['b'])
+        self.assertEqual(reporte.problemas, ['falta el índice único sobre [timestamp]'])
+        self.assertEqual(ddl(cursor), [])
+
+    def test_timestamps_repetidos_impiden_el_indice(self):
+        cursor = catalogo_cmd({'timestamp': 'YES', 'a': 'YES'}, duplicados=3)
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a'])
+
+        self.assertFalse(reporte.indice_timestamp)
+        self.assertEqual(reporte.problemas, ['3 timestamps repetidos; no se puede crear el índice único'])
+        self.assertEqual(ddl(cursor), [])
+
+    def test_asegurar_solo_agrega_columnas(self):
+        with mock.patch.object(esquema_cmd, '_verificadas', set()):
+            cursor = catalogo_cmd({'timestamp': 'YES', 'a': 'YES'})
+            esquema_cmd.asegurar_tabla_cmd(cursor, 'CMDX', ['a', 'b'])
+            self.assertEqual(ddl(cursor), ['ALTER TABLE [CMDX] ADD [b] DECIMAL(10, 3) NULL'])
+
+            # Sin cambios queda verificada y no se vuelve a consultar el catálogo
+            cursor = catalogo_cmd({'timestamp': 'YES', 'a': 'YES', 'b': 'YES'})
+            esquema_cmd.asegurar_tabla_cmd(cursor, 'CMDX', ['a', 'b'])
+            esquema_cmd.asegurar_tabla_cmd(cursor, 'CMDX', ['a', 'b'])
+            self.assertEqual(len(cursor.sentencias), 1)
+
+
+class AlmacenamientoCmdTests(SimpleTestCase):
+    TABLA_CORRECTA = dict(
+        columnas={'timestamp': 'NO', 'a': 'YES'}, indices=[('PK_CMDX', 'CLUSTERED', True, True, 'timestamp')]
+    )
+
+    def test_crea_tabla_columnstore(self):
+        cursor = catalogo_cmd()
+        esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a'], almacenamiento='columnstore')
+
+        self.assertEqual(ddl(cursor), [
+            'CREATE TABLE [CMDX] ([timestamp] DATETIME NOT NULL, [a] DECIMAL(10, 3) NULL)',
+            'CREATE CLUSTERED COLUMNSTORE INDEX [CCI_CMDX] ON [CMDX]',
+            'CREATE UNIQUE NONCLUSTERED INDEX [UX_CMDX_timestamp] ON [CMDX] ([timestamp])',
+        ])
+
+    @override_settings(ETL_CMD_PARTICION_DESDE='2025-01-01', ETL_CMD_PARTICION_MESES_ADELANTE=0)
+    def test_crea_tabla_particionada(self):
+        cursor = catalogo_cmd()
+        with mock.patch.object(esquema_cmd, 'datetime', wraps=datetime) as fechas:
+            fechas.now.return_value = datetime(2025, 3, 15)
+            esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a'], almacenamiento='particionado')
+
+        self.assertEqual(ddl(cursor), [
+            "CREATE PARTITION FUNCTION [PF_CMD_mensual] (DATETIME) AS RANGE RIGHT FOR VALUES "
+            "('20250101', '20250201', '20250301')",
+            'CREATE PARTITION SCHEME [PS_CMD_mensual] AS PARTITION [PF_CMD_mensual] ALL TO ([PRIMARY])',
+            'CREATE TABLE [CMDX] ([timestamp] DATETIME NOT NULL, [a] DECIMAL(10, 3) NULL, '
+            'CONSTRAINT [PK_CMDX] PRIMARY KEY CLUSTERED ([timestamp])) ON [PS_CMD_mensual] ([timestamp])',
+        ])
+
+    def test_almacenamiento_distinto_solo_se_informa(self):
+        cursor = catalogo_cmd(**self.TABLA_CORRECTA)
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a'], almacenamiento='columnstore')
+
+        self.assertEqual(reporte.problemas, ['almacenamiento rowstore, configurado columnstore'])
+        self.assertEqual(ddl(cursor), [])
+
+    def test_convierte_a_columnstore(self):
+        cursor = catalogo_cmd(**self.TABLA_CORRECTA)
+        reporte = esquema_cmd.sincronizar_tabla_cmd(cursor, 'CMDX', ['a'], almacenamiento='columnstore', convertir=True)
+
+        self.assertEqual(reporte.almacenamiento, 'columnstore')
+        self.assertEqual(ddl(cursor), [
+            'ALTER TABLE [CMDX] DROP CONSTRAINT [PK_CMDX]',
+            'CREATE CLUSTERED COLUMNSTORE INDEX [CCI_CMDX] ON [CMDX]',
+            'CREATE UNIQUE NONCLUSTERED INDEX [UX_CMDX_timestamp] ON [CMDX] ([timestamp])',
+        ])
+
+    def test_almacenamiento_desconocido(self):
+        with self.assertRaisesMessage(ValueError, 'Almacenamiento CMD desconocido: x'):
+            esquema_cmd.sincronizar_tabla_cmd(catalogo_cmd(), 'CMDX', ['a'], almacenamiento='x')
+
+
+class MantenerParticionesCmdTests(SimpleTestCase):
+    def mantener(self, cursor, **kwargs):
+        conn = ConexionFalsa(cursor)
+        with mock.patch.object(esquema_cmd, 'conexion_cmd', conexion_falsa(conn)), \
+                mock.patch.object(esquema_cmd, 'datetime', wraps=datetime) as fechas:
+            fechas.now.return_value = datetime(2025, 6, 10)
+            resultado = esquema_cmd.mantener_particiones_cmd(**kwargs)
+        return resultado, conn
+
+    def test_ventana_deslizante(self):
+        limites = [datetime(2024, mes, 1) for mes in range(4, 13)] + [datetime(2025, mes, 1) for mes in range(1, 7)]
+        cursor = catalogo_cmd(limites=limites, tablas_particionadas=['CMDA', 'CMDB'])
+
+        (creados, eliminados), conn = self.mantener(cursor, meses_adelante=2, meses_retencion=12)
+
+        self.assertEqual((creados, eliminados), (2, 3))
+        self.assertEqual(conn.commits, 1)
+        sentencias = ddl(cursor)
+        self.assertEqual([sql for sql in sentencias if 'SPLIT' in sql], [
+            "ALTER PARTITION FUNCTION [PF_CMD_mensual]() SPLIT RANGE ('20250701')",
+            "ALTER PARTITION FUNCTION [PF_CMD_mensual]() SPLIT RANGE ('20250801')",
+        ])
+        self.assertEqual([sql for sql in sentencias if 'MERGE' in sql], [
+            "ALTER PARTITION FUNCTION [PF_CMD_mensual]() MERGE RANGE ('20240401')",
+            "ALTER PARTITION FUNCTION [PF_CMD_mensual]() MERGE RANGE ('20240501')",
+            "ALTER PARTITION FUNCTION [PF_CMD_mensual]() MERGE RANGE ('20240601')",
+        ])
+        # Cada mes eliminado se vacía en todas las tablas antes de unirlo
+        self.assertEqual(sentencias.count('TRUNCATE TABLE [CMDA] WITH (PARTITIONS (1))'), 3)
+        self.assertEqual(sentencias.count('TRUNCATE TABLE [CMDB] WITH (PARTITIONS (1))'), 3)
+
+    def test_sin_funcion_de_particion(self):
+        cursor = catalogo_cmd()
+        self.assertEqual(self.mantener(cursor, meses_adelante=2, meses_retencion=12)[0], (0, 0))
+        self.assertEqual(ddl(cursor), [])
@@ -15,6 +15,7 @@ urlpatterns = [
     path('usuarios/agregar/', agregar_usuario, name='agregar_usuario'),
     path('etl/procesos/', etl_procesos_list, name='etl_procesos_list'),
     path('etl/procesos/<int:proceso_id>/detalle/', etl_proceso_detalle, name='etl_proceso_detalle'),
+    path('etl/procesos/<int:proceso_id>/discrepancias/', etl_proceso_discrepancias, name='etl_proceso_discrepancias'),
     path('sensores/', sensores_list, name='sensores_list'),
     path('sensores/editar/<int:sensor_id>/', editar_sensor, name='editar_sensor'),
     path('sensores/agregar/', agregar_sensor, name='agregar_sensor'),
@@ -22,6 +23,7 @@ urlpatterns = [
     path('configuracion/editar/<int:parametro_id>/', editar_parametro, name='editar_parametro'),
     path('centrales/', centrales_list, name='centrales_list'),
     path('centrales/<int:central_id>/niveles/', ver_niveles, name='ver_niveles'),
+    path('centrales/<int:central_id>/cobertura/', cobertura_central_json, name='cobertura_central'),
     path('centrales/<int:central_id>/activar/', activar_central, name='activar_central'),
     path('centrales/<int:central_id>/desactivar/', desactivar_central, name='desactivar_central'),
     path('niveles/<int:nivel_id>/activar/', activar_nivel, name='activar_nivel'),
@@ -1,20 +1,29 @@
 import pandas as pd
-from master.models import Homologacion, Nivel, Central, ScadaTemporal, ETLProcessState, ETLProcessLog, ETLProcessStateCron, ETLProcessLogCron, Parametro
+import numpy as np
+from master.models import Homologacion, Nivel, Central, ScadaTemporal, ETLProcessState, ETLProcessLog, ETLProcessStateCron, ETLProcessLogCron, Parametro, MarcaAguaImportacion, CoberturaSensor, CheckpointExportacion, ReconciliationSummary, ReconciliationResult
 import pyodbc
 from django.conf import settings
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Min, Max
+from django.db.models import OuterRef, Q, Subquery
 from datetime import timedelta
 import logging
+import os
+import queue
+import threading
+import tempfile
 import time
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from zoneinfo import ZoneInfo
-from bisect import bisect_left
-from django.db import transaction
+from django.db import transaction, connection
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 from django.http import HttpResponseForbidden
 from django.utils.dateparse import parse_datetime
+from master.registro import obtener_registro, nombre_tabla_cmd
+from master.conexiones import conexion_scada, conexion_cmd, registrar_estadisticas_pools
+from master.cobertura import registrar_cobertura_scadatemporal, sensores_completables
+from master.esquema_cmd import asegurar_tabla_cmd, sincronizar_tablas_cmd, mantener_particiones_cmd
 
 
 def importar_tag_sro_a_homologacion(ruta_archivo):
@@ -64,45 +73,16 @@ def importar_tag_sro_a_homologacion(ruta_archivo):
 
 def crear_tabla_sqlserver_con_cabeceras():
     """
-    Crea una tabla en SQL Server con una columna por cada valor único de cabecera_cmd en Homologacion,
-    y siempre agrega una columna adicional llamada 'timestamp'.
-    Obtiene los datos de conexión desde settings.py.
-    """
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    central = Central.objects.all()
-
-    for c in central:
-        nombre_tabla = 'CMD' + c.descripcion.replace(' ', '_')
-        columnas = Homologacion.objects.filter(nivel__central=c).values_list('cabecera_cmd', flat=True).distinct()
-        columnas = [col.replace(' ', '_') for col in columnas]
-
-        # Agrega la columna timestamp al inicio
-        columnas_sql = '[timestamp] DATETIME, ' + ', '.join([f'[{col}] DECIMAL(10, 3)' for col in columnas])
-        sql = f"CREATE TABLE [{nombre_tabla}] ({columnas_sql});"
-
-        conn_str = (
-            f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-            f"SERVER={server};"
-            f"DATABASE={database};"
-            f"UID={username};"
-            f"PWD={password};"
-            "TrustServerCertificate=Yes;"
-        )
-
-        try:
-            conn = pyodbc.connect(conn_str)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            print("Error al crear la tabla:", sql)
+    Crea en SQL Server la tabla CMD de cada central, con una columna por cada valor único de cabecera_cmd
+    en Homologacion y la columna 'timestamp' como clave única, con el almacenamiento de settings.ETL_CMD_ALMACENAMIENTO.
+    Si la tabla ya existe, agrega las columnas que falten y el índice único sobre 'timestamp' si no lo tiene.
+    Devuelve la lista de ReporteEsquema de sincronizar_tablas_cmd.
+    """
+    reportes = sincronizar_tablas_cmd(reparar=True)
+    for reporte in reportes:
+        for problema in reporte.problemas:
+            print(f"Error en la tabla {reporte.tabla}: {problema}")
+    return reportes
 
 
 
@@ -113,115 +93,57 @@ def importar_valores_scada_desde_sqlserver(fecha_inicio, fecha_fin):
     con Quality=192 y TimeStamp en el rango dado, y guarda los resultados en ScadaTemporal.
     """
     # 1. Obtener los id_scada activos
-    homologaciones = Homologacion.objects.filter(estado=True)
-    ids_scada = list(homologaciones.values_list('id_scada', flat=True))
-    niveles = {h.id_scada: h.nivel for h in homologaciones}
+    sensores = obtener_registro().sensores
+    ids_scada = list(sensores)
 
     if not ids_scada:
         print("No hay id_scada activos.")
         return
 
     # 2. Conexión a SQL Server
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE_SCADA
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-
-    # 3. Consulta por cada id_scada
-    for id_scada in ids_scada:
-        query = """
-            SELECT ID, Value, TimeStamp
-            FROM dbo.HistoricalData
-            WHERE ID = ?
-              AND Quality = 192
-              AND TimeStamp BETWEEN ? AND ?
-            ORDER BY TimeStamp ASC
-        """
-        cursor.execute(query, id_scada, fecha_inicio, fecha_fin)
-        rows = cursor.fetchall()
-        nivel = niveles[id_scada]
-        minutos_vistos = set()
-        for row in rows:
-            minuto = row.TimeStamp.replace(second=0, microsecond=0)
-            if minuto in minutos_vistos:
-                continue
-            minutos_vistos.add(minuto)
-            ScadaTemporal.objects.create(
-                id_scada=row.ID,
-                cabecera_cmd=Homologacion.objects.get(id_scada=row.ID).cabecera_cmd,
-                timestamp=timezone.make_aware(minuto),
-                timestamp_utc=timezone.make_aware(minuto.replace(tzinfo=ZoneInfo('America/Lima'))),
-                valor=float(str(row.Value).replace(',', '.')),
-                nivel=nivel,
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
+
+        # 3. Consulta por cada id_scada
+        for id_scada in ids_scada:
+            query = """
+                SELECT ID, Value, TimeStamp
+                FROM dbo.HistoricalData
+                WHERE ID = ?
+                  AND Quality = 192
+                  AND TimeStamp BETWEEN ? AND ?
+                ORDER BY TimeStamp ASC
+            """
+            cursor.execute(query, id_scada, fecha_inicio, fecha_fin)
+            rows = cursor.fetchall()
+            nivel = sensores[id_scada].nivel
+            minutos_vistos = set()
+            for row in rows:
+                minuto = row.TimeStamp.replace(second=0, microsecond=0)
+                if minuto in minutos_vistos:
+                    continue
+                minutos_vistos.add(minuto)
+                ScadaTemporal.objects.create(
+                    id_scada=row.ID,
+                    cabecera_cmd=sensores[row.ID].cabecera_cmd,
+                    timestamp=timezone.make_aware(minuto),
+                    timestamp_utc=timezone.make_aware(minuto.replace(tzinfo=ZoneInfo('America/Lima'))),
+                    valor=float(str(row.Value).replace(',', '.')),
+                    nivel=nivel,
 
-            )
-    cursor.close()
-    conn.close()
+                )
+        cursor.close()
 
 
 def completar_minutos_faltantes_scadatemporal(fecha_inicio, fecha_fin):
     """
     Para cada id_scada en ScadaTemporal, verifica si hay un registro por minuto en el intervalo dado.
-    Si faltan minutos, interpola linealmente el valor y crea el registro faltante.
+    Si faltan minutos, los completa con la estrategia del sensor usando solo los registros del intervalo:
+    interpolación lineal para los numéricos; los booleanos según ETL_COMPLETAR_ESTRATEGIA_BOOLEANO,
+    sin crear registros cuando la estrategia es 'ninguna'.
     """
+    return _completar_minutos_faltantes(fecha_inicio, fecha_fin, None, extension=None)
 
-    ids = ScadaTemporal.objects.filter(timestamp__range=(fecha_inicio, fecha_fin)).values_list('id_scada', flat=True).distinct()
-    for id_scada in ids:
-        # Traer todos los registros ordenados por timestamp
-        registros = list(
-            ScadaTemporal.objects.filter(
-                id_scada=id_scada,
-                timestamp__range=(fecha_inicio, fecha_fin)
-            ).order_by('timestamp')
-        )
-        if not registros:
-            continue
-
-        # Crear un dict {timestamp: registro}
-        registros_por_minuto = {r.timestamp.replace(second=0, microsecond=0): r for r in registros}
-
-        # Definir el rango de minutos a revisar
-        t_actual = timezone.make_aware(fecha_inicio.replace(second=0, microsecond=0))
-        t_final = timezone.make_aware(fecha_fin.replace(second=0, microsecond=0))
-
-        while t_actual <= t_final:
-            if t_actual not in registros_por_minuto:
-                # Buscar los registros anterior y posterior para interpolar
-                prev = next((r for r in reversed(registros) if r.timestamp.replace(second=0, microsecond=0) < t_actual), None)
-                next_ = next((r for r in registros if r.timestamp.replace(second=0, microsecond=0) > t_actual), None)
-                if prev and next_:
-                    # Interpolación lineal
-                    total_secs = (next_.timestamp - prev.timestamp).total_seconds()
-                    if total_secs == 0:
-                        valor_interp = prev.valor
-                    else:
-                        secs_to_t = (t_actual - prev.timestamp).total_seconds()
-                        valor_interp = prev.valor + (next_.valor - prev.valor) * (secs_to_t / total_secs)
-                    ScadaTemporal.objects.create(
-                        id_scada=id_scada,
-                        cabecera_cmd=prev.cabecera_cmd,
-                        valor=valor_interp,
-                        timestamp=t_actual,
-                        timestamp_utc=t_actual - timedelta(hours=5),
-                        nivel=prev.nivel,
-                        tipo='2'
-                    )
-            t_actual += timedelta(minutes=1)
-    # Eliminar los booleanos que se hayan interpolado
-    ScadaTemporal.objects.filter(tipo='2', cabecera_cmd__in=Homologacion.objects.filter(tipo='2').values_list('cabecera_cmd', flat=True)).delete()
-            
 
 def exportar_scadatemporal_a_sqlserver(fecha_inicio, fecha_fin):
     """
@@ -229,86 +151,347 @@ def exportar_scadatemporal_a_sqlserver(fecha_inicio, fecha_fin):
     a las tablas correspondientes en la base de datos SCADA en SQL Server.
     Si el registro con ese timestamp existe, actualiza los campos; si no existe, lo crea.
     Solo inserta si al menos un sensor tiene valor (no None) en ese minuto.
+    Cada tabla se confirma por separado; si alguna falla, se deshace solo esa tabla, se continúa con las demás
+    y al final se lanza RuntimeError para que la etapa quede fallida y la ventana se vuelva a exportar.
     """
     contador_insert = 0
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-
-    centrales = Central.objects.filter(estado=True)
-
-    for central in centrales:
-        nombre_tabla = 'CMD' + central.descripcion.replace(' ', '_')
-        niveles = Nivel.objects.filter(central=central)
-        registros = ScadaTemporal.objects.filter(
-            nivel__in=niveles,
-            timestamp_utc__range=(fecha_inicio, fecha_fin)
-        ).order_by('timestamp_utc')
-
-        datos_por_minuto = {}
-        for reg in registros:
-            minuto = reg.timestamp_utc.replace(second=0, microsecond=0)
-            if minuto not in datos_por_minuto:
-                datos_por_minuto[minuto] = {}
-            datos_por_minuto[minuto][reg.cabecera_cmd.replace(' ', '_')] = reg.valor
-
-        cabeceras = Homologacion.objects.filter(nivel__central=central, estado=True, nivel__estado=True, nivel__central__estado=True).values_list('cabecera_cmd', flat=True)
-        cabeceras = [c.replace(' ', '_') for c in cabeceras]
-
-        for minuto, valores in datos_por_minuto.items():
-            # Validar que al menos un sensor esté completo (no None)
-            sensores_con_valor = [valores.get(c) for c in cabeceras if valores.get(c) is not None]
-            if not sensores_con_valor:
-                continue  # Omitir si todos son None
-
-            # Verifica si el registro existe
-            cursor.execute(f"SELECT COUNT(*) FROM [{nombre_tabla}] WHERE [timestamp]=?", minuto)
-            existe = cursor.fetchone()[0] > 0
+    errores = []
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
 
-            columnas = cabeceras
-            valores_update = [valores.get(c, None) for c in columnas]
+        registro = obtener_registro()
 
-            if existe:
-                # Actualiza solo los campos correspondientes
-                set_clause = ', '.join([f"[{col}]=?" for col in columnas])
-                sql = f"UPDATE [{nombre_tabla}] SET {set_clause} WHERE [timestamp]=?"
-                try:
-                    cursor.execute(sql, *valores_update, minuto)
-                except Exception as e:
-                    print(f"Error actualizando en {nombre_tabla} para {minuto}: {e}")
-            else:
-                # Inserta el registro nuevo solo si hay al menos un valor
-                contador_insert += 1
-                columnas_insert = ['timestamp'] + columnas
-                valores_insert = [minuto] + valores_update
-                # Validar que no sean todos None (además del timestamp)
-                if any(v is not None for v in valores_update):
-                    placeholders = ','.join(['?'] * len(columnas_insert))
-                    sql = f"INSERT INTO [{nombre_tabla}] ({','.join('['+c+']' for c in columnas_insert)}) VALUES ({placeholders})"
-                    try:
-                        cursor.execute(sql, *valores_insert)
-                    except Exception as e:
-                        print(f"Error insertando en {nombre_tabla} para {minuto}: {e}")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+        for central in registro.centrales.values():
+            nombre_tabla = nombre_tabla_cmd(central)
+            matriz = pivotear_scadatemporal(central, registro.columnas(central), fecha_inicio, fecha_fin)
+            try:
+                contador_insert += escribir_matriz_cmd(cursor, nombre_tabla, matriz)
+                conn.commit()
+            except pyodbc.Error as e:
+                conn.rollback()
+                logging.error(f"Error exportando a {nombre_tabla}: {e}")
+                errores.append(f"{nombre_tabla}: {e}")
+
+        cursor.close()
+    if errores:
+        raise RuntimeError(f"Error en la exportación: {'; '.join(errores)}")
     return contador_insert
 
 
+MatrizMinutos = namedtuple('MatrizMinutos', ['minutos', 'columnas', 'valores'])
+
+
+def construir_matriz_minutos(minutos, indices_columna, valores, columnas):
+    """
+    Arma una MatrizMinutos densa de minutos x columnas (NaN donde no hay valor) a partir de arreglos
+    de minutos (datetime64[m]), índice de columna y valor. Las filas quedan ordenadas por minuto
+    y las columnas en el orden de columnas. Si un minuto y columna se repiten, queda el último valor.
+    """
+    filas, fila = np.unique(minutos, return_inverse=True)
+    matriz = np.full((len(filas), len(columnas)), np.nan)
+    if len(fila):
+        celda = fila * len(columnas) + indices_columna
+        _, desde_el_final = np.unique(celda[::-1], return_index=True)
+        ultimo = len(celda) - 1 - desde_el_final
+        matriz.reshape(-1)[celda[ultimo]] = valores[ultimo]
+    return MatrizMinutos(filas, list(columnas), matriz)
+
+
+def _celdas_scadatemporal(central, columnas, fecha_inicio, fecha_fin):
+    """
+    Lee (timestamp_utc, cabecera_cmd, valor) de ScadaTemporal para la central en el rango de timestamp_utc
+    y devuelve (minutos, índice de columna, valores) de las filas cuyas cabeceras están en columnas.
+    """
+    filas = list(ScadaTemporal.objects.filter(
+        nivel__central=central,
+        timestamp_utc__range=(fecha_inicio, fecha_fin)
+    ).order_by('timestamp_utc', 'id').values_list('timestamp_utc', 'cabecera_cmd', 'valor'))
+    if not filas:
+        return np.array([], dtype='datetime64[m]'), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+    tiempos, cabeceras, valores = zip(*filas)
+    minutos = pd.to_datetime(list(tiempos), utc=True).tz_localize(None).values.astype('datetime64[m]')
+    posicion = {columna: i for i, columna in enumerate(columnas)}
+    indices_columna = np.array([posicion.get(c.replace(' ', '_'), -1) for c in cabeceras], dtype=np.int64)
+    valores = np.asarray(valores, dtype=np.float64)
+
+    # Solo las columnas de la tabla CMD
+    en_tabla = indices_columna >= 0
+    return minutos[en_tabla], indices_columna[en_tabla], valores[en_tabla]
+
+
+def pivotear_scadatemporal(central, columnas, fecha_inicio, fecha_fin):
+    """
+    Pivotea las filas de ScadaTemporal de la central en el rango de timestamp_utc
+    en una MatrizMinutos alineada con columnas (las columnas de la tabla CMD).
+    """
+    minutos, indices_columna, valores = _celdas_scadatemporal(central, columnas, fecha_inicio, fecha_fin)
+    return construir_matriz_minutos(minutos, indices_columna, valores, columnas)
+
+
+TABLA_STAGING_CMD = '#cmd_staging'
+# Diferencia mínima para considerar cambiado un valor de las columnas DECIMAL(10, 3) de las tablas CMD
+TOLERANCIA_CMD = 0.0005
+
+
+def escribir_matriz_cmd(cursor, nombre_tabla, matriz, modo=None):
+    """
+    Escribe una MatrizMinutos en la tabla CMD con el modo indicado o el de settings.ETL_EXPORTAR_MODO:
+    'merge' (escribe todas las columnas de cada minuto) o 'diferencial' (solo las celdas que cambiaron).
+    Antes de escribir crea la tabla o agrega las columnas que falten con asegurar_tabla_cmd.
+    Los errores de SQL Server se propagan. Devuelve la cantidad de registros insertados.
+    """
+    modos = {
+        'merge': _escribir_matriz_cmd_merge,
+        'diferencial': _escribir_matriz_cmd_diferencial,
+    }
+    modo = modo or settings.ETL_EXPORTAR_MODO
+    if modo not in modos:
+        raise ValueError(f"Modo de exportación desconocido: {modo}")
+    asegurar_tabla_cmd(cursor, nombre_tabla, matriz.columnas)
+    return modos[modo](cursor, nombre_tabla, matriz)
+
+
+def _filas_cmd(minutos, valores):
+    """
+    Filas [minuto, valor, ...] para pyodbc, con None en lugar de NaN.
+    """
+    objetos = valores.astype(object)
+    objetos[np.isnan(valores)] = None
+    return [[minuto] + fila for minuto, fila in zip(minutos.astype(datetime).tolist(), objetos.tolist())]
+
+
+def _escribir_matriz_cmd_merge(cursor, nombre_tabla, matriz):
+    """
+    Escribe la matriz con un solo MERGE: carga los minutos en la tabla temporal #cmd_staging
+    con fast_executemany y luego actualiza los timestamps que existen y crea los que no.
+    Solo escribe los minutos en los que al menos un sensor tiene valor (no None).
+    """
+    # Omitir si todos son None
+    con_valor = ~np.isnan(matriz.valores).all(axis=1)
+    if not con_valor.any():
+        return 0
+    filas = _filas_cmd(matriz.minutos[con_valor], matriz.valores[con_valor])
+
+    columnas = ['timestamp'] + matriz.columnas
+    lista_columnas = ', '.join(f'[{c}]' for c in columnas)
+    try:
+        # La tabla temporal copia los tipos de las columnas de la tabla CMD
+        cursor.execute(f"IF OBJECT_ID('tempdb..{TABLA_STAGING_CMD}') IS NOT NULL DROP TABLE {TABLA_STAGING_CMD}")
+        cursor.execute(f"SELECT TOP 0 {lista_columnas} INTO {TABLA_STAGING_CMD} FROM [{nombre_tabla}]")
+        cursor.fast_executemany = True
+        try:
+            cursor.executemany(
+                f"INSERT INTO {TABLA_STAGING_CMD} ({lista_columnas}) VALUES ({', '.join(['?'] * len(columnas))})",
+                filas
+            )
+        finally:
+            cursor.fast_executemany = False
+
+        set_clause = ', '.join(f"t.[{c}] = s.[{c}]" for c in matriz.columnas)
+        cursor.execute(f"""
+            MERGE [{nombre_tabla}] AS t
+            USING {TABLA_STAGING_CMD} AS s
+                ON t.[timestamp] = s.[timestamp]
+            WHEN MATCHED THEN
+                UPDATE SET {set_clause}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({lista_columnas}) VALUES ({', '.join(f's.[{c}]' for c in columnas)})
+            OUTPUT $action;
+        """)
+        acciones = cursor.fetchall()
+    finally:
+        try:
+            cursor.execute(f"IF OBJECT_ID('tempdb..{TABLA_STAGING_CMD}') IS NOT NULL DROP TABLE {TABLA_STAGING_CMD}")
+        except pyodbc.Error:
+            pass
+    return sum(1 for accion in acciones if accion[0] == 'INSERT')
+
+
+def _leer_matriz_cmd(cursor, nombre_tabla, columnas, minuto_inicio, minuto_fin):
+    """
+    Lee en una sola consulta las filas de la tabla CMD entre dos minutos y las devuelve como
+    MatrizMinutos con las columnas indicadas. Si un timestamp está repetido, se toma la primera fila.
+    """
+    lista_columnas = ', '.join(f'[{c}]' for c in ['timestamp'] + columnas)
+    cursor.execute(
+        f"SELECT {lista_columnas} FROM [{nombre_tabla}] WHERE [timestamp] BETWEEN ? AND ? ORDER BY [timestamp]",
+        minuto_inicio.astype(datetime), minuto_fin.astype(datetime)
+    )
+    filas = cursor.fetchall()
+    if not filas:
+        return MatrizMinutos(np.array([], dtype='datetime64[m]'), columnas, np.empty((0, len(columnas))))
+
+    df = pd.DataFrame.from_records([tuple(f) for f in filas], columns=['timestamp'] + columnas)
+    df = df.drop_duplicates('timestamp')
+    valores = df[columnas].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    return MatrizMinutos(pd.to_datetime(df['timestamp']).values.astype('datetime64[m]'), columnas, valores)
+
+
+def _escribir_matriz_cmd_diferencial(cursor, nombre_tabla, matriz):
+    """
+    Escribe la matriz comparándola con las filas que ya están en la tabla CMD, leídas en bloque:
+    inserta los minutos nuevos que tienen al menos un valor y, en los existentes, actualiza solo
+    las celdas con valor nuevo (no None) distinto del guardado. Así no se escribe NULL sobre columnas
+    sin dato nuevo (por ejemplo, las cargadas con importar_excel_a_cmd).
+    Las actualizaciones se agrupan por conjunto de columnas y se envían con executemany.
+    """
+    if not len(matriz.minutos):
+        return 0
+    columnas = matriz.columnas
+    existentes = _leer_matriz_cmd(cursor, nombre_tabla, columnas, matriz.minutos[0], matriz.minutos[-1])
+
+    # Fila existente de cada minuto de la matriz, o -1
+    posicion = np.searchsorted(existentes.minutos, matriz.minutos)
+    encontrada = posicion < len(existentes.minutos)
+    encontrada[encontrada] = existentes.minutos[posicion[encontrada]] == matriz.minutos[encontrada]
+
+    # Minutos nuevos: se insertan si al menos un sensor tiene valor
+    nuevas = ~encontrada & ~np.isnan(matriz.valores).all(axis=1)
+    if nuevas.any():
+        lista_columnas = ', '.join(f'[{c}]' for c in ['timestamp'] + columnas)
+        cursor.fast_executemany = True
+        try:
+            cursor.executemany(
+                f"INSERT INTO [{nombre_tabla}] ({lista_columnas}) VALUES ({', '.join(['?'] * (len(columnas) + 1))})",
+                _filas_cmd(matriz.minutos[nuevas], matriz.valores[nuevas])
+            )
+        finally:
+            cursor.fast_executemany = False
+
+    # Minutos existentes: solo las celdas con valor nuevo distinto del guardado
+    nuevos = matriz.valores[encontrada]
+    guardados = existentes.valores[posicion[encontrada]]
+    cambios = ~np.isnan(nuevos) & (np.isnan(guardados) | (np.abs(nuevos - guardados) > TOLERANCIA_CMD))
+    con_cambios = cambios.any(axis=1)
+    if con_cambios.any():
+        minutos = matriz.minutos[encontrada][con_cambios].astype(datetime).tolist()
+        nuevos = nuevos[con_cambios]
+        patrones, grupo = np.unique(cambios[con_cambios], axis=0, return_inverse=True)
+        grupo = grupo.reshape(-1)
+        for i, patron in enumerate(patrones):
+            en_grupo = np.flatnonzero(grupo == i)
+            set_clause = ', '.join(f"[{c}]=?" for c, cambia in zip(columnas, patron) if cambia)
+            filas = [nuevos[fila][patron].tolist() + [minutos[fila]] for fila in en_grupo.tolist()]
+            cursor.fast_executemany = True
+            try:
+                cursor.executemany(f"UPDATE [{nombre_tabla}] SET {set_clause} WHERE [timestamp]=?", filas)
+            finally:
+                cursor.fast_executemany = False
+    return int(nuevas.sum())
+
+
+def _exportar_central_con_checkpoint(central, columnas, fecha_inicio, fecha_fin, minutos_por_lote):
+    """
+    Exporta la ventana de una central en lotes de minutos_por_lote minutos con su propia conexión,
+    confirmando cada lote y guardando el último minuto confirmado en CheckpointExportacion.
+    Si la ventana ya tiene un checkpoint, continúa desde el minuto siguiente.
+    La ventana solo queda completada si insertó registros y su fin es anterior al retraso de ingesta
+    (settings.ETL_EXPORTAR_RETRASO_INGESTA_MINUTOS); si no, el checkpoint vuelve al inicio para que
+    una nueva ejecución exporte los datos que lleguen tarde.
+    Devuelve la cantidad de registros insertados en la ventana, sumando las ejecuciones anteriores.
+    """
+    try:
+        checkpoint, _ = CheckpointExportacion.objects.get_or_create(
+            central=central, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin
+        )
+        if checkpoint.completado:
+            return checkpoint.registros
+
+        desde = fecha_inicio
+        if checkpoint.ultimo_minuto is not None:
+            desde = checkpoint.ultimo_minuto + timedelta(minutes=1)
+            logging.info(f"Exportación de {central}: se reanuda desde {desde}")
+
+        matriz = pivotear_scadatemporal(central, columnas, desde, fecha_fin)
+        nombre_tabla = nombre_tabla_cmd(central)
+        minuto_fin = minuto_utc(fecha_fin)
+        lote_inicio = minuto_utc(desde)
+        paso = np.timedelta64(minutos_por_lote, 'm')
+
+        with conexion_cmd() as conn:
+            cursor = conn.cursor()
+            try:
+                while lote_inicio <= minuto_fin:
+                    lote_fin = min(lote_inicio + paso - np.timedelta64(1, 'm'), minuto_fin)
+                    en_lote = (matriz.minutos >= lote_inicio) & (matriz.minutos <= lote_fin)
+                    lote = MatrizMinutos(matriz.minutos[en_lote], matriz.columnas, matriz.valores[en_lote])
+                    registros = escribir_matriz_cmd(cursor, nombre_tabla, lote)
+                    conn.commit()
+
+                    checkpoint.ultimo_minuto = timezone.make_aware(lote_fin.astype(datetime), ZoneInfo('UTC'))
+                    checkpoint.registros += registros
+                    checkpoint.save(update_fields=['ultimo_minuto', 'registros', 'actualizado'])
+                    lote_inicio = lote_fin + np.timedelta64(1, 'm')
+            finally:
+                cursor.close()
+
+        limite_ingesta = timezone.now() - timedelta(minutes=settings.ETL_EXPORTAR_RETRASO_INGESTA_MINUTOS)
+        if checkpoint.registros > 0 and fecha_fin <= limite_ingesta:
+            checkpoint.completado = True
+        else:
+            checkpoint.ultimo_minuto = None
+        checkpoint.save(update_fields=['completado', 'ultimo_minuto', 'actualizado'])
+        return checkpoint.registros
+    finally:
+        connection.close()
+
+
+def exportar_scadatemporal_paralelo(fecha_inicio, fecha_fin, max_workers=None, minutos_por_lote=None):
+    """
+    Exporta ScadaTemporal a las tablas CMD con una central por worker, cada una con su propia conexión.
+    Cada central confirma lotes de minutos_por_lote minutos (settings.ETL_EXPORTAR_MINUTOS_LOTE)
+    y registra su avance en CheckpointExportacion, de modo que si algo falla una nueva ejecución
+    para la misma ventana retoma cada central desde su último lote confirmado.
+    Devuelve la cantidad de registros insertados.
+    """
+    max_workers = max_workers or settings.ETL_EXPORTAR_MAX_WORKERS
+    minutos_por_lote = minutos_por_lote or settings.ETL_EXPORTAR_MINUTOS_LOTE
+    if timezone.is_naive(fecha_inicio):
+        fecha_inicio = timezone.make_aware(fecha_inicio, timezone.get_current_timezone())
+    if timezone.is_naive(fecha_fin):
+        fecha_fin = timezone.make_aware(fecha_fin, timezone.get_current_timezone())
+
+    registro = obtener_registro()
+    inicio = time.time()
+    total = 0
+    errores = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {
+            executor.submit(
+                _exportar_central_con_checkpoint, central, registro.columnas(central),
+                fecha_inicio, fecha_fin, minutos_por_lote
+            ): central
+            for central in registro.centrales.values()
+        }
+        for futuro in as_completed(futuros):
+            central = futuros[futuro]
+            try:
+                total += futuro.result()
+            except Exception as e:
+                logging.error(f"Error exportando la central {central}: {e}")
+                errores.append(f"{central}: {e}")
+
+    logging.info(f"Exportación paralela: {total} registros insertados en {time.time() - inicio:.2f} s")
+    if errores:
+        raise RuntimeError(f"Error en la exportación paralela: {'; '.join(errores)}")
+    return total
+
+
+def exportar_scadatemporal(fecha_inicio, fecha_fin):
+    """
+    Exporta ScadaTemporal a las tablas CMD con la ejecución configurada en settings.ETL_EXPORTAR_EJECUCION.
+    """
+    ejecuciones = {
+        'secuencial': exportar_scadatemporal_a_sqlserver,
+        'paralelo': exportar_scadatemporal_paralelo,
+    }
+    ejecucion = settings.ETL_EXPORTAR_EJECUCION
+    if ejecucion not in ejecuciones:
+        raise ValueError(f"Ejecución de exportación desconocida: {ejecucion}")
+    return ejecuciones[ejecucion](fecha_inicio, fecha_fin)
+
+
 def comparar_scadatemporal_con_sqlserver(fecha_inicio, fecha_fin):
     """
     Compara los datos de ScadaTemporal con las tablas de SQL Server.
@@ -317,66 +500,51 @@ def comparar_scadatemporal_con_sqlserver(fecha_inicio, fecha_fin):
     logging.basicConfig(filename='comparacion_scada.log', level=logging.INFO, 
                         format='%(asctime)s %(levelname)s:%(message)s')
 
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-
-    centrales = Central.objects.filter(estado=True)
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
 
-    for central in centrales:
-        nombre_tabla = 'CMD' + central.descripcion.replace(' ', '_')
-        niveles = Nivel.objects.filter(central=central)
-        registros = ScadaTemporal.objects.filter(nivel__in=niveles).order_by('timestamp_utc')
+        centrales = Central.objects.filter(estado=True)
 
-        cabeceras = Homologacion.objects.filter(nivel__central=central, estado=True).values_list('cabecera_cmd', flat=True)
-        cabeceras = [c.replace(' ', '_') for c in cabeceras]
+        for central in centrales:
+            nombre_tabla = 'CMD' + central.descripcion.replace(' ', '_')
+            niveles = Nivel.objects.filter(central=central)
+            registros = ScadaTemporal.objects.filter(nivel__in=niveles).order_by('timestamp_utc')
 
-        for reg in registros:
-            minuto = reg.timestamp_utc.replace(second=0, microsecond=0)
-            columna = reg.cabecera_cmd.replace(' ', '_')
-            if columna not in cabeceras:
-                continue  # Solo compara columnas válidas
+            cabeceras = Homologacion.objects.filter(nivel__central=central, estado=True).values_list('cabecera_cmd', flat=True)
+            cabeceras = [c.replace(' ', '_') for c in cabeceras]
 
-            # Consulta el valor en SQL Server
-            sql = f"SELECT [{columna}] FROM [{nombre_tabla}] WHERE [timestamp]=?"
-            cursor.execute(sql, minuto)
-            row = cursor.fetchone()
-            valor_sql = row[0] if row else None
-
-            # Compara valores hasta 3 decimales
-            valor_django = reg.valor
-            try:
-                valor_sql_float = float(str(valor_sql).replace(',', '.')) if valor_sql is not None else None
-            except Exception:
-                valor_sql_float = None
+            for reg in registros:
+                minuto = reg.timestamp_utc.replace(second=0, microsecond=0)
+                columna = reg.cabecera_cmd.replace(' ', '_')
+                if columna not in cabeceras:
+                    continue  # Solo compara columnas válidas
 
-            iguales = False
-            if valor_sql_float is None and valor_django is None:
-                iguales = True
-            elif valor_sql_float is not None and valor_django is not None:
-                iguales = round(valor_sql_float, 3) == round(valor_django, 3)
+                # Consulta el valor en SQL Server
+                sql = f"SELECT [{columna}] FROM [{nombre_tabla}] WHERE [timestamp]=?"
+                cursor.execute(sql, minuto)
+                row = cursor.fetchone()
+                valor_sql = row[0] if row else None
 
-            if not iguales:
-                logging.info(
-                    f"Diferencia en {nombre_tabla} - timestamp: {minuto}, columna: {columna}, "
-                    f"Django: {valor_django}, SQLServer: {valor_sql_float}"
-                )
+                # Compara valores hasta 3 decimales
+                valor_django = reg.valor
+                try:
+                    valor_sql_float = float(str(valor_sql).replace(',', '.')) if valor_sql is not None else None
+                except Exception:
+                    valor_sql_float = None
+
+                iguales = False
+                if valor_sql_float is None and valor_django is None:
+                    iguales = True
+                elif valor_sql_float is not None and valor_django is not None:
+                    iguales = round(valor_sql_float, 3) == round(valor_django, 3)
+
+                if not iguales:
+                    logging.info(
+                        f"Diferencia en {nombre_tabla} - timestamp: {minuto}, columna: {columna}, "
+                        f"Django: {valor_django}, SQLServer: {valor_sql_float}"
+                    )
 
-    cursor.close()
-    conn.close()
+        cursor.close()
 
 
 
@@ -408,72 +576,744 @@ def ejecutar_proceso_etl_completo():
         except Exception as e:
             logging.error(f"Error ejecutando '{nombre}': {e}")
 
+    registrar_estadisticas_pools()
 
 
-def importar_valores_scada_desde_sqlserver2(fecha_inicio, fecha_fin):
 
-    homologaciones = Homologacion.objects.filter(estado=True, nivel__estado=True, nivel__central__estado=True)
-    ids_scada = list(homologaciones.values_list('id_scada', flat=True))
+def importar_valores_scada_desde_sqlserver2(fecha_inicio, fecha_fin, cargador=None):
+    """
+    Importa a ScadaTemporal las lecturas de dbo.HistoricalData de los sensores activos en [fecha_inicio, fecha_fin].
+    Cada lote se normaliza con normalizar_lote_historicaldata (primera lectura de cada id por minuto)
+    y todos los registros se guardan juntos al final con guardar_scadatemporal.
+    """
+    sensores = obtener_registro().sensores
+    ids_scada = list(sensores)
     if not ids_scada:
         print("No hay id_scada activos.")
         return
 
-    niveles = {h.id_scada: h.nivel for h in homologaciones}
-    cabeceras = {h.id_scada: h.cabecera_cmd for h in homologaciones}
-
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE_SCADA
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
+        try:
+            ultimo_minuto = {}
+            objetos = []
+            for rows in _leer_historicaldata_en_lotes(
+                cursor, ids_scada, fecha_inicio, fecha_fin, settings.ETL_IMPORTAR_TAMANO_LOTE
+            ):
+                objetos.extend(construir_scadatemporal_lote(normalizar_lote_historicaldata(rows, ultimo_minuto), sensores))
+        finally:
+            cursor.close()
+
+    guardar_scadatemporal(objetos, cargador)
+
+
+class FiltroIdsScada:
+    """
+    Filtro de id_scada para las consultas sobre dbo.HistoricalData.
+    Carga las filas (ID y columnas adicionales) en la tabla temporal de sesión #ids_scada
+    o, si no se puede, en un parámetro con valor de tabla (TVP) del tipo settings.ETL_FILTRO_IDS_TIPO_TVP
+    (solo para filas sin columnas adicionales, porque el tipo tiene únicamente la columna ID),
+    y las expone como la tabla derivada f para hacer JOIN. Así el texto de la consulta no depende
+    de la cantidad de sensores y el plan de ejecución se reutiliza.
+    Si ninguna de las dos opciones está disponible, divide las filas en bloques de tamaño fijo
+    con una tabla VALUES, rellenando el último bloque con NULL para que el texto tampoco cambie.
+    La plantilla de consulta debe incluir {filtro} antes de cualquier otro parámetro, por ejemplo:
+        ... FROM dbo.HistoricalData h INNER JOIN {filtro} ON f.ID = h.ID WHERE h.TimeStamp BETWEEN ? AND ?
+    """
+    TABLA = '#ids_scada'
+    MAX_PARAMETROS = 2000
+
+    def __init__(self, cursor, filas, columnas=(), estrategia=None, tamano_bloque=None, tabla_origen='dbo.HistoricalData'):
+        """
+        filas es una lista de ids o de tuplas (id, ...) con los valores de las columnas adicionales,
+        que se indican como tuplas (nombre, tipo SQL).
+        """
+        self.cursor = cursor
+        self.filas = [tuple(f) if isinstance(f, (tuple, list)) else (f,) for f in filas]
+        self.columnas = ['ID'] + [nombre for nombre, _ in columnas]
+        self.tipos = list(columnas)
+        self.tabla_origen = tabla_origen
+        tamano_bloque = tamano_bloque or settings.ETL_FILTRO_IDS_TAMANO_BLOQUE
+        self.tamano_bloque = max(1, min(tamano_bloque, self.MAX_PARAMETROS // len(self.columnas)))
+        self.estrategia = self._preparar(estrategia or settings.ETL_FILTRO_IDS)
+
+    def _preparar(self, estrategia):
+        if estrategia in ('auto', 'tabla_temporal'):
+            try:
+                self._crear_tabla_temporal()
+                return 'tabla_temporal'
+            except pyodbc.Error as e:
+                if estrategia == 'tabla_temporal':
+                    raise
+                logging.warning(f"No se pudo crear {self.TABLA}, se prueba otra estrategia: {e}")
+        if estrategia in ('auto', 'tvp') and settings.ETL_FILTRO_IDS_TIPO_TVP:
+            if len(self.columnas) > 1:
+                # El tipo de tabla solo tiene la columna ID: las filas con columnas adicionales van por bloques
+                logging.info(
+                    f"El TVP {settings.ETL_FILTRO_IDS_TIPO_TVP} solo admite ID, "
+                    f"se usan bloques para las columnas {', '.join(self.columnas[1:])}"
+                )
+                return 'bloques'
+            try:
+                self.cursor.execute("SELECT COUNT(*) FROM ? AS f", [self._tvp()])
+                self.cursor.fetchone()
+                return 'tvp'
+            except pyodbc.Error as e:
+                if estrategia == 'tvp':
+                    raise
+                logging.warning(f"No se pudo usar el TVP {settings.ETL_FILTRO_IDS_TIPO_TVP}, se usan bloques: {e}")
+        return 'bloques'
+
+    def _crear_tabla_temporal(self):
+        # La columna ID copia el tipo de la tabla de origen para que el JOIN no fuerce conversiones
+        self.cursor.execute(f"IF OBJECT_ID('tempdb..{self.TABLA}') IS NOT NULL DROP TABLE {self.TABLA}")
+        self.cursor.execute(f"SELECT TOP 0 ID INTO {self.TABLA} FROM {self.tabla_origen}")
+        for nombre, tipo in self.tipos:
+            self.cursor.execute(f"ALTER TABLE {self.TABLA} ADD [{nombre}] {tipo} NULL")
+        columnas = ', '.join(f'[{c}]' for c in self.columnas)
+        placeholders = ', '.join(['?'] * len(self.columnas))
+        self.cursor.fast_executemany = True
+        try:
+            self.cursor.executemany(f"INSERT INTO {self.TABLA} ({columnas}) VALUES ({placeholders})", self.filas)
+        finally:
+            self.cursor.fast_executemany = False
+        self.cursor.execute(f"CREATE CLUSTERED INDEX IX_ids_scada ON {self.TABLA} (ID)")
+
+    def _tvp(self):
+        esquema, _, tipo = settings.ETL_FILTRO_IDS_TIPO_TVP.rpartition('.')
+        return [tipo, esquema or 'dbo'] + self.filas
+
+    def consultas(self, plantilla, *params):
+        """
+        Genera las consultas (sql, parámetros) a ejecutar para cubrir todas las filas del filtro.
+        """
+        alias = f"f({', '.join(self.columnas)})"
+        if self.estrategia == 'tabla_temporal':
+            yield plantilla.format(filtro=f"{self.TABLA} AS f"), list(params)
+        elif self.estrategia == 'tvp':
+            yield plantilla.format(filtro=f"? AS {alias}"), [self._tvp()] + list(params)
+        else:
+            fila_sql = '(' + ', '.join(['?'] * len(self.columnas)) + ')'
+            filtro = f"(VALUES {', '.join([fila_sql] * self.tamano_bloque)}) AS {alias}"
+            sql = plantilla.format(filtro=filtro)
+            relleno = (None,) * len(self.columnas)
+            for i in range(0, len(self.filas), self.tamano_bloque):
+                bloque = self.filas[i:i + self.tamano_bloque]
+                bloque = bloque + [relleno] * (self.tamano_bloque - len(bloque))
+                yield sql, [v for fila in bloque for v in fila] + list(params)
+
+    def cerrar(self):
+        if self.estrategia == 'tabla_temporal':
+            try:
+                self.cursor.execute(f"DROP TABLE {self.TABLA}")
+            except pyodbc.Error:
+                pass
+
+
+def _leer_historicaldata_en_lotes(cursor, ids_scada, fecha_inicio, fecha_fin, tamano_lote, desde=None):
+    """
+    Genera lotes de hasta tamano_lote filas (ID, Value, TimeStamp) de dbo.HistoricalData
+    para los ids_scada dados, con Quality=192 y ordenadas por ID y TimeStamp.
+    Si se indica desde ({id_scada: datetime}), cada id se lee a partir de su propia fecha
+    en lugar de fecha_inicio.
+    """
+    if desde is None:
+        filtro = FiltroIdsScada(cursor, ids_scada)
+        condicion = "h.TimeStamp BETWEEN ? AND ?"
+        params_rango = (fecha_inicio, fecha_fin)
+    else:
+        filas = [(id_scada, desde.get(id_scada, fecha_inicio)) for id_scada in ids_scada]
+        filtro = FiltroIdsScada(cursor, filas, columnas=[('Desde', 'DATETIME2')])
+        condicion = "h.TimeStamp >= f.Desde AND h.TimeStamp <= ?"
+        params_rango = (fecha_fin,)
 
-    placeholders = ','.join(['?'] * len(ids_scada))
     query = f"""
-        SELECT ID, Value, TimeStamp
-        FROM dbo.HistoricalData
-        WHERE ID IN ({placeholders})
-          AND Quality = 192
-          AND TimeStamp BETWEEN ? AND ?
-        ORDER BY ID, TimeStamp ASC
-    """
-    params = ids_scada + [fecha_inicio, fecha_fin]
-    cursor.execute(query, *params)
-    rows = cursor.fetchall()
-
-    minutos_vistos = defaultdict(set)
-    objetos = []
-    for row in rows:
-        id_scada = row.ID
-        minuto = row.TimeStamp.replace(second=0, microsecond=0)
-        if minuto in minutos_vistos[id_scada]:
-            continue
-        minutos_vistos[id_scada].add(minuto)
-        objetos.append(
-            ScadaTemporal(
-                id_scada=id_scada,
-                cabecera_cmd=cabeceras[id_scada],
-                timestamp=timezone.make_aware(minuto),
-                valor=float(str(row.Value).replace(',', '.')),
-                nivel=niveles[id_scada],
-                timestamp_utc=minuto - timedelta(hours=5),
-            )
+        SELECT h.ID, h.Value, h.TimeStamp
+        FROM dbo.HistoricalData h
+        INNER JOIN {{filtro}} ON f.ID = h.ID
+        WHERE h.Quality = 192
+          AND {condicion}
+        ORDER BY h.ID, h.TimeStamp ASC
+    """
+    try:
+        for sql, params in filtro.consultas(query, *params_rango):
+            cursor.execute(sql, *params)
+            while True:
+                rows = cursor.fetchmany(tamano_lote)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        filtro.cerrar()
+
+
+LoteNormalizado = namedtuple('LoteNormalizado', ['ids', 'minutos', 'valores'])
+
+
+def normalizar_lote_historicaldata(rows, ultimo_minuto):
+    """
+    Convierte un lote de filas (ID, Value, TimeStamp) de dbo.HistoricalData en arreglos de NumPy.
+    Los valores se convierten a float en bloque (la coma decimal se corrige una sola vez por lote),
+    los TimeStamp se truncan al minuto como datetime64[m] y se conserva solo la primera fila
+    de cada id por minuto, ordenando por id y TimeStamp.
+    ultimo_minuto ({id_scada: datetime64[m]}) guarda el último minuto de cada id entre lotes
+    y se actualiza con el lote actual.
+    """
+    ids, valores, tiempos = (np.asarray(columna, dtype=object) for columna in zip(*rows))
+    tiempos = tiempos.astype('datetime64[us]')
+    try:
+        valores = valores.astype(np.float64)
+    except (TypeError, ValueError):
+        valores = np.char.replace(valores.astype(str), ',', '.').astype(np.float64)
+
+    unicos, codigos = np.unique(ids, return_inverse=True)
+    orden = np.lexsort((tiempos, codigos))
+    codigos = codigos[orden]
+    minutos = tiempos[orden].astype('datetime64[m]')
+    valores = valores[orden]
+
+    # Primera fila de cada (id, minuto) dentro del lote
+    primera = np.ones(len(orden), dtype=bool)
+    primera[1:] = (codigos[1:] != codigos[:-1]) | (minutos[1:] != minutos[:-1])
+    # Descarta el minuto que ya se tomó en el lote anterior
+    previo = np.array(
+        [ultimo_minuto.get(u, np.datetime64('NaT')) for u in unicos], dtype='datetime64[m]'
+    )
+    primera &= minutos != previo[codigos]
+
+    ultima = np.ones(len(orden), dtype=bool)
+    ultima[:-1] = codigos[1:] != codigos[:-1]
+    for codigo, minuto in zip(codigos[ultima], minutos[ultima]):
+        ultimo_minuto[unicos[codigo]] = minuto
+
+    return LoteNormalizado(unicos[codigos[primera]], minutos[primera], valores[primera])
+
+
+def construir_scadatemporal_lote(lote, sensores, tipo='1'):
+    """
+    Crea las instancias de ScadaTemporal (sin guardar) de un LoteNormalizado.
+    """
+    tz = timezone.get_current_timezone()
+    minutos = lote.minutos.astype(datetime).tolist()
+    minutos_utc = (lote.minutos - np.timedelta64(5, 'h')).astype(datetime).tolist()
+    return [
+        ScadaTemporal(
+            id_scada=id_scada,
+            cabecera_cmd=sensores[id_scada].cabecera_cmd,
+            timestamp=timezone.make_aware(minuto, tz),
+            valor=valor,
+            nivel=sensores[id_scada].nivel,
+            timestamp_utc=minuto_utc,
+            tipo=tipo,
         )
-    if objetos:
+        for id_scada, minuto, minuto_utc, valor in zip(lote.ids.tolist(), minutos, minutos_utc, lote.valores.tolist())
+    ]
+
+
+def _campo_tsv(valor):
+    if valor is None:
+        return '\\N'
+    return str(valor).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def _cargar_scadatemporal_load_data(objetos):
+    """
+    Escribe las instancias en un archivo TSV temporal y lo ingresa en la tabla de ScadaTemporal
+    con LOAD DATA LOCAL INFILE. Requiere local_infile habilitado en el cliente y en el servidor MySQL.
+    """
+    campos = [ScadaTemporal._meta.get_field(nombre) for nombre in
+              ('id_scada', 'cabecera_cmd', 'valor', 'timestamp', 'timestamp_utc', 'nivel', 'tipo')]
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', newline='\n', delete=False) as archivo:
+        ruta = archivo.name
+        for obj in objetos:
+            archivo.write('\t'.join(
+                _campo_tsv(campo.get_db_prep_save(getattr(obj, campo.attname), connection))
+                for campo in campos
+            ) + '\n')
+    try:
+        columnas = ', '.join(connection.ops.quote_name(campo.column) for campo in campos)
+        charset = connection.settings_dict.get('OPTIONS', {}).get('charset', 'utf8mb4')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {connection.ops.quote_name(ScadaTemporal._meta.db_table)} "
+                f"CHARACTER SET {charset} "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columnas})",
+                [ruta],
+            )
+    finally:
+        os.remove(ruta)
+    return len(objetos)
+
+
+def guardar_scadatemporal(objetos, cargador=None):
+    """
+    Guarda instancias de ScadaTemporal con el cargador indicado o el de settings.ETL_CARGADOR_SCADATEMPORAL:
+    'bulk_create' o 'load_data' (LOAD DATA LOCAL INFILE). Con un backend distinto de MySQL, o si la
+    conexión no tiene local_infile habilitado, siempre se usa bulk_create. Marca los minutos guardados en el índice de cobertura (CoberturaSensor).
+    Devuelve la cantidad de registros guardados.
+    """
+    if not objetos:
+        return 0
+    cargador = cargador or settings.ETL_CARGADOR_SCADATEMPORAL
+    if (cargador == 'load_data' and connection.vendor == 'mysql'
+            and connection.settings_dict.get('OPTIONS', {}).get('local_infile')):
+        guardados = _cargar_scadatemporal_load_data(objetos)
+    else:
         ScadaTemporal.objects.bulk_create(objetos, batch_size=1000)
+        guardados = len(objetos)
+    registrar_cobertura_scadatemporal(objetos)
+    return guardados
+
+
+def _importar_ids_streaming(cursor, ids_scada, sensores, fecha_inicio, fecha_fin, tamano_lote, etiqueta='streaming', cargador=None):
+    """
+    Lee de dbo.HistoricalData los valores de ids_scada en lotes de tamano_lote filas
+    y los guarda en ScadaTemporal a medida que llegan, conservando el primer valor de cada minuto.
+    Devuelve la cantidad de registros insertados.
+    """
+    inicio = time.time()
+    leidas = 0
+    insertadas = 0
+    # Como las filas llegan ordenadas por ID y TimeStamp, basta con recordar el último minuto de cada id
+    ultimo_minuto = {}
+    for rows in _leer_historicaldata_en_lotes(cursor, ids_scada, fecha_inicio, fecha_fin, tamano_lote):
+        leidas += len(rows)
+
+        objetos = construir_scadatemporal_lote(normalizar_lote_historicaldata(rows, ultimo_minuto), sensores)
+        insertadas += guardar_scadatemporal(objetos, cargador)
+
+        duracion = time.time() - inicio
+        logging.info(
+            f"Importación {etiqueta}: {leidas} filas leídas, {insertadas} insertadas, "
+            f"{leidas / duracion if duracion else 0:.0f} filas/s"
+        )
+
+    return insertadas
+
+
+def importar_valores_scada_desde_sqlserver_streaming(fecha_inicio, fecha_fin, tamano_lote=None, cargador=None):
+    """
+    Variante en streaming de importar_valores_scada_desde_sqlserver2.
+    Lee dbo.HistoricalData con fetchmany en lotes de tamano_lote filas, descarta los duplicados
+    por minuto a medida que llegan y guarda cada lote con guardar_scadatemporal, por lo que la memoria
+    no crece con el ancho de la ventana. Registra el avance en filas por segundo.
+    Devuelve la cantidad de registros insertados en ScadaTemporal.
+    """
+    tamano_lote = tamano_lote or settings.ETL_IMPORTAR_TAMANO_LOTE
+
+    sensores = obtener_registro().sensores
+    ids_scada = list(sensores)
+    if not ids_scada:
+        print("No hay id_scada activos.")
+        return 0
+
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
+        try:
+            return _importar_ids_streaming(cursor, ids_scada, sensores, fecha_inicio, fecha_fin, tamano_lote, cargador=cargador)
+        finally:
+            cursor.close()
+
+
+def _importar_shard(nombre, ids_scada, sensores, fecha_inicio, fecha_fin, tamano_lote, cargador=None):
+    """
+    Importa un shard de id_scada desde un hilo del pool, con su propia conexión del pool de SQL Server
+    y su propia conexión de Django a la base de datos.
+    """
+    try:
+        with conexion_scada() as conn:
+            cursor = conn.cursor()
+            try:
+                return _importar_ids_streaming(
+                    cursor, ids_scada, sensores, fecha_inicio, fecha_fin, tamano_lote, etiqueta=nombre, cargador=cargador
+                )
+            finally:
+                cursor.close()
+    finally:
+        connection.close()
+
+
+def _shards_importacion(sensores, tamano_shard):
+    """
+    Reparte los id_scada en shards: uno por Central o, si tamano_shard es mayor que cero,
+    grupos de tamano_shard ids. Devuelve {nombre_shard: [id_scada, ...]}.
+    """
+    shards = defaultdict(list)
+    if tamano_shard and tamano_shard > 0:
+        for i, s in enumerate(sensores.values()):
+            shards[f"shard {i // tamano_shard + 1}"].append(s.id_scada)
+    else:
+        for s in sensores.values():
+            shards[s.central.descripcion].append(s.id_scada)
+    return shards
+
+
+def importar_valores_scada_paralelo(fecha_inicio, fecha_fin, max_workers=None, tamano_shard=None, tamano_lote=None, cargador=None):
+    """
+    Importa los valores SCADA repartiendo los id_scada activos en shards, uno por Central
+    o, si tamano_shard es mayor que cero, en grupos de tamano_shard ids.
+    Cada shard ejecuta su propia consulta a SQL Server y su escritura en ScadaTemporal
+    en un hilo del pool, con hasta max_workers shards simultáneos.
+    Si algún shard falla, los demás terminan igual y al final se lanza el error.
+    Devuelve la cantidad total de registros insertados.
+    """
+    max_workers = max_workers or settings.ETL_IMPORTAR_MAX_WORKERS
+    tamano_shard = settings.ETL_IMPORTAR_TAMANO_SHARD if tamano_shard is None else tamano_shard
+    tamano_lote = tamano_lote or settings.ETL_IMPORTAR_TAMANO_LOTE
+
+    sensores = obtener_registro().sensores
+    if not sensores:
+        print("No hay id_scada activos.")
+        return 0
+
+    shards = _shards_importacion(sensores, tamano_shard)
+
+    total = 0
+    errores = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {
+            executor.submit(
+                _importar_shard, nombre, ids, sensores, fecha_inicio, fecha_fin, tamano_lote, cargador
+            ): nombre
+            for nombre, ids in shards.items()
+        }
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            try:
+                insertados = futuro.result()
+                total += insertados
+                logging.info(f"Shard '{nombre}' importado: {insertados} registros.")
+            except Exception as e:
+                logging.error(f"Error importando shard '{nombre}': {e}")
+                errores.append(f"{nombre}: {e}")
+
+    if errores:
+        raise RuntimeError(f"Error en {len(errores)} de {len(shards)} shards: {'; '.join(errores)}")
+    return total
+
+
+def importar_valores_scada_incremental(fecha_inicio, fecha_fin, retroceso_minutos=None, tamano_lote=None, cargador=None):
+    """
+    Importa solo los datos nuevos de cada id_scada usando una marca de agua por sensor (MarcaAguaImportacion).
+    Cada id se lee desde su último TimeStamp importado menos retroceso_minutos, para recoger datos que
+    llegan tarde, hasta fecha_fin, sin bajar nunca de fecha_inicio. Los ids sin marca se leen desde fecha_inicio.
+    Los minutos que ya existen en ScadaTemporal en [fecha_inicio, fecha_fin] no se vuelven a insertar.
+    Cada lote se normaliza con normalizar_lote_historicaldata y se guarda junto con el avance de las marcas
+    de sus ids en una misma transacción, así una ejecución interrumpida se retoma sin duplicar registros.
+    Devuelve la cantidad de registros insertados.
+    """
+    retroceso_minutos = settings.ETL_IMPORTAR_RETROCESO_MINUTOS if retroceso_minutos is None else retroceso_minutos
+    tamano_lote = tamano_lote or settings.ETL_IMPORTAR_TAMANO_LOTE
+
+    sensores = obtener_registro().sensores
+    ids_scada = list(sensores)
+    if not ids_scada:
+        print("No hay id_scada activos.")
+        return 0
+
+    # HistoricalData trabaja con fechas sin zona; las marcas se guardan en UTC como ScadaTemporal.timestamp
+    if timezone.is_aware(fecha_inicio):
+        fecha_inicio = timezone.make_naive(fecha_inicio)
+    if timezone.is_aware(fecha_fin):
+        fecha_fin = timezone.make_naive(fecha_fin)
+    marcas = {
+        m.id_scada: m
+        for m in MarcaAguaImportacion.objects.filter(id_scada__in=ids_scada)
+    }
+    desde = {
+        id_scada: max(timezone.make_naive(m.ultimo_timestamp) - timedelta(minutes=retroceso_minutos), fecha_inicio)
+        for id_scada, m in marcas.items()
+    }
+
+    # Minutos ya importados en la ventana, con o sin marca, para no duplicarlos
+    minutos_existentes = {
+        (id_scada, timezone.make_naive(ts).replace(second=0, microsecond=0))
+        for id_scada, ts in ScadaTemporal.objects.filter(
+            id_scada__in=ids_scada,
+            timestamp__gte=timezone.make_aware(fecha_inicio.replace(second=0, microsecond=0)),
+            timestamp__lte=timezone.make_aware(fecha_fin),
+        ).values_list('id_scada', 'timestamp')
+    }
+
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
+
+        inicio = time.time()
+        leidas = 0
+        insertadas = 0
+        ultimo_minuto = {}
+        try:
+            for rows in _leer_historicaldata_en_lotes(cursor, ids_scada, fecha_inicio, fecha_fin, tamano_lote, desde=desde):
+                leidas += len(rows)
+                lote = normalizar_lote_historicaldata(rows, ultimo_minuto)
+                nuevos = np.array([
+                    (id_scada, minuto) not in minutos_existentes
+                    for id_scada, minuto in zip(lote.ids.tolist(), lote.minutos.astype(datetime).tolist())
+                ], dtype=bool)
+                objetos = construir_scadatemporal_lote(
+                    LoteNormalizado(lote.ids[nuevos], lote.minutos[nuevos], lote.valores[nuevos]), sensores
+                )
+                # Las filas llegan ordenadas por ID y TimeStamp: la última de cada id es su nueva marca
+                ultimos = {row.ID: row.TimeStamp for row in rows}
+                with transaction.atomic():
+                    insertadas += guardar_scadatemporal(objetos, cargador)
+                    _avanzar_marcas_agua(marcas, ultimos)
+
+                duracion = time.time() - inicio
+                logging.info(
+                    f"Importación incremental: {leidas} filas leídas, {insertadas} insertadas, "
+                    f"{leidas / duracion if duracion else 0:.0f} filas/s"
+                )
+        finally:
+            cursor.close()
+
+    return insertadas
+
+
+def _avanzar_marcas_agua(marcas, ultimos):
+    """
+    Avanza (o crea) la marca de agua de cada id_scada de ultimos ({id_scada: TimeStamp naive}) y actualiza marcas.
+    """
+    actualizar = []
+    crear = []
+    for id_scada, ultimo in ultimos.items():
+        ultimo = timezone.make_aware(ultimo)
+        marca = marcas.get(id_scada)
+        if marca is None:
+            marcas[id_scada] = marca = MarcaAguaImportacion(id_scada=id_scada, ultimo_timestamp=ultimo)
+            crear.append(marca)
+        elif ultimo > marca.ultimo_timestamp:
+            marca.ultimo_timestamp = ultimo
+            actualizar.append(marca)
+    if actualizar:
+        MarcaAguaImportacion.objects.bulk_update(actualizar, ['ultimo_timestamp', 'actualizado'], batch_size=1000)
+    if crear:
+        MarcaAguaImportacion.objects.bulk_create(crear, batch_size=1000)
+        # bulk_create no siempre asigna la clave primaria; se releen para poder actualizarlas en el próximo lote
+        marcas.update({
+            m.id_scada: m for m in MarcaAguaImportacion.objects.filter(id_scada__in=[c.id_scada for c in crear])
+        })
+
+
+def _sql_agregados_por_minuto(tabla_origen='dbo.HistoricalData', columnas=(), condicion="h.TimeStamp BETWEEN ? AND ?"):
+    """
+    Expresiones de tabla común datos y agregados para consultas sobre HistoricalData filtradas con FiltroIdsScada:
+    agregados tiene un valor (Valor) por ID y minuto (Minuto, truncado) con Quality=192, reducido según la columna
+    Agregacion del filtro (primero, ultimo, promedio, minimo o maximo), y las columnas adicionales del filtro indicadas.
+    El texto conserva {filtro} para FiltroIdsScada.consultas; condicion lleva los parámetros del rango de TimeStamp.
+    """
+    extra = ''.join(f"f.[{c}], " for c in columnas)
+    agrupadas = ''.join(f"[{c}], " for c in columnas)
+    return f"""
+        datos AS (
+            SELECT h.ID,
+                   f.Agregacion,
+                   {extra}DATEADD(minute, DATEDIFF(minute, 0, h.TimeStamp), 0) AS Minuto,
+                   COALESCE(
+                       TRY_CAST(h.Value AS FLOAT),
+                       TRY_CAST(REPLACE(CAST(h.Value AS NVARCHAR(100)), ',', '.') AS FLOAT)
+                   ) AS Valor,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY h.ID, DATEDIFF(minute, 0, h.TimeStamp) ORDER BY h.TimeStamp ASC
+                   ) AS Primero,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY h.ID, DATEDIFF(minute, 0, h.TimeStamp) ORDER BY h.TimeStamp DESC
+                   ) AS Ultimo
+            FROM {tabla_origen} h
+            INNER JOIN {{filtro}} ON f.ID = h.ID
+            WHERE h.Quality = 192
+              AND {condicion}
+        ),
+        agregados AS (
+            SELECT ID,
+                   {agrupadas}Minuto,
+                   CASE MAX(Agregacion)
+                       WHEN 'ultimo' THEN MAX(CASE WHEN Ultimo = 1 THEN Valor END)
+                       WHEN 'promedio' THEN AVG(Valor)
+                       WHEN 'minimo' THEN MIN(Valor)
+                       WHEN 'maximo' THEN MAX(Valor)
+                       ELSE MAX(CASE WHEN Primero = 1 THEN Valor END)
+                   END AS Valor
+            FROM datos
+            GROUP BY ID, {agrupadas}Minuto
+        )"""
+
+
+def _leer_historicaldata_agregado_en_lotes(cursor, sensores, fecha_inicio, fecha_fin, tamano_lote):
+    """
+    Genera lotes de hasta tamano_lote filas (ID, Value, TimeStamp) con un solo valor por sensor y minuto,
+    reducido dentro de SQL Server según la agregación de cada sensor (primero, ultimo, promedio, minimo o maximo).
+    TimeStamp es el minuto truncado. Las filas llegan ordenadas por ID y minuto.
+    """
+    query = f"""
+        WITH {_sql_agregados_por_minuto()}
+        SELECT ID, Valor AS Value, Minuto AS TimeStamp
+        FROM agregados
+        WHERE Valor IS NOT NULL
+        ORDER BY ID, Minuto ASC
+    """
+    filas = [(s.id_scada, s.agregacion) for s in sensores.values()]
+    filtro = FiltroIdsScada(cursor, filas, columnas=[('Agregacion', 'NVARCHAR(20)')])
+    try:
+        for sql, params in filtro.consultas(query, fecha_inicio, fecha_fin):
+            cursor.execute(sql, *params)
+            while True:
+                rows = cursor.fetchmany(tamano_lote)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        filtro.cerrar()
+
+
+def importar_valores_scada_agregado(fecha_inicio, fecha_fin, tamano_lote=None, cargador=None):
+    """
+    Importa los valores SCADA reduciendo cada sensor a un valor por minuto dentro de SQL Server,
+    con la agregación configurada en Homologacion.agregacion (por defecto el primer valor del minuto,
+    como importar_valores_scada_desde_sqlserver2). Solo viaja por la red una fila por sensor y minuto.
+    Devuelve la cantidad de registros insertados.
+    """
+    tamano_lote = tamano_lote or settings.ETL_IMPORTAR_TAMANO_LOTE
+
+    sensores = obtener_registro().sensores
+    if not sensores:
+        print("No hay id_scada activos.")
+        return 0
+
+    inicio = time.time()
+    leidas = 0
+    insertadas = 0
+    ultimo_minuto = {}
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
+        try:
+            for rows in _leer_historicaldata_agregado_en_lotes(cursor, sensores, fecha_inicio, fecha_fin, tamano_lote):
+                leidas += len(rows)
+                objetos = construir_scadatemporal_lote(normalizar_lote_historicaldata(rows, ultimo_minuto), sensores)
+                insertadas += guardar_scadatemporal(objetos, cargador)
+
+                duracion = time.time() - inicio
+                logging.info(
+                    f"Importación agregada: {leidas} minutos leídos, {insertadas} insertados, "
+                    f"{leidas / duracion if duracion else 0:.0f} filas/s"
+                )
+        finally:
+            cursor.close()
+
+    return insertadas
+
+
+_FIN_COLA = object()
+
+
+def importar_valores_scada_pipeline(fecha_inicio, fecha_fin, lectores=None, escritores=None, tamano_cola=None,
+                                    tamano_shard=None, tamano_lote=None, cargador=None):
+    """
+    Importa los valores SCADA con un pipeline productor/consumidor.
+    Los hilos lectores leen dbo.HistoricalData por shard (ver _shards_importacion) y dejan los lotes
+    normalizados en una cola de a lo sumo tamano_cola lotes; los hilos escritores la vacían guardando
+    en ScadaTemporal. Si la cola está llena los lectores esperan, de modo que la lectura por red
+    y la escritura en la base de datos se solapan sin acumular memoria.
+    Si un lector o escritor falla, el resto se detiene y al final se lanza el error.
+    Devuelve la cantidad de registros insertados.
+    """
+    lectores = lectores or settings.ETL_PIPELINE_LECTORES
+    escritores = escritores or settings.ETL_PIPELINE_ESCRITORES
+    tamano_cola = tamano_cola or settings.ETL_PIPELINE_TAMANO_COLA
+    tamano_shard = settings.ETL_IMPORTAR_TAMANO_SHARD if tamano_shard is None else tamano_shard
+    tamano_lote = tamano_lote or settings.ETL_IMPORTAR_TAMANO_LOTE
+
+    sensores = obtener_registro().sensores
+    if not sensores:
+        print("No hay id_scada activos.")
+        return 0
+    shards = _shards_importacion(sensores, tamano_shard)
+
+    cola = queue.Queue(maxsize=tamano_cola)
+    detener = threading.Event()
+    lock = threading.Lock()
+    errores = []
+    contadores = {'leidas': 0, 'insertadas': 0}
+
+    def leer(nombre, ids_scada):
+        ultimo_minuto = {}
+        try:
+            with conexion_scada() as conn:
+                cursor = conn.cursor()
+                try:
+                    for rows in _leer_historicaldata_en_lotes(cursor, ids_scada, fecha_inicio, fecha_fin, tamano_lote):
+                        if detener.is_set():
+                            break
+                        with lock:
+                            contadores['leidas'] += len(rows)
+                        cola.put(normalizar_lote_historicaldata(rows, ultimo_minuto))
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logging.error(f"Error leyendo shard '{nombre}': {e}")
+            errores.append(f"lector {nombre}: {e}")
+            detener.set()
+
+    def escribir():
+        try:
+            while True:
+                lote = cola.get()
+                if lote is _FIN_COLA:
+                    break
+                # Tras un error se sigue vaciando la cola para no bloquear a los lectores
+                if detener.is_set():
+                    continue
+                try:
+                    insertadas = guardar_scadatemporal(construir_scadatemporal_lote(lote, sensores), cargador)
+                    with lock:
+                        contadores['insertadas'] += insertadas
+                except Exception as e:
+                    logging.error(f"Error escribiendo lote en ScadaTemporal: {e}")
+                    errores.append(f"escritor: {e}")
+                    detener.set()
+        finally:
+            connection.close()
+
+    inicio = time.time()
+    hilos_escritores = [threading.Thread(target=escribir, name=f"escritor-{i + 1}") for i in range(escritores)]
+    for hilo in hilos_escritores:
+        hilo.start()
+    try:
+        with ThreadPoolExecutor(max_workers=lectores) as executor:
+            for nombre, ids in shards.items():
+                executor.submit(leer, nombre, ids)
+    finally:
+        for _ in hilos_escritores:
+            cola.put(_FIN_COLA)
+        for hilo in hilos_escritores:
+            hilo.join()
+
+    duracion = time.time() - inicio
+    logging.info(
+        f"Importación pipeline: {contadores['leidas']} filas leídas, {contadores['insertadas']} insertadas "
+        f"en {duracion:.2f} s ({contadores['leidas'] / duracion if duracion else 0:.0f} filas/s)"
+    )
+    if errores:
+        raise RuntimeError(f"Error en la importación pipeline: {'; '.join(errores)}")
+    return contadores['insertadas']
 
-    cursor.close()
-    conn.close()
+
+def importar_valores_scada(fecha_inicio, fecha_fin):
+    """
+    Importa los valores SCADA del rango dado usando el modo configurado en settings.ETL_MODO_IMPORTACION.
+    """
+    modos = {
+        'estandar': importar_valores_scada_desde_sqlserver2,
+        'streaming': importar_valores_scada_desde_sqlserver_streaming,
+        'paralelo': importar_valores_scada_paralelo,
+        'incremental': importar_valores_scada_incremental,
+        'pipeline': importar_valores_scada_pipeline,
+        'agregado': importar_valores_scada_agregado,
+    }
+    modo = settings.ETL_MODO_IMPORTACION
+    if modo not in modos:
+        raise ValueError(f"Modo de importación desconocido: {modo}")
+    return modos[modo](fecha_inicio, fecha_fin)
 
 
 def limpiar_scadatemporal_y_sqlserver():
@@ -485,6 +1325,11 @@ def limpiar_scadatemporal_y_sqlserver():
 
     # Limpiar ScadaTemporal y resetear secuencia (para PostgreSQL y MySQL)
     ScadaTemporal.objects.all().delete()
+    # Sin datos en ScadaTemporal, las marcas de agua de la importación incremental, la cobertura y los checkpoints
+    # de exportación dejan de ser válidos
+    MarcaAguaImportacion.objects.all().delete()
+    CoberturaSensor.objects.all().delete()
+    CheckpointExportacion.objects.all().delete()
     with connection.cursor() as cursor:
         # Para PostgreSQL
         try:
@@ -498,41 +1343,26 @@ def limpiar_scadatemporal_y_sqlserver():
             pass
 
     # Limpiar tablas CMD* en SQL Server
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
 
-    # Buscar todas las tablas que empiezan con CMD
-    cursor.execute("""
-        SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_TYPE='BASE TABLE' AND TABLE_NAME LIKE 'CMD%'
-    """)
-    tablas = [row[0] for row in cursor.fetchall()]
+        # Buscar todas las tablas que empiezan con CMD
+        cursor.execute("""
+            SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_TYPE='BASE TABLE' AND TABLE_NAME LIKE 'CMD%'
+        """)
+        tablas = [row[0] for row in cursor.fetchall()]
 
-    for tabla in tablas:
-        try:
-            cursor.execute(f"TRUNCATE TABLE [{tabla}]")
-            # Si hay un campo IDENTITY, reiniciar el contador
-            cursor.execute(f"DBCC CHECKIDENT ('{tabla}', RESEED, 0)")
-        except Exception as e:
-            print(f"Error limpiando {tabla}: {e}")
+        for tabla in tablas:
+            try:
+                cursor.execute(f"TRUNCATE TABLE [{tabla}]")
+                # Si hay un campo IDENTITY, reiniciar el contador
+                cursor.execute(f"DBCC CHECKIDENT ('{tabla}', RESEED, 0)")
+            except Exception as e:
+                print(f"Error limpiando {tabla}: {e}")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        conn.commit()
+        cursor.close()
 
 
 
@@ -546,198 +1376,427 @@ def limpiar_historicaldata_ids_no_homologados():
         print("No hay id_scada activos.")
         return
 
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE_SCADA
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
+    with conexion_scada() as conn:
+        cursor = conn.cursor()
 
-    # Construir la lista de IDs para la consulta SQL
-    # Si hay muchos IDs, considera hacer la operación en bloques
-    ids_validos_str = ','.join(f"'{id_}'" for id_ in ids_validos)
-    sql = f"DELETE FROM dbo.HistoricalData WHERE ID NOT IN ({ids_validos_str})"
+        # Construir la lista de IDs para la consulta SQL
+        # Si hay muchos IDs, considera hacer la operación en bloques
+        ids_validos_str = ','.join(f"'{id_}'" for id_ in ids_validos)
+        sql = f"DELETE FROM dbo.HistoricalData WHERE ID NOT IN ({ids_validos_str})"
 
-    try:
-        cursor.execute(sql)
-        conn.commit()
-        print("Registros eliminados correctamente de dbo.HistoricalData.")
-    except Exception as e:
-        print(f"Error eliminando registros: {e}")
+        try:
+            cursor.execute(sql)
+            conn.commit()
+            print("Registros eliminados correctamente de dbo.HistoricalData.")
+        except Exception as e:
+            print(f"Error eliminando registros: {e}")
 
-    cursor.close()
-    conn.close()
+        cursor.close()
 
 
-def completar_minutos_faltantes_scadatemporal2(fecha_inicio, fecha_fin):
+def completar_minutos_faltantes_scadatemporal2(fecha_inicio, fecha_fin, cargador=None):
     """
-    Interpola minutos faltantes en memoria y usa bulk_create.
+    Interpola minutos faltantes en memoria y los guarda con guardar_scadatemporal.
     Busca hasta 2 días previos y posteriores para interpolar los extremos.
     Si no encuentra, deja el valor en blanco.
+    Devuelve la cantidad de registros generados.
     """
-    ids = ScadaTemporal.objects.filter(
-        timestamp__range=(fecha_inicio, fecha_fin)
-    ).values_list('id_scada', flat=True).distinct()
-
-    for id_scada in ids:
-        # Buscar registros en el rango extendido para los extremos
-        rango_extendido_inicio = fecha_inicio - timedelta(days=2)
-        rango_extendido_fin = fecha_fin + timedelta(days=2)
-        registros_ext = list(
-            ScadaTemporal.objects.filter(
-                id_scada=id_scada,
-                timestamp__range=(rango_extendido_inicio, rango_extendido_fin)
-            ).order_by('timestamp')
+    return _completar_minutos_faltantes(fecha_inicio, fecha_fin, None, cargador)
+
+
+# Diferencia máxima aceptada entre ScadaTemporal y la tabla CMD para sensores numéricos (los booleanos deben ser iguales)
+TOLERANCIA_COMPARACION = 0.005
+
+Discrepancia = namedtuple('Discrepancia', ['tabla', 'timestamp', 'columna', 'valor_scada', 'valor_cmd', 'tipo'])
+ResultadoComparacion = namedtuple('ResultadoComparacion', ['discrepancias', 'resumenes'])
+
+
+def comparar_matrices(scada, presentes, cmd, tolerancias):
+    """
+    Compara celda a celda la matriz de ScadaTemporal con la de la tabla CMD, ya alineadas por minuto y columna.
+    presentes marca las celdas con fila en ScadaTemporal (las únicas que se comparan) y tolerancias es la
+    diferencia aceptada por columna. Devuelve una matriz de códigos: 0 igual, 1 'diferente'
+    (ambos con valor), 2 'falta_en_cmd' (solo ScadaTemporal tiene valor) y 3 'sobra_en_cmd' (solo CMD tiene valor).
+    """
+    sin_scada = np.isnan(scada)
+    sin_cmd = np.isnan(cmd)
+    with np.errstate(invalid='ignore'):
+        diferentes = ~sin_scada & ~sin_cmd & (np.abs(scada - cmd) > tolerancias)
+    codigos = np.zeros(scada.shape, dtype=np.int8)
+    codigos[diferentes] = 1
+    codigos[~sin_scada & sin_cmd] = 2
+    codigos[sin_scada & ~sin_cmd] = 3
+    codigos[~presentes] = 0
+    return codigos
+
+
+TIPOS_DISCREPANCIA = {1: 'diferente', 2: 'falta_en_cmd', 3: 'sobra_en_cmd'}
+
+
+def reconciliar_central(cursor, central, sensores, fecha_inicio, fecha_fin):
+    """
+    Reconciliación por conjuntos de una central: pivotea la ventana de ScadaTemporal (rango de timestamp_utc)
+    igual que la exportación, lee la misma ventana de la tabla CMD con una sola consulta por rango
+    y compara ambas matrices con comparar_matrices: exacto para sensores booleanos (tipo '2'),
+    ±TOLERANCIA_COMPARACION para numéricos. Devuelve (lista de Discrepancia, resumen).
+    """
+    nombre_tabla = nombre_tabla_cmd(central)
+    columnas = [s.columna for s in sensores]
+    tolerancias = np.array([0.0 if s.tipo == '2' else TOLERANCIA_COMPARACION for s in sensores])
+
+    minutos, indices_columna, valores = _celdas_scadatemporal(central, columnas, fecha_inicio, fecha_fin)
+    scada = construir_matriz_minutos(minutos, indices_columna, valores, columnas)
+    presentes = ~np.isnan(construir_matriz_minutos(minutos, indices_columna, np.ones(len(minutos)), columnas).valores)
+
+    resumen = {
+        'tabla': nombre_tabla,
+        'minutos': len(scada.minutos),
+        'celdas': int(presentes.sum()),
+        'minutos_sin_fila_cmd': 0,
+        'diferente': 0,
+        'falta_en_cmd': 0,
+        'sobra_en_cmd': 0,
+    }
+    if not len(scada.minutos):
+        return [], resumen
+
+    existentes = _leer_matriz_cmd(cursor, nombre_tabla, columnas, scada.minutos[0], scada.minutos[-1])
+    posicion = np.searchsorted(existentes.minutos, scada.minutos)
+    encontrada = posicion < len(existentes.minutos)
+    encontrada[encontrada] = existentes.minutos[posicion[encontrada]] == scada.minutos[encontrada]
+    cmd = np.full(scada.valores.shape, np.nan)
+    cmd[encontrada] = existentes.valores[posicion[encontrada]]
+    resumen['minutos_sin_fila_cmd'] = int((~encontrada).sum())
+
+    codigos = comparar_matrices(scada.valores, presentes, cmd, tolerancias)
+    filas, cols = np.nonzero(codigos)
+    for codigo, cantidad in zip(*np.unique(codigos[filas, cols], return_counts=True)):
+        resumen[TIPOS_DISCREPANCIA[int(codigo)]] = int(cantidad)
+
+    tiempos = scada.minutos[filas].astype(datetime).tolist()
+    valores_scada = scada.valores[filas, cols].tolist()
+    valores_cmd = cmd[filas, cols].tolist()
+    discrepancias = [
+        Discrepancia(
+            nombre_tabla, tiempo, columnas[col],
+            None if np.isnan(valor_scada) else valor_scada,
+            None if np.isnan(valor_cmd) else valor_cmd,
+            TIPOS_DISCREPANCIA[int(codigo)],
         )
-        if not registros_ext:
-            continue
+        for tiempo, col, valor_scada, valor_cmd, codigo
+        in zip(tiempos, cols.tolist(), valores_scada, valores_cmd, codigos[filas, cols].tolist())
+    ]
+    return discrepancias, resumen
 
-        # Lista de minutos existentes y sus valores
-        minutos_existentes = [r.timestamp.replace(second=0, microsecond=0) for r in registros_ext]
-        registros_dict = {r.timestamp.replace(second=0, microsecond=0): r for r in registros_ext}
-
-        # Rango de minutos a revisar (solo el rango solicitado)
-        t_actual = timezone.make_aware(fecha_inicio.replace(second=0, microsecond=0))
-        t_final = timezone.make_aware(fecha_fin.replace(second=0, microsecond=0))
-
-        nuevos = []
-        while t_actual <= t_final:
-            if t_actual not in registros_dict:
-                # Buscar posición para interpolar usando bisect
-                idx = bisect_left(minutos_existentes, t_actual)
-                prev = None
-                next_ = None
-                if 0 < idx < len(minutos_existentes):
-                    prev = registros_dict[minutos_existentes[idx - 1]]
-                    next_ = registros_dict[minutos_existentes[idx]]
-                elif idx == 0 and len(minutos_existentes) > 1:
-                    # Solo hay siguiente, buscar hasta 2 días después
-                    next_ = registros_dict[minutos_existentes[0]]
-                    # Buscar previo hasta 2 días antes
-                    prevs = ScadaTemporal.objects.filter(
-                        id_scada=id_scada,
-                        timestamp__lt=minutos_existentes[0],
-                        timestamp__gte=rango_extendido_inicio
-                    ).order_by('-timestamp')
-                    if prevs.exists():
-                        prev = prevs.first()
-                elif idx == len(minutos_existentes):
-                    # Solo hay previo, buscar hasta 2 días después
-                    prev = registros_dict[minutos_existentes[-1]]
-                    nexts = ScadaTemporal.objects.filter(
-                        id_scada=id_scada,
-                        timestamp__gt=minutos_existentes[-1],
-                        timestamp__lte=rango_extendido_fin
-                    ).order_by('timestamp')
-                    if nexts.exists():
-                        next_ = nexts.first()
-
-                if prev and next_:
-                    total_secs = (next_.timestamp - prev.timestamp).total_seconds()
-                    if total_secs == 0:
-                        valor_interp = prev.valor
-                    else:
-                        secs_to_t = (t_actual - prev.timestamp).total_seconds()
-                        valor_interp = prev.valor + (next_.valor - prev.valor) * (secs_to_t / total_secs)
-                    nuevos.append(
-                        ScadaTemporal(
-                            id_scada=id_scada,
-                            cabecera_cmd=prev.cabecera_cmd,
-                            valor=valor_interp,
-                            timestamp=t_actual,
-                            timestamp_utc=t_actual - timedelta(hours=5),
-                            nivel=prev.nivel,
-                            tipo='2'
-                        )
-                    )
-                # Si no hay ambos extremos, no interpola (deja en blanco)
-            t_actual += timedelta(minutes=1)
 
-        # Bulk create para eficiencia
-        if nuevos:
-            with transaction.atomic():
-                ScadaTemporal.objects.bulk_create(nuevos, batch_size=1000)
+def reconciliar_scadatemporal_con_sqlserver(fecha_inicio, fecha_fin):
+    """
+    Reconcilia la ventana [fecha_inicio, fecha_fin] de timestamp_utc de ScadaTemporal con las tablas CMD
+    de las centrales activas usando reconciliar_central. Devuelve un ResultadoComparacion con todas las
+    discrepancias y un resumen por tabla.
+    """
+    registro = obtener_registro()
+    discrepancias = []
+    resumenes = []
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+        try:
+            for central in registro.centrales.values():
+                discrepancias_central, resumen = reconciliar_central(
+                    cursor, central, registro.de_central(central), fecha_inicio, fecha_fin
+                )
+                discrepancias.extend(discrepancias_central)
+                resumenes.append(resumen)
+        finally:
+            cursor.close()
+    return ResultadoComparacion(discrepancias, resumenes)
 
 
-def comparar_scadatemporal_con_sqlserver2(fecha_inicio, fecha_fin):
+def _checksums_en_servidor(cursor, central, sensores, fecha_inicio, fecha_fin):
     """
-    Compara los datos de ScadaTemporal con las tablas de SQL Server.
-    Si encuentra diferencias mayores a 0.005, las registra en un archivo log.
+    Checksums por hora y columna calculados en SQL Server con una sola consulta entre bases de datos:
+    del lado de origen, los valores por minuto de dbo.HistoricalData reducidos con la agregación de cada sensor
+    (como validar_central_en_servidor); del lado CMD, solo las celdas (minuto, columna) que existen en el origen,
+    para que las celdas sin dato de origen no marquen horas distintas.
+    Cada checksum es (cantidad, suma de milésimas, suma de milésimas ponderada por minuto de la hora).
+    Devuelve {(hora UTC naive, columna): (checksum de origen, checksum CMD)}.
     """
-    logging.basicConfig(filename='comparacion_scada.log', level=logging.INFO, 
-                        format='%(asctime)s %(levelname)s:%(message)s')
+    nombre_tabla = nombre_tabla_cmd(central)
+    tabla_origen = f"[{settings.DB_SQL_DATABASE_SCADA}].dbo.HistoricalData"
+    agregados = _sql_agregados_por_minuto(tabla_origen, ['Posicion'], "h.TimeStamp >= ? AND h.TimeStamp < ?")
+    columnas_cmd = ', '.join(f"({i}, t.[{s.columna}])" for i, s in enumerate(sensores))
+    hora = "DATEADD(hour, DATEDIFF(hour, 0, Minuto), 0)"
+    ponderado = "* (DATEPART(minute, Minuto) + 1)"
+    query = f"""
+        WITH {agregados},
+        cmd AS (
+            SELECT t.[timestamp] AS Minuto, u.Posicion, u.Valor
+            FROM [{nombre_tabla}] t
+            CROSS APPLY (VALUES {columnas_cmd}) AS u(Posicion, Valor)
+            WHERE t.[timestamp] BETWEEN ? AND ?
+        ),
+        celdas AS (
+            SELECT DATEADD(hour, -5, a.Minuto) AS Minuto,
+                   a.Posicion,
+                   CAST(ROUND(a.Valor * 1000, 0) AS BIGINT) AS Origen,
+                   CAST(ROUND(c.Valor * 1000, 0) AS BIGINT) AS Destino
+            FROM agregados a
+            LEFT JOIN cmd c ON c.Minuto = DATEADD(hour, -5, a.Minuto) AND c.Posicion = a.Posicion
+            WHERE a.Valor IS NOT NULL
+        )
+        SELECT {hora}, Posicion,
+               COUNT(Origen), SUM(Origen), SUM(Origen {ponderado}),
+               COUNT(Destino), SUM(Destino), SUM(Destino {ponderado})
+        FROM celdas
+        GROUP BY {hora}, Posicion
+    """
+    inicio = minuto_utc(fecha_inicio).astype(datetime)
+    fin = minuto_utc(fecha_fin).astype(datetime)
+    filtro = FiltroIdsScada(
+        cursor, [(s.id_scada, s.agregacion, i) for i, s in enumerate(sensores)],
+        columnas=[('Agregacion', 'NVARCHAR(20)'), ('Posicion', 'INT')], tabla_origen=tabla_origen
+    )
+    checksums = {}
+    try:
+        for sql, params in filtro.consultas(
+            query, inicio + timedelta(hours=5), fin + timedelta(hours=5, minutes=1), inicio, fin
+        ):
+            cursor.execute(sql, *params)
+            for hora_fila, posicion, *valores in cursor.fetchall():
+                origen, destino = (
+                    tuple(int(v or 0) for v in valores[:3]), tuple(int(v or 0) for v in valores[3:])
+                )
+                checksums[(hora_fila, sensores[posicion].columna)] = (origen, destino)
+    finally:
+        filtro.cerrar()
+    return checksums
+
+
+def auditar_checksum_central(cursor, central, sensores, fecha_inicio, fecha_fin):
+    """
+    Auditoría jerárquica de una central contra dbo.HistoricalData, sin depender de ScadaTemporal (que el cron purga),
+    por lo que sirve para rangos de meses: compara checksums por hora y columna calculados en SQL Server
+    (_checksums_en_servidor) y solo en las horas cuyos checksums difieren compara minuto a minuto las columnas
+    afectadas con validar_central_en_servidor. El costo de la revisión detallada depende de las horas con
+    diferencias y no del volumen de datos. Devuelve (lista de Discrepancia, resumen).
+    """
+    nombre_tabla = nombre_tabla_cmd(central)
+    checksums = _checksums_en_servidor(cursor, central, sensores, fecha_inicio, fecha_fin)
+
+    distintas = defaultdict(set)
+    for (hora, columna), (origen, destino) in checksums.items():
+        if origen != destino:
+            distintas[hora].add(columna)
+
+    resumen = {
+        'tabla': nombre_tabla,
+        'horas': len({hora for hora, _ in checksums}),
+        'horas_distintas': len(distintas),
+        'diferente': 0,
+        'falta_en_cmd': 0,
+    }
+    utc = ZoneInfo('UTC')
+    inicio = timezone.make_aware(minuto_utc(fecha_inicio).astype(datetime), utc)
+    fin = timezone.make_aware(minuto_utc(fecha_fin).astype(datetime), utc)
+    discrepancias = []
+    for hora in sorted(distintas):
+        desde = max(timezone.make_aware(hora, utc), inicio)
+        hasta = min(timezone.make_aware(hora + timedelta(minutes=59), utc), fin)
+        sensores_hora = [s for s in sensores if s.columna in distintas[hora]]
+        discrepancias_hora, resumen_hora = validar_central_en_servidor(cursor, central, sensores_hora, desde, hasta)
+        discrepancias.extend(discrepancias_hora)
+        for clave in ('diferente', 'falta_en_cmd'):
+            resumen[clave] += resumen_hora[clave]
+    return discrepancias, resumen
+
+
+def auditar_checksum_historicaldata(fecha_inicio, fecha_fin):
+    """
+    Auditoría rápida de la ventana [fecha_inicio, fecha_fin] de timestamp UTC de las tablas CMD contra
+    dbo.HistoricalData con auditar_checksum_central para las centrales activas.
+    Devuelve un ResultadoComparacion como reconciliar_scadatemporal_con_sqlserver.
+    """
+    registro = obtener_registro()
+    discrepancias = []
+    resumenes = []
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+        try:
+            for central in registro.centrales.values():
+                discrepancias_central, resumen = auditar_checksum_central(
+                    cursor, central, registro.de_central(central), fecha_inicio, fecha_fin
+                )
+                discrepancias.extend(discrepancias_central)
+                resumenes.append(resumen)
+        finally:
+            cursor.close()
+    return ResultadoComparacion(discrepancias, resumenes)
 
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
+
+def validar_central_en_servidor(cursor, central, sensores, fecha_inicio, fecha_fin):
+    """
+    Compara dentro de SQL Server, con una consulta entre bases de datos, dbo.HistoricalData de la base SCADA
+    con la tabla CMD de la central en la ventana [fecha_inicio, fecha_fin] de timestamp UTC de la tabla CMD.
+    De HistoricalData toma un valor por minuto con Quality=192, reducido con la agregación de cada sensor como
+    la importación agregada, leyendo el rango semiabierto [inicio, fin + 1 minuto) para no perder lecturas con
+    fracciones de segundo, y lo lleva al minuto de la tabla CMD restando 5 horas; la tabla CMD se despivota con
+    CROSS APPLY. Cada sensor se identifica en la consulta por su posición, que viaja en el filtro de ids junto
+    con la agregación y la tolerancia.
+    Solo vuelven las celdas distintas: exacto para sensores booleanos, ±TOLERANCIA_COMPARACION para numéricos.
+    Devuelve (lista de Discrepancia, resumen).
+    """
+    nombre_tabla = nombre_tabla_cmd(central)
+    tabla_origen = f"[{settings.DB_SQL_DATABASE_SCADA}].dbo.HistoricalData"
+    agregados = _sql_agregados_por_minuto(
+        tabla_origen, ['Posicion', 'Tolerancia'], "h.TimeStamp >= ? AND h.TimeStamp < ?"
+    )
+    columnas_cmd = ', '.join(f"({i}, t.[{s.columna}])" for i, s in enumerate(sensores))
+    query = f"""
+        WITH {agregados},
+        cmd AS (
+            SELECT t.[timestamp] AS Minuto, u.Posicion, u.Valor
+            FROM [{nombre_tabla}] t
+            CROSS APPLY (VALUES {columnas_cmd}) AS u(Posicion, Valor)
+            WHERE t.[timestamp] BETWEEN ? AND ?
+        )
+        SELECT DATEADD(hour, -5, a.Minuto) AS Minuto, a.Posicion, a.Valor, c.Valor
+        FROM agregados a
+        LEFT JOIN cmd c ON c.Minuto = DATEADD(hour, -5, a.Minuto) AND c.Posicion = a.Posicion
+        WHERE a.Valor IS NOT NULL
+          AND (c.Valor IS NULL OR ABS(a.Valor - c.Valor) > a.Tolerancia)
+        ORDER BY Minuto, a.Posicion
+    """
+    inicio = minuto_utc(fecha_inicio).astype(datetime)
+    fin = minuto_utc(fecha_fin).astype(datetime)
+    filas = [
+        (s.id_scada, s.agregacion, i, 0.0 if s.tipo == '2' else TOLERANCIA_COMPARACION)
+        for i, s in enumerate(sensores)
+    ]
+    filtro = FiltroIdsScada(
+        cursor, filas, columnas=[('Agregacion', 'NVARCHAR(20)'), ('Posicion', 'INT'), ('Tolerancia', 'FLOAT')],
+        tabla_origen=tabla_origen
     )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
+    discrepancias = []
+    try:
+        for sql, params in filtro.consultas(
+            query, inicio + timedelta(hours=5), fin + timedelta(hours=5, minutes=1), inicio, fin
+        ):
+            cursor.execute(sql, *params)
+            for minuto, posicion, valor_scada, valor_cmd in cursor.fetchall():
+                discrepancias.append(Discrepancia(
+                    nombre_tabla, minuto, sensores[posicion].columna, valor_scada,
+                    None if valor_cmd is None else float(valor_cmd),
+                    'falta_en_cmd' if valor_cmd is None else 'diferente',
+                ))
+    finally:
+        filtro.cerrar()
 
-    centrales = Central.objects.filter(estado=True)
+    resumen = {
+        'tabla': nombre_tabla,
+        'diferente': sum(d.tipo == 'diferente' for d in discrepancias),
+        'falta_en_cmd': sum(d.tipo == 'falta_en_cmd' for d in discrepancias),
+    }
+    return discrepancias, resumen
 
-    for central in centrales:
-        nombre_tabla = 'CMD' + central.descripcion.replace(' ', '_')
-        niveles = Nivel.objects.filter(central=central)
-        registros = ScadaTemporal.objects.filter(nivel__in=niveles).order_by('timestamp_utc')
 
-        cabeceras = Homologacion.objects.filter(nivel__central=central, estado=True, nivel__estado=True, nivel__central__estado=True).values_list('cabecera_cmd', flat=True)
-        cabeceras = [c.replace(' ', '_') for c in cabeceras]
+def validar_historicaldata_con_sqlserver(fecha_inicio, fecha_fin):
+    """
+    Validación de punta a punta de la ventana [fecha_inicio, fecha_fin] de timestamp UTC: compara
+    dbo.HistoricalData con las tablas CMD de las centrales activas con validar_central_en_servidor,
+    sin pasar por ScadaTemporal ni traer los datos a Python. Requiere que ambas bases de datos
+    estén en la misma instancia de SQL Server. Devuelve un ResultadoComparacion.
+    """
+    registro = obtener_registro()
+    discrepancias = []
+    resumenes = []
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+        try:
+            for central in registro.centrales.values():
+                discrepancias_central, resumen = validar_central_en_servidor(
+                    cursor, central, registro.de_central(central), fecha_inicio, fecha_fin
+                )
+                discrepancias.extend(discrepancias_central)
+                resumenes.append(resumen)
+        finally:
+            cursor.close()
+    return ResultadoComparacion(discrepancias, resumenes)
 
-        for reg in registros:
-            minuto = reg.timestamp_utc.replace(second=0, microsecond=0)
-            columna = reg.cabecera_cmd.replace(' ', '_')
-            if columna not in cabeceras:
-                continue  # Solo compara columnas válidas
 
-            # Consulta el valor en SQL Server
-            sql = f"SELECT [{columna}] FROM [{nombre_tabla}] WHERE [timestamp]=?"
-            cursor.execute(sql, minuto)
-            row = cursor.fetchone()
-            valor_sql = row[0] if row else None
+def registrar_resultado_comparacion(resultado, modo, fecha_inicio, fecha_fin, proceso=None, tamano_lote=None):
+    """
+    Guarda un ResultadoComparacion: una fila ReconciliationSummary por tabla (vinculada al proceso ETL, si se indica)
+    y las discrepancias como ReconciliationResult con bulk_create en lotes de tamano_lote
+    (por defecto settings.ETL_COMPARAR_TAMANO_LOTE). Devuelve la lista de resúmenes creados.
+    """
+    tamano_lote = tamano_lote or settings.ETL_COMPARAR_TAMANO_LOTE
+    centrales = {nombre_tabla_cmd(c): c for c in obtener_registro().centrales.values()}
+    utc = ZoneInfo('UTC')
+    if timezone.is_naive(fecha_inicio):
+        fecha_inicio = timezone.make_aware(fecha_inicio)
+    if timezone.is_naive(fecha_fin):
+        fecha_fin = timezone.make_aware(fecha_fin)
 
-            valor_django = reg.valor
-            try:
-                valor_sql_float = float(str(valor_sql).replace(',', '.')) if valor_sql is not None else None
-            except Exception:
-                valor_sql_float = None
-
-            diferencia = None
-            iguales = False
-            if valor_sql_float is None and valor_django is None:
-                iguales = True
-            elif valor_sql_float is not None and valor_django is not None:
-                diferencia = abs(valor_sql_float - valor_django)
-                iguales = diferencia <= 0.005
-
-            if not iguales:
-                logging.info(
-                    f"Diferencia en {nombre_tabla} - timestamp: {minuto}, columna: {columna}, "
-                    f"Django: {valor_django}, SQLServer: {valor_sql_float}, Diferencia: {diferencia}"
+    with transaction.atomic():
+        resumenes = {}
+        for r in resultado.resumenes:
+            resumenes[r['tabla']] = ReconciliationSummary.objects.create(
+                proceso=proceso,
+                central=centrales[r['tabla']],
+                modo=modo,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                celdas=r.get('celdas'),
+                diferentes=r.get('diferente', 0),
+                faltan_en_cmd=r.get('falta_en_cmd', 0),
+                sobran_en_cmd=r.get('sobra_en_cmd', 0),
+            )
+        discrepancias = resultado.discrepancias
+        for i in range(0, len(discrepancias), tamano_lote):
+            ReconciliationResult.objects.bulk_create([
+                ReconciliationResult(
+                    resumen=resumenes[d.tabla],
+                    central=resumenes[d.tabla].central,
+                    columna=d.columna,
+                    timestamp=timezone.make_aware(d.timestamp, utc),
+                    valor_scada=d.valor_scada,
+                    valor_cmd=d.valor_cmd,
+                    tipo=d.tipo,
                 )
+                for d in discrepancias[i:i + tamano_lote]
+            ])
+    return list(resumenes.values())
+
 
-    cursor.close()
-    conn.close()
+def comparar_scadatemporal_con_sqlserver2(fecha_inicio, fecha_fin, modo=None, proceso=None):
+    """
+    Compara los datos de ScadaTemporal de la ventana con las tablas de SQL Server con el modo indicado
+    o el de settings.ETL_COMPARAR_MODO: 'conjuntos' (reconciliar_scadatemporal_con_sqlserver, celda a celda).
+    Los modos 'checksum' (auditar_checksum_historicaldata, solo revisa las horas con checksums distintos, apto para
+    rangos largos) y 'servidor' (validar_historicaldata_con_sqlserver) comparan dbo.HistoricalData en lugar de ScadaTemporal.
+    Las diferencias mayores a 0.005 (o cualquier diferencia en sensores booleanos) se guardan con
+    registrar_resultado_comparacion, vinculadas al proceso ETL si se indica; en el log solo queda un resumen por tabla.
+    Devuelve el ResultadoComparacion.
+    """
+    logging.basicConfig(filename='comparacion_scada.log', level=logging.INFO, 
+                        format='%(asctime)s %(levelname)s:%(message)s')
+
+    modos = {
+        'conjuntos': reconciliar_scadatemporal_con_sqlserver,
+        'checksum': auditar_checksum_historicaldata,
+        'servidor': validar_historicaldata_con_sqlserver,
+    }
+    modo = modo or settings.ETL_COMPARAR_MODO
+    if modo not in modos:
+        raise ValueError(f"Modo de comparación desconocido: {modo}")
+
+    resultado = modos[modo](fecha_inicio, fecha_fin)
+    registrar_resultado_comparacion(resultado, modo, fecha_inicio, fecha_fin, proceso)
+    for r in resultado.resumenes:
+        logging.info(
+            f"Comparación {r['tabla']}: " + ', '.join(f"{clave}: {valor}" for clave, valor in r.items() if clave != 'tabla')
+        )
+    return resultado
 
 
 def ejecutar_etl_secuencial():
@@ -767,9 +1826,9 @@ def ejecutar_etl_secuencial():
 
     try:
         etapas = [
-            ('importar', importar_valores_scada_desde_sqlserver2),
+            ('importar', importar_valores_scada),
             ('completar', completar_minutos_faltantes_scadatemporal2),
-            ('exportar', exportar_scadatemporal_a_sqlserver),
+            ('exportar', exportar_scadatemporal),
         ]
         etapa_idx = [e[0] for e in etapas].index(estado.etapa)
         funcion = etapas[etapa_idx][1]
@@ -831,52 +1890,38 @@ def importar_excel_a_cmd(ruta_archivo):
     if not all(col in df.columns for col in ['ID_scada', 'valor', 'timestamp']):
         raise ValueError("El archivo debe tener las columnas: ID_scada, valor, timestamp.")
 
-    server = settings.DB_SQL_SERVER
-    database = settings.DB_SQL_DATABASE
-    username = settings.DB_SQL_USERNAME
-    password = settings.DB_SQL_PASSWORD
-    driver = settings.DB_DRIVER
-
-    conn_str = (
-        f"DRIVER={{ODBC Driver {driver} for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        f"UID={username};"
-        f"PWD={password};"
-        "TrustServerCertificate=Yes;"
-    )
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-
-    for _, row in df.iterrows():
-        id_scada = row['ID_scada']
-        valor = row['valor']
-        timestamp = row['timestamp']
-        homologacion = Homologacion.objects.filter(id_scada=id_scada).first()
-        if not homologacion or not hasattr(homologacion, 'tabla_cmd'):
-            continue
-        tabla_cmd = homologacion.tabla_cmd
-        cabecera = homologacion.cabecera_cmd.replace(' ', '_')
-        # Inserta el valor en la columna de cabecera adecuada, con el timestamp
-        # Si ya existe ese timestamp, actualiza; si no, inserta nuevo
-        cursor.execute(f"SELECT COUNT(*) FROM [{tabla_cmd}] WHERE [timestamp]=?", timestamp)
-        existe = cursor.fetchone()[0] > 0
-        if existe:
-            sql = f"UPDATE [{tabla_cmd}] SET [{cabecera}]=? WHERE [timestamp]=?"
-            try:
-                cursor.execute(sql, valor, timestamp)
-            except Exception as e:
-                print(f"Error actualizando en {tabla_cmd}: {e}")
-        else:
-            sql = f"INSERT INTO [{tabla_cmd}] ([timestamp], [{cabecera}]) VALUES (?, ?)"
-            try:
-                cursor.execute(sql, timestamp, valor)
-            except Exception as e:
-                print(f"Error insertando en {tabla_cmd}: {e}")
+    with conexion_cmd() as conn:
+        cursor = conn.cursor()
+
+        sensores = obtener_registro().sensores
+        for _, row in df.iterrows():
+            id_scada = str(row['ID_scada']).strip()
+            valor = row['valor']
+            timestamp = row['timestamp']
+            sensor = sensores.get(id_scada)
+            if not sensor:
+                continue
+            tabla_cmd = sensor.tabla_cmd
+            cabecera = sensor.columna
+            # Inserta el valor en la columna de cabecera adecuada, con el timestamp
+            # Si ya existe ese timestamp, actualiza; si no, inserta nuevo
+            cursor.execute(f"SELECT COUNT(*) FROM [{tabla_cmd}] WHERE [timestamp]=?", timestamp)
+            existe = cursor.fetchone()[0] > 0
+            if existe:
+                sql = f"UPDATE [{tabla_cmd}] SET [{cabecera}]=? WHERE [timestamp]=?"
+                try:
+                    cursor.execute(sql, valor, timestamp)
+                except Exception as e:
+                    print(f"Error actualizando en {tabla_cmd}: {e}")
+            else:
+                sql = f"INSERT INTO [{tabla_cmd}] ([timestamp], [{cabecera}]) VALUES (?, ?)"
+                try:
+                    cursor.execute(sql, timestamp, valor)
+                except Exception as e:
+                    print(f"Error insertando en {tabla_cmd}: {e}")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        conn.commit()
+        cursor.close()
 
 
 def ejecutar_etl_secuencial_cron():
@@ -889,7 +1934,11 @@ def ejecutar_etl_secuencial_cron():
     Almacena en ETLProcessStateCron la cantidad de registros exportados por exportar_scadatemporal_a_sqlserver.
     Guarda un registro en ETLProcessLogCron por cada etapa.
     No inicia si ya hay un registro en ejecución.
-    Al finalizar, elimina los datos de ScadaTemporal con fecha menor a dos días antes de la fecha_base.
+    Con settings.ETL_CRON_COMPARAR ejecuta además la etapa comparar y guarda sus resultados vinculados al proceso.
+    Al finalizar, elimina los datos de ScadaTemporal con fecha menor a dos días antes de la fecha_base
+    y, con tablas CMD particionadas, mantiene la ventana deslizante de particiones mensuales.
+    Con settings.ETL_MODO_CRON = 'fusionado' las etapas se pasan los datos en memoria (EjecucionFusionada)
+    y ScadaTemporal solo se escribe como auditoría.
     """
     try:
         fecha_base = Parametro.objects.get(pk=2).valor
@@ -915,6 +1964,7 @@ def ejecutar_etl_secuencial_cron():
     
     fecha_inicio = fecha_base - timedelta(minutes=15)
     fecha_fin = fecha_base + timedelta(minutes=15)
+    fusionado = settings.ETL_MODO_CRON == 'fusionado'
 
     with transaction.atomic():
         estado = ETLProcessStateCron.objects.create(
@@ -933,7 +1983,11 @@ def ejecutar_etl_secuencial_cron():
         proceso=estado
     )
     try:
-        importar_valores_scada_desde_sqlserver2(fecha_inicio + timedelta(hours=5), fecha_fin + timedelta(hours=5))
+        if fusionado:
+            ejecucion = EjecucionFusionada(fecha_inicio, fecha_fin)
+            ejecucion.importar()
+        else:
+            importar_valores_scada(fecha_inicio + timedelta(hours=5), fecha_fin + timedelta(hours=5))
         log_importar.exito = True
         log_importar.mensaje = "Etapa importar finalizada correctamente"
     except Exception as e:
@@ -955,7 +2009,10 @@ def ejecutar_etl_secuencial_cron():
         proceso=estado
     )
     try:
-        completar_minutos_faltantes_scadatemporal3(fecha_inicio + timedelta(hours=5), fecha_fin + timedelta(hours=5))
+        if fusionado:
+            ejecucion.completar()
+        else:
+            completar_minutos_faltantes_scadatemporal3(fecha_inicio + timedelta(hours=5), fecha_fin + timedelta(hours=5))
         log_completar.exito = True
         log_completar.mensaje = "Etapa completar finalizada correctamente"
     except Exception as e:
@@ -977,7 +2034,10 @@ def ejecutar_etl_secuencial_cron():
         proceso=estado
     )
     try:
-        registros_exportados = exportar_scadatemporal_a_sqlserver(fecha_inicio, fecha_fin)
+        if fusionado:
+            registros_exportados = ejecucion.exportar()
+        else:
+            registros_exportados = exportar_scadatemporal(fecha_inicio, fecha_fin)
         estado.registros = registros_exportados
         estado.completado = True
         estado.en_ejecucion = False
@@ -987,14 +2047,17 @@ def ejecutar_etl_secuencial_cron():
         # Después de exportar
         if registros_exportados > 0:
             # Encuentra el último minuto exportado
-            ultimo_minuto = (
-                ScadaTemporal.objects.filter(
-                    timestamp_utc__range=(fecha_inicio, fecha_fin)
+            if fusionado:
+                ultimo_minuto = ejecucion.ultimo_minuto()
+            else:
+                ultimo_minuto = (
+                    ScadaTemporal.objects.filter(
+                        timestamp_utc__range=(fecha_inicio, fecha_fin)
+                    )
+                    .order_by('-timestamp_utc')
+                    .values_list('timestamp_utc', flat=True)
+                    .first()
                 )
-                .order_by('-timestamp_utc')
-                .values_list('timestamp_utc', flat=True)
-                .first()
-            )
             if ultimo_minuto:
                 nuevo_valor = ultimo_minuto + timedelta(minutes=1)
                 Parametro.objects.filter(pk=2).update(valor=nuevo_valor)
@@ -1011,98 +2074,481 @@ def ejecutar_etl_secuencial_cron():
     log_exportar.fin = datetime.now()
     log_exportar.save()
     estado.save()
+    if fusionado:
+        ejecucion.esperar_auditoria()
+
+    # ETAPA 4 (opcional): comparar. Un error aquí no invalida la exportación
+    if settings.ETL_CRON_COMPARAR:
+        log_comparar = ETLProcessLogCron.objects.create(
+            fecha_hora=fecha_inicio,
+            etapa='comparar',
+            mensaje="Inicio de etapa comparar",
+            proceso=estado
+        )
+        try:
+            resultado = comparar_scadatemporal_con_sqlserver2(fecha_inicio, fecha_fin, proceso=estado)
+            log_comparar.exito = True
+            log_comparar.mensaje = f"Etapa comparar finalizada: {len(resultado.discrepancias)} discrepancias."
+        except Exception as e:
+            log_comparar.exito = False
+            log_comparar.mensaje = f"Error en comparar: {str(e)}"
+        log_comparar.fin = datetime.now()
+        log_comparar.save()
 
     # Eliminar datos de ScadaTemporal con fecha menor a dos días antes de la fecha_base
     fecha_limite = fecha_base - timedelta(days=2)
     ScadaTemporal.objects.filter(timestamp__lt=fecha_limite).delete()
+    CoberturaSensor.objects.filter(dia__lt=fecha_limite.date()).delete()
+    CheckpointExportacion.objects.filter(fecha_fin__lt=fecha_limite).delete()
+    # Resultados de comparación vencidos: primero las discrepancias, en un solo DELETE, y luego los resúmenes
+    limite_comparacion = timezone.now() - timedelta(days=settings.ETL_COMPARAR_RETENCION_DIAS)
+    ReconciliationResult.objects.filter(resumen__creado__lt=limite_comparacion).delete()
+    ReconciliationSummary.objects.filter(creado__lt=limite_comparacion).delete()
+    if settings.ETL_CMD_ALMACENAMIENTO == 'particionado':
+        try:
+            mantener_particiones_cmd()
+        except pyodbc.Error as e:
+            logging.error(f"Error en el mantenimiento de particiones CMD: {e}")
+    registrar_estadisticas_pools()
+
 
+SerieScadaTemporal = namedtuple('SerieScadaTemporal', ['ids', 'codigos', 'minutos', 'valores'])
 
-def completar_minutos_faltantes_scadatemporal3(fecha_inicio, fecha_fin):
+
+def series_scadatemporal(*querysets):
     """
-    Interpola minutos faltantes en memoria y usa bulk_create.
-    Solo interpola si la diferencia entre el dato previo y el siguiente es de 15 minutos o menos.
-    Si no encuentra ambos extremos o la diferencia es mayor, no interpola.
+    Lee (id_scada, valor, timestamp) de los querysets de ScadaTemporal en arreglos de NumPy:
+    ids únicos, código de cada fila (posición en ids), minuto UTC como datetime64[m] y valor.
+    Las filas quedan ordenadas por código y minuto, con una sola fila por minuto.
     """
-    ids = ScadaTemporal.objects.filter(
+    filas = []
+    for queryset in querysets:
+        filas.extend(queryset.filter(valor__isnull=False).values_list('id_scada', 'valor', 'timestamp'))
+    if not filas:
+        return SerieScadaTemporal(
+            np.array([], dtype=object), np.array([], dtype=np.int64),
+            np.array([], dtype='datetime64[m]'), np.array([], dtype=np.float64),
+        )
+    ids, valores, tiempos = zip(*filas)
+    unicos, codigos = np.unique(np.asarray(ids, dtype=object), return_inverse=True)
+    minutos = pd.to_datetime(list(tiempos), utc=True).tz_localize(None).values.astype('datetime64[m]')
+    valores = np.asarray(valores, dtype=np.float64)
+
+    orden = np.lexsort((minutos, codigos))
+    codigos, minutos, valores = codigos[orden], minutos[orden], valores[orden]
+    primera = np.ones(len(orden), dtype=bool)
+    primera[1:] = (codigos[1:] != codigos[:-1]) | (minutos[1:] != minutos[:-1])
+    return SerieScadaTemporal(unicos, codigos[primera], minutos[primera], valores[primera])
+
+
+def minuto_utc(fecha):
+    """
+    Minuto UTC (datetime64[m]) de una fecha; las fechas naive se toman en la zona horaria actual.
+    """
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, timezone.get_current_timezone())
+    return np.datetime64(timezone.make_naive(fecha, ZoneInfo('UTC')), 'm')
+
+
+def _valores_lineal(faltantes, eje, valores, anterior, siguiente):
+    return np.interp(faltantes, eje, valores)
+
+
+def _valores_mantener(faltantes, eje, valores, anterior, siguiente):
+    return valores[anterior]
+
+
+# Estrategias para completar minutos faltantes. 'ninguna' no genera registros.
+ESTRATEGIAS_COMPLETAR = {
+    'lineal': _valores_lineal,
+    'mantener': _valores_mantener,
+    'ninguna': None,
+}
+
+
+def estrategia_completar(sensor):
+    """
+    Estrategia de completado de un sensor del registro: la configurada en la homologación o, si no tiene,
+    'lineal' para numéricos y settings.ETL_COMPLETAR_ESTRATEGIA_BOOLEANO para booleanos.
+    """
+    if sensor.estrategia_completar:
+        return sensor.estrategia_completar
+    if sensor.tipo == '2':
+        return settings.ETL_COMPLETAR_ESTRATEGIA_BOOLEANO
+    return 'lineal'
+
+
+def interpolar_minutos_faltantes(codigos, minutos, valores, minuto_inicio, minuto_fin, codigos_objetivo,
+                                 max_hueco=None, estrategia='lineal'):
+    """
+    Completa en un solo paso la grilla de minutos [minuto_inicio, minuto_fin] de todos los sensores
+    de codigos_objetivo. codigos, minutos y valores son las muestras existentes, ordenadas por código
+    y minuto y sin minutos repetidos (como las devuelve series_scadatemporal).
+    Cada sensor se ubica en su propio tramo de un eje común, de modo que una sola llamada a numpy.interp
+    interpola todos los huecos sin mezclar sensores. Un minuto faltante solo se completa si tiene una
+    muestra anterior y una siguiente del mismo sensor y, si max_hueco no es None, si entre ambas hay
+    max_hueco minutos o menos. max_hueco puede ser un número o un arreglo con el límite de cada código.
+    estrategia es una clave de ESTRATEGIAS_COMPLETAR distinta de 'ninguna'.
+    Devuelve (codigos, minutos, valores) de los minutos generados.
+    """
+    vacio = (np.array([], dtype=np.int64), np.array([], dtype='datetime64[m]'), np.array([], dtype=np.float64))
+    rango = np.arange(minuto_inicio, minuto_fin + np.timedelta64(1, 'm'), dtype='datetime64[m]')
+    if not len(rango) or not len(codigos_objetivo) or not len(codigos):
+        return vacio
+
+    base = min(minutos.min(), minuto_inicio)
+    escala = int((max(minutos.max(), minuto_fin) - base).astype(np.int64)) + 2
+    eje = codigos.astype(np.int64) * escala + (minutos - base).astype(np.int64)
+    grilla = (
+        np.asarray(codigos_objetivo, dtype=np.int64)[:, None] * escala + (rango - base).astype(np.int64)[None, :]
+    ).ravel()
+
+    posicion = np.searchsorted(eje, grilla)
+    existe = eje[np.minimum(posicion, len(eje) - 1)] == grilla
+    faltantes = grilla[~existe]
+    posicion = posicion[~existe]
+    codigo_faltante = faltantes // escala
+
+    anterior = np.maximum(posicion - 1, 0)
+    siguiente = np.minimum(posicion, len(eje) - 1)
+    validos = (
+        (posicion > 0) & (posicion < len(eje))
+        & (codigos[anterior] == codigo_faltante) & (codigos[siguiente] == codigo_faltante)
+    )
+    if max_hueco is not None:
+        limite = np.asarray(max_hueco)[codigo_faltante] if np.ndim(max_hueco) else max_hueco
+        validos &= eje[siguiente] - eje[anterior] <= limite
+
+    faltantes = faltantes[validos]
+    return (
+        codigo_faltante[validos],
+        base + (faltantes % escala).astype('timedelta64[m]'),
+        ESTRATEGIAS_COMPLETAR[estrategia](faltantes, eje, valores, anterior[validos], siguiente[validos]),
+    )
+
+
+def cargar_muestras_completar(fecha_inicio, fecha_fin, extension=timedelta(days=2), max_hueco_minutos=None):
+    """
+    Carga con un número fijo de consultas las muestras que necesita la etapa completar:
+    los sensores con registros en el rango (id_scada -> (cabecera_cmd, nivel_id)), todos sus registros
+    del rango en una sola consulta y, en otra, la muestra más cercana antes y después del rango
+    de cada sensor, buscada hasta extension antes y después.
+    No se cargan los sensores que completar_serie no completaría: los que no están en el registro
+    o tienen estrategia 'ninguna', y aquellos cuyos huecos, según el índice de cobertura (CoberturaSensor),
+    no tienen vecino a ambos lados o superan su hueco máximo.
+    Devuelve (sensores, SerieScadaTemporal).
+    """
+    registro = obtener_registro().sensores
+    sensores = {}
+    for id_scada, cabecera_cmd, nivel_id in ScadaTemporal.objects.filter(
         timestamp__range=(fecha_inicio, fecha_fin)
-    ).values_list('id_scada', flat=True).distinct()
-
-    for id_scada in ids:
-        # Buscar registros en el rango extendido para los extremos
-        rango_extendido_inicio = fecha_inicio - timedelta(days=2)
-        rango_extendido_fin = fecha_fin + timedelta(days=2)
-        registros_ext = list(
-            ScadaTemporal.objects.filter(
+    ).values_list('id_scada', 'cabecera_cmd', 'nivel_id').distinct():
+        sensor = registro.get(id_scada)
+        if sensor is None or estrategia_completar(sensor) == 'ninguna':
+            continue
+        sensores.setdefault(id_scada, (cabecera_cmd, nivel_id))
+    max_hueco = {
+        id_scada: max_hueco_minutos if registro[id_scada].max_hueco_minutos is None else registro[id_scada].max_hueco_minutos
+        for id_scada in sensores
+    }
+    completables = sensores_completables(sensores, fecha_inicio, fecha_fin, extension, max_hueco)
+    sensores = {id_scada: datos for id_scada, datos in sensores.items() if id_scada in completables}
+    if not sensores:
+        return sensores, series_scadatemporal()
+
+    ids = list(sensores)
+    rango = ScadaTemporal.objects.filter(id_scada__in=ids, timestamp__range=(fecha_inicio, fecha_fin))
+    if not extension:
+        return sensores, series_scadatemporal(rango)
+
+    anterior = ScadaTemporal.objects.filter(
+        id_scada=OuterRef('id_scada'),
+        timestamp__lt=fecha_inicio,
+        timestamp__gte=fecha_inicio - extension,
+        valor__isnull=False
+    ).order_by('-timestamp').values('timestamp')[:1]
+    siguiente = ScadaTemporal.objects.filter(
+        id_scada=OuterRef('id_scada'),
+        timestamp__gt=fecha_fin,
+        timestamp__lte=fecha_fin + extension,
+        valor__isnull=False
+    ).order_by('timestamp').values('timestamp')[:1]
+    # La consulta externa se limita a las franjas de extensión, fuera del rango, para no recorrer la tabla completa
+    vecinos = ScadaTemporal.objects.filter(
+        id_scada__in=ids,
+        timestamp__gte=fecha_inicio - extension,
+        timestamp__lte=fecha_fin + extension,
+    ).exclude(timestamp__range=(fecha_inicio, fecha_fin)).filter(
+        Q(timestamp=Subquery(anterior)) | Q(timestamp=Subquery(siguiente))
+    )
+
+    return sensores, series_scadatemporal(rango, vecinos)
+
+
+def _completar_minutos_faltantes(fecha_inicio, fecha_fin, max_hueco_minutos, cargador=None, extension=timedelta(days=2)):
+    """
+    Completa los minutos faltantes de todos los sensores del rango con completar_serie
+    y guarda con guardar_scadatemporal solo los registros generados. Devuelve cuántos se generaron.
+    """
+    sensores, serie = cargar_muestras_completar(fecha_inicio, fecha_fin, extension, max_hueco_minutos)
+    codigos, minutos, valores = completar_serie(serie, minuto_utc(fecha_inicio), minuto_utc(fecha_fin), max_hueco_minutos)
+
+    utc = ZoneInfo('UTC')
+    nuevos = []
+    for id_scada, minuto, valor in zip(serie.ids[codigos].tolist(), minutos.astype(datetime).tolist(), valores.tolist()):
+        cabecera_cmd, nivel_id = sensores[id_scada]
+        t_actual = timezone.make_aware(minuto, utc)
+        nuevos.append(
+            ScadaTemporal(
                 id_scada=id_scada,
-                timestamp__range=(rango_extendido_inicio, rango_extendido_fin)
-            ).order_by('timestamp')
+                cabecera_cmd=cabecera_cmd,
+                valor=valor,
+                timestamp=t_actual,
+                timestamp_utc=t_actual - timedelta(hours=5),
+                nivel_id=nivel_id,
+                tipo='2'
+            )
         )
-        if not registros_ext:
+
+    if not nuevos:
+        return 0
+    with transaction.atomic():
+        return guardar_scadatemporal(nuevos, cargador)
+
+
+def completar_serie(serie, minuto_inicio, minuto_fin, max_hueco_minutos):
+    """
+    Calcula los minutos faltantes en [minuto_inicio, minuto_fin] de una SerieScadaTemporal
+    aplicando a cada sensor su estrategia (estrategia_completar) y su hueco máximo
+    (Homologacion.max_hueco_minutos o, si no tiene, max_hueco_minutos; None es sin límite).
+    Los sensores con estrategia 'ninguna' o fuera del registro de sensores activos no se completan.
+    Devuelve (codigos, minutos, valores) de los minutos generados.
+    """
+    registro = obtener_registro().sensores
+
+    limites = np.full(len(serie.ids), np.inf if max_hueco_minutos is None else max_hueco_minutos, dtype=np.float64)
+    por_estrategia = defaultdict(list)
+    for codigo, id_scada in enumerate(serie.ids.tolist()):
+        sensor = registro.get(id_scada)
+        if sensor is None:
             continue
+        if sensor.max_hueco_minutos is not None:
+            limites[codigo] = sensor.max_hueco_minutos
+        estrategia = estrategia_completar(sensor)
+        if estrategia not in ESTRATEGIAS_COMPLETAR:
+            raise ValueError(f"Estrategia de completado desconocida para {id_scada}: {estrategia}")
+        if ESTRATEGIAS_COMPLETAR[estrategia] is not None:
+            por_estrategia[estrategia].append(codigo)
+
+    generados = [
+        interpolar_minutos_faltantes(
+            serie.codigos, serie.minutos, serie.valores, minuto_inicio, minuto_fin,
+            codigos_objetivo, limites, estrategia
+        )
+        for estrategia, codigos_objetivo in por_estrategia.items()
+    ]
+    if not generados:
+        return (np.array([], dtype=np.int64), np.array([], dtype='datetime64[m]'), np.array([], dtype=np.float64))
+    return tuple(np.concatenate(partes) for partes in zip(*generados))
+
 
-        minutos_existentes = [r.timestamp.replace(second=0, microsecond=0) for r in registros_ext]
-        registros_dict = {r.timestamp.replace(second=0, microsecond=0): r for r in registros_ext}
-
-        t_actual = fecha_inicio.replace(second=0, microsecond=0)
-        t_final = fecha_fin.replace(second=0, microsecond=0)
-        from django.utils import timezone
-        if timezone.is_naive(t_actual):
-            t_actual = timezone.make_aware(t_actual, timezone.get_current_timezone())
-        if timezone.is_naive(t_final):
-            t_final = timezone.make_aware(t_final, timezone.get_current_timezone())
-
-        nuevos = []
-        while t_actual <= t_final:
-            if t_actual not in registros_dict:
-                idx = bisect_left(minutos_existentes, t_actual)
-                prev = None
-                next_ = None
-                if 0 < idx < len(minutos_existentes):
-                    prev = registros_dict[minutos_existentes[idx - 1]]
-                    next_ = registros_dict[minutos_existentes[idx]]
-                elif idx == 0 and len(minutos_existentes) > 1:
-                    next_ = registros_dict[minutos_existentes[0]]
-                    prevs = ScadaTemporal.objects.filter(
-                        id_scada=id_scada,
-                        timestamp__lt=minutos_existentes[0],
-                        timestamp__gte=rango_extendido_inicio
-                    ).order_by('-timestamp')
-                    if prevs.exists():
-                        prev = prevs.first()
-                elif idx == len(minutos_existentes):
-                    prev = registros_dict[minutos_existentes[-1]]
-                    nexts = ScadaTemporal.objects.filter(
-                        id_scada=id_scada,
-                        timestamp__gt=minutos_existentes[-1],
-                        timestamp__lte=rango_extendido_fin
-                    ).order_by('timestamp')
-                    if nexts.exists():
-                        next_ = nexts.first()
-
-                # Solo interpola si ambos extremos existen y la diferencia es <= 15 minutos
-                if prev and next_:
-                    diferencia_minutos = abs(int((next_.timestamp - prev.timestamp).total_seconds() // 60))
-                    if diferencia_minutos <= 15:
-                        total_secs = (next_.timestamp - prev.timestamp).total_seconds()
-                        if total_secs == 0:
-                            valor_interp = prev.valor
-                        else:
-                            secs_to_t = (t_actual - prev.timestamp).total_seconds()
-                            valor_interp = prev.valor + (next_.valor - prev.valor) * (secs_to_t / total_secs)
-                        nuevos.append(
-                            ScadaTemporal(
-                                id_scada=id_scada,
-                                cabecera_cmd=prev.cabecera_cmd,
-                                valor=valor_interp,
-                                timestamp=t_actual,
-                                timestamp_utc=t_actual - timedelta(hours=5),
-                                nivel=prev.nivel,
-                                tipo='2'
-                            )
-                        )
-                # Si no hay ambos extremos o la diferencia es mayor, no interpola
-            t_actual += timedelta(minutes=1)
-
-        if nuevos:
+def completar_minutos_faltantes_scadatemporal3(fecha_inicio, fecha_fin, cargador=None, max_hueco_minutos=None):
+    """
+    Interpola minutos faltantes con interpolar_minutos_faltantes, todos los sensores a la vez,
+    y guarda con guardar_scadatemporal solo los registros generados.
+    Solo interpola si la diferencia entre el dato previo y el siguiente es de max_hueco_minutos
+    (settings.ETL_COMPLETAR_MAX_HUECO_MINUTOS, 15 por defecto) o menos.
+    Si no encuentra ambos extremos o la diferencia es mayor, no interpola.
+    Devuelve la cantidad de registros generados.
+    """
+    if max_hueco_minutos is None:
+        max_hueco_minutos = settings.ETL_COMPLETAR_MAX_HUECO_MINUTOS
+    return _completar_minutos_faltantes(fecha_inicio, fecha_fin, max_hueco_minutos, cargador)
+
+
+def serie_de_lotes(lotes):
+    """
+    Une los LoteNormalizado de una lectura de dbo.HistoricalData en una SerieScadaTemporal
+    ordenada por código y minuto.
+    """
+    lotes = [lote for lote in lotes if len(lote.ids)]
+    if not lotes:
+        return SerieScadaTemporal(
+            np.array([], dtype=object), np.array([], dtype=np.int64),
+            np.array([], dtype='datetime64[m]'), np.array([], dtype=np.float64),
+        )
+    ids = np.concatenate([lote.ids for lote in lotes])
+    minutos = np.concatenate([lote.minutos for lote in lotes])
+    valores = np.concatenate([lote.valores for lote in lotes])
+    unicos, codigos = np.unique(ids, return_inverse=True)
+    orden = np.lexsort((minutos, codigos))
+    return SerieScadaTemporal(unicos, codigos[orden], minutos[orden], valores[orden])
+
+
+class EjecucionFusionada:
+    """
+    Ejecución del ETL cron que mantiene en memoria los datos de la ventana entre etapas:
+    importar (dbo.HistoricalData) -> completar -> pivotear -> exportar (tablas CMD).
+    ScadaTemporal deja de ser el medio de traspaso entre etapas y queda como registro de auditoría
+    opcional (settings.ETL_FUSIONADO_AUDITORIA), escrito en un hilo aparte mientras se exporta.
+    fecha_inicio y fecha_fin son el rango UTC de las tablas CMD; en dbo.HistoricalData es el mismo
+    rango más 5 horas, como en ejecutar_etl_secuencial_cron.
+    """
+
+    def __init__(self, fecha_inicio, fecha_fin, max_hueco_minutos=None, auditoria=None, cargador=None):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.max_hueco_minutos = (
+            settings.ETL_COMPLETAR_MAX_HUECO_MINUTOS if max_hueco_minutos is None else max_hueco_minutos
+        )
+        self.auditoria = settings.ETL_FUSIONADO_AUDITORIA if auditoria is None else auditoria
+        self.cargador = cargador
+        self.registro = obtener_registro()
+        self.minuto_inicio = minuto_utc(fecha_inicio + timedelta(hours=5))
+        self.minuto_fin = minuto_utc(fecha_fin + timedelta(hours=5))
+        self.serie = None
+        self.generados = None
+        self._hilo_auditoria = None
+
+    def _en_ventana(self, minutos):
+        return (minutos >= self.minuto_inicio) & (minutos <= self.minuto_fin)
+
+    def importar(self):
+        """
+        Lee de dbo.HistoricalData la ventana más el hueco máximo de completado a cada lado,
+        para tener las muestras vecinas de los extremos. Devuelve la cantidad de minutos leídos en la ventana.
+        """
+        ids_scada = self.registro.ids_scada()
+        if not ids_scada:
+            print("No hay id_scada activos.")
+            self.serie = serie_de_lotes([])
+            return 0
+
+        huecos = [self.max_hueco_minutos] + [
+            s.max_hueco_minutos for s in self.registro.sensores.values() if s.max_hueco_minutos is not None
+        ]
+        extension = timedelta(minutes=max(huecos))
+
+        lotes = []
+        ultimo_minuto = {}
+        with conexion_scada() as conn:
+            cursor = conn.cursor()
+            try:
+                for rows in _leer_historicaldata_en_lotes(
+                    cursor, ids_scada,
+                    self.fecha_inicio + timedelta(hours=5) - extension,
+                    self.fecha_fin + timedelta(hours=5) + extension,
+                    settings.ETL_IMPORTAR_TAMANO_LOTE
+                ):
+                    lotes.append(normalizar_lote_historicaldata(rows, ultimo_minuto))
+            finally:
+                cursor.close()
+
+        self.serie = serie_de_lotes(lotes)
+        return int(self._en_ventana(self.serie.minutos).sum())
+
+    def completar(self):
+        """
+        Completa en memoria los minutos faltantes de la ventana con completar_serie
+        y, si la auditoría está activa, empieza a guardar en ScadaTemporal la ventana importada y completada.
+        Devuelve la cantidad de minutos generados.
+        """
+        codigos, minutos, valores = completar_serie(
+            self.serie, self.minuto_inicio, self.minuto_fin, self.max_hueco_minutos
+        )
+        self.generados = SerieScadaTemporal(self.serie.ids, codigos, minutos, valores)
+        if self.auditoria:
+            self._iniciar_auditoria()
+        return len(codigos)
+
+    def _iniciar_auditoria(self):
+        sensores = self.registro.sensores
+        ventana = self._en_ventana(self.serie.minutos)
+        objetos = construir_scadatemporal_lote(
+            LoteNormalizado(
+                self.serie.ids[self.serie.codigos[ventana]], self.serie.minutos[ventana], self.serie.valores[ventana]
+            ),
+            sensores,
+        )
+        objetos += construir_scadatemporal_lote(
+            LoteNormalizado(self.generados.ids[self.generados.codigos], self.generados.minutos, self.generados.valores),
+            sensores,
+            tipo='2',
+        )
+        self._hilo_auditoria = threading.Thread(
+            target=self._guardar_auditoria, args=(objetos,), name="auditoria-scadatemporal"
+        )
+        self._hilo_auditoria.start()
+
+    def _guardar_auditoria(self, objetos):
+        try:
             with transaction.atomic():
-                ScadaTemporal.objects.bulk_create(nuevos, batch_size=1000)
\ No newline at end of file
+                guardadas = guardar_scadatemporal(objetos, self.cargador)
+            logging.info(f"Auditoría ScadaTemporal: {guardadas} registros guardados")
+        except Exception as e:
+            logging.error(f"Error guardando la auditoría en ScadaTemporal: {e}")
+        finally:
+            connection.close()
+
+    def esperar_auditoria(self):
+        if self._hilo_auditoria is not None:
+            self._hilo_auditoria.join()
+
+    def _ventana_completa(self):
+        """
+        Códigos, minutos UTC de las tablas CMD y valores de la ventana, importados y completados.
+        """
+        ventana = self._en_ventana(self.serie.minutos)
+        codigos = np.concatenate([self.serie.codigos[ventana], self.generados.codigos])
+        minutos = np.concatenate([self.serie.minutos[ventana], self.generados.minutos])
+        valores = np.concatenate([self.serie.valores[ventana], self.generados.valores])
+        return codigos, minutos - np.timedelta64(5, 'h'), valores
+
+    def matriz(self, central):
+        """
+        Pivotea la ventana de la central en una MatrizMinutos alineada con las columnas de su tabla CMD.
+        """
+        codigos, minutos, valores = self._ventana_completa()
+        columnas = self.registro.columnas(central)
+        columna_de_codigo = np.full(len(self.serie.ids), -1, dtype=np.int64)
+        for i, sensor in enumerate(self.registro.de_central(central)):
+            posicion = np.searchsorted(self.serie.ids, sensor.id_scada)
+            if posicion < len(self.serie.ids) and self.serie.ids[posicion] == sensor.id_scada:
+                columna_de_codigo[posicion] = i
+
+        indices_columna = columna_de_codigo[codigos]
+        en_central = indices_columna >= 0
+        return construir_matriz_minutos(minutos[en_central], indices_columna[en_central], valores[en_central], columnas)
+
+    def exportar(self):
+        """
+        Exporta la ventana a las tablas CMD con escribir_matriz_cmd, confirmando cada tabla por separado
+        como exportar_scadatemporal_a_sqlserver: si alguna falla, lanza RuntimeError al terminar las demás.
+        Devuelve la cantidad de registros insertados.
+        """
+        contador_insert = 0
+        errores = []
+        with conexion_cmd() as conn:
+            cursor = conn.cursor()
+            for central in self.registro.centrales.values():
+                nombre_tabla = nombre_tabla_cmd(central)
+                try:
+                    contador_insert += escribir_matriz_cmd(cursor, nombre_tabla, self.matriz(central))
+                    conn.commit()
+                except pyodbc.Error as e:
+                    conn.rollback()
+                    logging.error(f"Error exportando a {nombre_tabla}: {e}")
+                    errores.append(f"{nombre_tabla}: {e}")
+            cursor.close()
+        if errores:
+            raise RuntimeError(f"Error en la exportación: {'; '.join(errores)}")
+        return contador_insert
+
+    def ultimo_minuto(self):
+        """
+        Último minuto UTC con datos en la ventana, o None si no hay datos.
+        """
+        _, minutos, _ = self._ventana_completa()
+        if not len(minutos):
+            return None
+        return timezone.make_aware(minutos.max().astype(datetime), ZoneInfo('UTC'))
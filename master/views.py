@@ -4,11 +4,19 @@ from django.contrib.auth.decorators import login_required
 from datetime import datetime
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 from django.contrib import messages
 from django.contrib.auth.hashers import make_password
-from .models import ETLProcessState, ETLProcessLog, Homologacion, Nivel, Central, Parametro, ETLProcessStateCron, ETLProcessLogCron
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from .models import ETLProcessState, ETLProcessLog, Homologacion, Nivel, Central, Parametro, ETLProcessStateCron, ETLProcessLogCron, ReconciliationSummary, ReconciliationResult
 from .forms import UsuarioForm, ProfileForm, SensorForm
 from .utils import acceso_modulo_requerido, importar_excel_a_cmd, ejecutar_etl_secuencial_cron
+from .cobertura import cobertura_central
+from .registro import obtener_registro
 import os
 from django.conf import settings
 from django.urls import reverse
@@ -194,9 +202,53 @@ def etl_procesos_list(request):
 def etl_proceso_detalle(request, proceso_id):
     proceso = get_object_or_404(ETLProcessStateCron, pk=proceso_id)
     logs = ETLProcessLogCron.objects.filter(proceso=proceso).order_by('-inicio')
+    resumenes = ReconciliationSummary.objects.filter(proceso=proceso).select_related('central').order_by('central__descripcion')
+    totales = resumenes.aggregate(
+        diferentes=Sum('diferentes'), faltan_en_cmd=Sum('faltan_en_cmd'), sobran_en_cmd=Sum('sobran_en_cmd')
+    )
     return render(request, 'master/etl_proceso_detalle.html', {
         'proceso': proceso,
         'logs': logs,
+        'resumenes': resumenes,
+        'totales': totales,
+        'year': datetime.now().year,
+        'user': request.user
+    })
+
+
+@login_required
+@acceso_modulo_requerido('acceso_proceso_etl')
+def etl_proceso_discrepancias(request, proceso_id):
+    """
+    Discrepancias de la comparación del proceso, paginadas y filtrables por central, columna y tipo.
+    """
+    proceso = get_object_or_404(ETLProcessStateCron, pk=proceso_id)
+    resultados = ReconciliationResult.objects.filter(resumen__proceso=proceso).select_related('central')
+    central_id = request.GET.get('central')
+    columna = request.GET.get('columna')
+    tipo = request.GET.get('tipo')
+    # Un id de central no numérico se ignora en lugar de fallar al filtrar
+    if central_id and not central_id.isdigit():
+        central_id = None
+    if central_id:
+        resultados = resultados.filter(central_id=central_id)
+    if columna:
+        resultados = resultados.filter(columna=columna)
+    if tipo:
+        resultados = resultados.filter(tipo=tipo)
+    pagina = Paginator(resultados.order_by('timestamp', 'columna', 'id'), 100).get_page(request.GET.get('page'))
+
+    filtros = request.GET.copy()
+    filtros.pop('page', None)
+    return render(request, 'master/etl_proceso_discrepancias.html', {
+        'proceso': proceso,
+        'pagina': pagina,
+        'centrales': Central.objects.filter(reconciliationsummary__proceso=proceso).distinct(),
+        'tipos': ReconciliationResult.TIPOS,
+        'central_id': central_id or '',
+        'columna': columna or '',
+        'tipo': tipo or '',
+        'filtros': filtros.urlencode(),
         'year': datetime.now().year,
         'user': request.user
     })
@@ -356,6 +408,43 @@ def ver_niveles(request, central_id):
         'user': request.user
     })
 
+
+# Rango máximo de la consulta de cobertura por minuto
+COBERTURA_MAX_DIAS = 31
+
+
+@login_required
+@acceso_modulo_requerido('acceso_sensores')
+def cobertura_central_json(request, central_id):
+    """
+    Cobertura por minuto de los sensores activos de la central, según el índice CoberturaSensor.
+    Parámetros GET opcionales inicio y fin (fecha/hora); por defecto, las últimas 24 horas.
+    El rango no puede superar COBERTURA_MAX_DIAS días.
+    """
+    central = get_object_or_404(Central, pk=central_id)
+    try:
+        fecha_fin = parse_datetime(request.GET.get('fin', '')) or timezone.now()
+        fecha_inicio = parse_datetime(request.GET.get('inicio', '')) or fecha_fin - timedelta(days=1)
+    except ValueError:
+        # Formato correcto pero fecha inexistente, p. ej. 2025-02-30T00:00
+        return HttpResponseBadRequest('Fecha de inicio o fin no válida.')
+    if timezone.is_naive(fecha_fin):
+        fecha_fin = timezone.make_aware(fecha_fin)
+    if timezone.is_naive(fecha_inicio):
+        fecha_inicio = timezone.make_aware(fecha_inicio)
+    if fecha_inicio > fecha_fin:
+        return JsonResponse({'error': 'La fecha de inicio debe ser anterior a la fecha de fin.'}, status=400)
+    if fecha_fin - fecha_inicio > timedelta(days=COBERTURA_MAX_DIAS):
+        return JsonResponse({'error': f'El rango no puede superar {COBERTURA_MAX_DIAS} días.'}, status=400)
+
+    cobertura = cobertura_central(obtener_registro().de_central(central), fecha_inicio, fecha_fin)
+    cobertura.update({
+        'central': central.descripcion,
+        'inicio': fecha_inicio.isoformat(),
+        'fin': fecha_fin.isoformat(),
+    })
+    return JsonResponse(cobertura)
+
 @login_required
 @acceso_modulo_requerido('acceso_sensores')
 def activar_nivel(request, nivel_id):
@@ -152,4 +152,68 @@ DB_SQL_DATABASE_SCADA=env("DB_SQL_DATABASE_SCADA")
 DB_SQL_USERNAME=env("DB_SQL_USERNAME")
 DB_SQL_PASSWORD=env("DB_SQL_PASSWORD")
 DB_DRIVER=env("DB_DRIVER")
-
+# Pool de conexiones a SQL Server (uno para la base SCADA y otro para la base CMD)
+DB_SQL_POOL_TAMANO=env.int("DB_SQL_POOL_TAMANO", default=8)
+DB_SQL_POOL_TIMEOUT=env.int("DB_SQL_POOL_TIMEOUT", default=60)
+DB_SQL_POOL_VERIFICAR_SEGUNDOS=env.int("DB_SQL_POOL_VERIFICAR_SEGUNDOS", default=30)
+
+#ETL
+# Modo de la etapa importar: 'estandar' (lee por lotes y guarda todo al final), 'streaming' (guarda cada lote)
+# 'paralelo' (un shard por central, o de ETL_IMPORTAR_TAMANO_SHARD ids si es mayor que cero)
+# 'incremental' (desde la marca de agua de cada sensor menos ETL_IMPORTAR_RETROCESO_MINUTOS)
+# 'pipeline' (lectores y escritores unidos por una cola acotada)
+# o 'agregado' (un valor por minuto calculado en SQL Server según Homologacion.agregacion)
+ETL_MODO_IMPORTACION=env("ETL_MODO_IMPORTACION", default="estandar")
+ETL_IMPORTAR_TAMANO_LOTE=env.int("ETL_IMPORTAR_TAMANO_LOTE", default=5000)
+ETL_IMPORTAR_MAX_WORKERS=env.int("ETL_IMPORTAR_MAX_WORKERS", default=4)
+ETL_IMPORTAR_TAMANO_SHARD=env.int("ETL_IMPORTAR_TAMANO_SHARD", default=0)
+ETL_IMPORTAR_RETROCESO_MINUTOS=env.int("ETL_IMPORTAR_RETROCESO_MINUTOS", default=5)
+ETL_PIPELINE_LECTORES=env.int("ETL_PIPELINE_LECTORES", default=2)
+ETL_PIPELINE_ESCRITORES=env.int("ETL_PIPELINE_ESCRITORES", default=2)
+ETL_PIPELINE_TAMANO_COLA=env.int("ETL_PIPELINE_TAMANO_COLA", default=8)
+# Filtro de id_scada en las consultas a HistoricalData: 'auto' (tabla temporal, luego TVP, luego bloques),
+# 'tabla_temporal', 'tvp' o 'bloques'. El TVP requiere un tipo de tabla con la columna ID, p. ej. 'dbo.IdsScada',
+# y solo se usa en las consultas que filtran por ID; las que agregan columnas (Desde, Agregacion...) usan bloques
+ETL_FILTRO_IDS=env("ETL_FILTRO_IDS", default="auto")
+ETL_FILTRO_IDS_TIPO_TVP=env("ETL_FILTRO_IDS_TIPO_TVP", default="")
+ETL_FILTRO_IDS_TAMANO_BLOQUE=env.int("ETL_FILTRO_IDS_TAMANO_BLOQUE", default=1000)
+# Vigencia máxima del registro en memoria de sensores activos (las señales lo invalidan dentro del proceso)
+ETL_REGISTRO_TTL_SEGUNDOS=env.int("ETL_REGISTRO_TTL_SEGUNDOS", default=300)
+# Cargador de ScadaTemporal: 'bulk_create' o 'load_data' (LOAD DATA LOCAL INFILE, solo MySQL)
+ETL_CARGADOR_SCADATEMPORAL=env("ETL_CARGADOR_SCADATEMPORAL", default="bulk_create")
+# LOAD DATA LOCAL INFILE solo se habilita en el cliente MySQL cuando el cargador lo usa
+if ETL_CARGADOR_SCADATEMPORAL == 'load_data':
+    DATABASES["default"]["OPTIONS"]["local_infile"] = 1
+# Máxima distancia en minutos entre el dato previo y el siguiente para completar un minuto faltante
+ETL_COMPLETAR_MAX_HUECO_MINUTOS=env.int("ETL_COMPLETAR_MAX_HUECO_MINUTOS", default=15)
+# Estrategia para completar sensores booleanos sin estrategia propia: 'mantener' (último valor) o 'ninguna'
+ETL_COMPLETAR_ESTRATEGIA_BOOLEANO=env("ETL_COMPLETAR_ESTRATEGIA_BOOLEANO", default="ninguna")
+# Modo del ETL cron: 'etapas' (las etapas se pasan los datos por ScadaTemporal) o 'fusionado' (en memoria)
+ETL_MODO_CRON=env("ETL_MODO_CRON", default="etapas")
+# En modo 'fusionado', guarda igualmente la ventana en ScadaTemporal (en segundo plano) como auditoría
+ETL_FUSIONADO_AUDITORIA=env.bool("ETL_FUSIONADO_AUDITORIA", default=True)
+# Exportación a las tablas CMD: 'merge' (todas las columnas de cada minuto) o 'diferencial' (solo las celdas que cambiaron)
+ETL_EXPORTAR_MODO=env("ETL_EXPORTAR_MODO", default="merge")
+# Ejecución de la exportación: 'secuencial' o 'paralelo' (una central por worker, con checkpoints por lote de minutos)
+ETL_EXPORTAR_EJECUCION=env("ETL_EXPORTAR_EJECUCION", default="secuencial")
+ETL_EXPORTAR_MAX_WORKERS=env.int("ETL_EXPORTAR_MAX_WORKERS", default=4)
+ETL_EXPORTAR_MINUTOS_LOTE=env.int("ETL_EXPORTAR_MINUTOS_LOTE", default=60)
+# Minutos que pueden tardar en llegar datos a HistoricalData; una ventana más reciente no se marca como completada
+ETL_EXPORTAR_RETRASO_INGESTA_MINUTOS=env.int("ETL_EXPORTAR_RETRASO_INGESTA_MINUTOS", default=15)
+# Almacenamiento de las tablas CMD: 'rowstore' (clave primaria agrupada sobre [timestamp]),
+# 'particionado' (igual, particionada por mes sobre [timestamp]) o 'columnstore' (índice columnar agrupado)
+ETL_CMD_ALMACENAMIENTO=env("ETL_CMD_ALMACENAMIENTO", default="rowstore")
+# Partición mensual: primer límite, meses creados por adelantado y meses conservados (0 = no se eliminan datos)
+ETL_CMD_PARTICION_DESDE=env("ETL_CMD_PARTICION_DESDE", default="2024-01-01")
+ETL_CMD_PARTICION_MESES_ADELANTE=env.int("ETL_CMD_PARTICION_MESES_ADELANTE", default=3)
+ETL_CMD_PARTICION_MESES_RETENCION=env.int("ETL_CMD_PARTICION_MESES_RETENCION", default=0)
+# Comparación con las tablas CMD: 'conjuntos' (ScadaTemporal celda a celda por ventana).
+# 'checksum' (checksums por hora y solo se revisan minuto a minuto las horas que difieren) y 'servidor'
+# comparan dbo.HistoricalData con las tablas CMD dentro de SQL Server, sin usar ScadaTemporal
+ETL_COMPARAR_MODO=env("ETL_COMPARAR_MODO", default="conjuntos")
+# Tamaño de los lotes de bulk_create al guardar las discrepancias de la comparación (ReconciliationResult)
+ETL_COMPARAR_TAMANO_LOTE=env.int("ETL_COMPARAR_TAMANO_LOTE", default=5000)
+# Ejecuta la etapa comparar al final de cada ETL cron y guarda los resultados vinculados al proceso
+ETL_CRON_COMPARAR=env.bool("ETL_CRON_COMPARAR", default=False)
+# Días que se conservan los resultados de la comparación (ReconciliationSummary y ReconciliationResult)
+ETL_COMPARAR_RETENCION_DIAS=env.int("ETL_COMPARAR_RETENCION_DIAS", default=30)